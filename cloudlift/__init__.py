@@ -1,19 +1,13 @@
 import functools
 
-import boto3
 import click
-from botocore.exceptions import ClientError
-
-from cloudlift.config import highlight_production, ServiceConfiguration
-from cloudlift.config.logging import log_err
-from cloudlift.deployment import EnvironmentCreator, editor
-from cloudlift.deployment.configs import deduce_name
-from cloudlift.deployment.service_creator import ServiceCreator
-from cloudlift.deployment.service_information_fetcher import ServiceInformationFetcher
-from cloudlift.deployment.service_updater import ServiceUpdater
+
 from cloudlift.exceptions import UnrecoverableException
 from cloudlift.version import VERSION
 
+# Commands import the config and deployment modules they need when they run,
+# so that help and --version do not pay for boto3, troposphere and friends.
+
 
 def _require_environment(func):
     @click.option('--environment', '-e', prompt='environment',
@@ -21,6 +15,7 @@ def _require_environment(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         if kwargs['environment'] == 'production' or kwargs['environment'] == 'prod':
+            from cloudlift.config import highlight_production
             highlight_production()
         return func(*args, **kwargs)
 
@@ -33,6 +28,7 @@ repo')
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         if kwargs['name'] is None:
+            from cloudlift.deployment.configs import deduce_name
             kwargs['name'] = deduce_name(None)
         return func(*args, **kwargs)
 
@@ -44,8 +40,22 @@ class CommandWrapper(click.Group):
         try:
             return self.main(*args, **kwargs)
         except UnrecoverableException as e:
+            from cloudlift.config.logging import log_err
             log_err(e.value)
             exit(1)
+        except Exception as e:
+            if not _is_aws_connection_error(e):
+                raise
+            from cloudlift.config.logging import log_err
+            log_err("Could not connect to AWS!")
+            log_err("Ensure AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY & \
+AWS_DEFAULT_REGION env vars are set OR run 'aws configure'")
+            exit(1)
+
+
+def _is_aws_connection_error(error):
+    from botocore.exceptions import NoCredentialsError, NoRegionError, PartialCredentialsError
+    return isinstance(error, (NoCredentialsError, NoRegionError, PartialCredentialsError))
 
 
 @click.group(cls=CommandWrapper)
@@ -55,13 +65,6 @@ def cli():
         Cloudlift is built by Simpl developers to make it easier to launch \
         dockerized services in AWS ECS.
     """
-    try:
-        boto3.client('cloudformation')
-    except ClientError:
-        log_err("Could not connect to AWS!")
-        log_err("Ensure AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY & \
-AWS_DEFAULT_REGION env vars are set OR run 'aws configure'")
-        exit(1)
 
 
 @cli.command(help="Create a new service. This can contain multiple \
@@ -77,9 +80,18 @@ ECS services")
 @click.option('--env_sample_file', default='env.sample', help='env sample file path')
 @click.option('--ssh', default=None, help='SSH agent socket or keys to expose to the docker build')
 @click.option('--cache-from', multiple=True, help='Images to consider as cache sources')
-def create_service(name, environment, version, build_arg, dockerfile, env_sample_file, ssh, cache_from):
+@click.option('--registry-cache', is_flag=True,
+              help='Build with buildx and share the layer cache through a cache tag in the ECR repo')
+@click.option('--content-version', is_flag=True,
+              help='Reuse the image built from an identical build context instead of building again')
+@click.option('--platform', multiple=True,
+              help='Target platform of a multi-architecture build, e.g. linux/amd64. Supports multiple')
+def create_service(name, environment, version, build_arg, dockerfile, env_sample_file, ssh, cache_from,
+                   registry_cache, content_version, platform):
+    from cloudlift.deployment.service_creator import ServiceCreator
     ServiceCreator(name, environment, env_sample_file).create(
         version=version, build_arg=dict(build_arg), dockerfile=dockerfile, ssh=ssh, cache_from=list(cache_from),
+        registry_cache=registry_cache, content_version=content_version, platforms=list(platform),
     )
 
 
@@ -88,6 +100,7 @@ def create_service(name, environment, version, build_arg, dockerfile, env_sample
 @_require_name
 @click.option('--env_sample_file', default='env.sample', help='env sample file path')
 def update_service(name, environment, env_sample_file):
+    from cloudlift.deployment.service_creator import ServiceCreator
     ServiceCreator(name, environment, env_sample_file).update()
 
 
@@ -95,6 +108,7 @@ def update_service(name, environment, env_sample_file):
 @click.option('--environment', '-e', prompt='environment',
               help='environment')
 def create_environment(environment):
+    from cloudlift.deployment import EnvironmentCreator
     EnvironmentCreator(environment).run()
 
 
@@ -104,6 +118,7 @@ def create_environment(environment):
               is_flag=True,
               help='Update ECS container agents')
 def update_environment(environment, update_ecs_agents):
+    from cloudlift.deployment import EnvironmentCreator
     EnvironmentCreator(environment).run_update(update_ecs_agents)
 
 
@@ -114,6 +129,7 @@ in parameter store")
 @click.option('--sidecar', help='Choose which sidecar to edit the configuration. Defaults to the main container ' +
                                 'if not provided')
 def edit_config(name, environment, sidecar):
+    from cloudlift.deployment import editor
     editor.edit_config(name, environment, sidecar)
 
 
@@ -132,9 +148,18 @@ def edit_config(name, environment, sidecar):
 @click.option('--env_sample_file', default='env.sample', help='env sample file path')
 @click.option('--ssh', default=None, help='SSH agent socket or keys to expose to the docker build')
 @click.option('--cache-from', multiple=True, help='Images to consider as cache sources')
+@click.option('--registry-cache', is_flag=True,
+              help='Build with buildx and share the layer cache through a cache tag in the ECR repo')
+@click.option('--content-version', is_flag=True,
+              help='Reuse the image built from an identical build context instead of building again')
+@click.option('--platform', multiple=True,
+              help='Target platform of a multi-architecture build, e.g. linux/amd64. Supports multiple')
+@click.option('--deployment_concurrency', type=int, default=None,
+              help='Number of ECS services deployed in parallel. Defaults to CLOUDLIFT_DEPLOYMENT_CONCURRENCY or 4')
 def deploy_service(name, environment, timeout_seconds, version, build_arg, dockerfile, env_sample_file, ssh,
-                   cache_from,
-                   deployment_identifier):
+                   cache_from, registry_cache, content_version, platform,
+                   deployment_identifier, deployment_concurrency):
+    from cloudlift.deployment.service_updater import ServiceUpdater
     ServiceUpdater(
         name,
         environment=environment,
@@ -144,7 +169,11 @@ def deploy_service(name, environment, timeout_seconds, version, build_arg, docke
         build_args=dict(build_arg),
         dockerfile=dockerfile,
         ssh=ssh,
-        cache_from=list(cache_from), deployment_identifier=deployment_identifier
+        cache_from=list(cache_from), deployment_identifier=deployment_identifier,
+        deployment_concurrency=deployment_concurrency,
+        registry_cache=registry_cache,
+        content_version=content_version,
+        platforms=list(platform),
     ).run()
 
 
@@ -154,9 +183,31 @@ def deploy_service(name, environment, timeout_seconds, version, build_arg, docke
 @click.option('--deployment_identifier', type=str, required=True,
               help='Unique identifier for deployment which can be used for reverting')
 @click.option('--timeout_seconds', default=600, help='The deployment timeout')
-def revert_service(name, environment, timeout_seconds, deployment_identifier):
+@click.option('--deployment_concurrency', type=int, default=None,
+              help='Number of ECS services reverted in parallel. Defaults to CLOUDLIFT_DEPLOYMENT_CONCURRENCY or 4')
+def revert_service(name, environment, timeout_seconds, deployment_identifier, deployment_concurrency):
+    from cloudlift.deployment.service_updater import ServiceUpdater
     ServiceUpdater(name, environment, deployment_identifier=deployment_identifier,
-                   timeout_seconds=timeout_seconds).revert()
+                   timeout_seconds=timeout_seconds, deployment_concurrency=deployment_concurrency).revert()
+
+
+@cli.command(help="Deploy many services listed in a JSON manifest from a single process")
+@click.option('--manifest', required=True, type=click.Path(exists=True, dir_okay=False),
+              help='JSON list of {"name", "environment", "version", "deployment_identifier"} entries. Entries may '
+                   'also set "working_dir" (relative to the current directory), "env_sample_file" and '
+                   '"timeout_seconds"')
+@click.option('--timeout_seconds', default=600, help='The deployment timeout')
+@click.option('--deployment_concurrency', type=int, default=None,
+              help='Number of ECS services deployed in parallel across all services in the manifest. '
+                   'Defaults to CLOUDLIFT_DEPLOYMENT_CONCURRENCY or 4')
+def deploy_many(manifest, timeout_seconds, deployment_concurrency):
+    from cloudlift.deployment.multi_service_updater import MultiServiceUpdater, read_manifest
+    entries = read_manifest(manifest)
+    if any(entry['environment'] in ('production', 'prod') for entry in entries):
+        from cloudlift.config import highlight_production
+        highlight_production()
+    MultiServiceUpdater(entries, timeout_seconds=timeout_seconds,
+                        deployment_concurrency=deployment_concurrency).run()
 
 
 @cli.command()
@@ -171,10 +222,34 @@ def revert_service(name, environment, timeout_seconds, deployment_identifier):
 @click.option('--env_sample_file', default='env.sample', help='env sample file path')
 @click.option('--ssh', default=None, help='SSH agent socket or keys to expose to the docker build')
 @click.option('--cache-from', multiple=True, help='Images to consider as cache sources')
-def upload_to_ecr(name, environment, additional_tags, build_arg, dockerfile, env_sample_file, ssh, cache_from):
+@click.option('--registry-cache', is_flag=True,
+              help='Build with buildx and share the layer cache through a cache tag in the ECR repo')
+@click.option('--content-version', is_flag=True,
+              help='Reuse the image built from an identical build context instead of building again')
+@click.option('--platform', multiple=True,
+              help='Target platform of a multi-architecture build, e.g. linux/amd64. Supports multiple')
+def upload_to_ecr(name, environment, additional_tags, build_arg, dockerfile, env_sample_file, ssh, cache_from,
+                  registry_cache, content_version, platform):
+    from cloudlift.deployment.service_updater import ServiceUpdater
     ServiceUpdater(name, environment=environment, env_sample_file=env_sample_file,
                    build_args=dict(build_arg), dockerfile=dockerfile,
-                   ssh=ssh, cache_from=list(cache_from)).upload_to_ecr(additional_tags)
+                   ssh=ssh, cache_from=list(cache_from),
+                   registry_cache=registry_cache,
+                   content_version=content_version,
+                   platforms=list(platform)).upload_to_ecr(additional_tags)
+
+
+@cli.command(help="Copy an image from the ECR repo of another environment \
+through the registry API, without Docker")
+@_require_name
+@_require_environment
+@click.option('--source_environment', required=True, help='Environment whose ECR repo has the image')
+@click.option('--version', required=True, help='Image version tag to promote')
+@click.option('--additional_tags', default=[], multiple=True,
+              help='Additional tags for the image apart from commit SHA')
+def promote_image(name, environment, source_environment, version, additional_tags):
+    from cloudlift.deployment.service_updater import promote_image as promote_service_image
+    promote_service_image(name, environment, source_environment, version, additional_tags)
 
 
 @cli.command(help="Get commit information of currently deployed code \
@@ -184,6 +259,8 @@ from commit hash")
 @click.option('--image', is_flag=True, help='Print image with version')
 @click.option('--git', is_flag=True, help='Prints the git revision part of the image')
 def get_version(name, environment, image, git):
+    from cloudlift.config import ServiceConfiguration
+    from cloudlift.deployment.service_information_fetcher import ServiceInformationFetcher
     ServiceInformationFetcher(
         name,
         environment,
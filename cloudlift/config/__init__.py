@@ -1,3 +1,4 @@
+from .aws_clients import *
 from .account import *
 from .diff import *
 from .decimal_encoder import *
@@ -9,3 +10,4 @@ from .mfa import *
 from .service_configuration import *
 from .stack import *
 from .dynamodb_config import *
+from .deployment_identifier_index import *
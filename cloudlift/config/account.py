@@ -1,6 +1,6 @@
-from boto3 import client
+from cloudlift.config.aws_clients import get_client
 
 
 def get_account_id(sts_client=None):
-    sts_client = sts_client or client('sts')
+    sts_client = sts_client or get_client('sts')
     return sts_client.get_caller_identity().get('Account')
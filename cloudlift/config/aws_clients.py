@@ -0,0 +1,105 @@
+'''
+Process-wide pool of boto3 sessions and clients.
+
+Building a session reloads the botocore data models and resolves
+credentials, so clients are created once per (service, region, role) and
+reused by every caller. Clients are shared across threads. Sessions and
+resources are not thread-safe, so resources are kept per thread.
+
+The pool is emptied in a forked child, so the child builds its own clients
+on its next get_client call. A client the parent fetched before the fork
+and kept in an object is still the parent's, with its connection pool, so
+objects passed to child processes should call get_client when they use a
+client rather than keep one.
+'''
+
+import os
+import threading
+from datetime import datetime, timedelta
+
+from boto3.session import Session
+from botocore.config import Config
+from dateutil.tz.tz import tzutc
+
+AWS_CLIENT_CONFIG = Config(retries=dict(
+    max_attempts=10,
+    mode='standard',
+))
+ASSUMED_ROLE_SESSION_NAME = 'ecrCloudliftAgent'
+ASSUMED_ROLE_REFRESH_MARGIN = timedelta(minutes=5)
+
+_lock = threading.RLock()
+_sessions = {}
+_clients = {}
+_thread_resources = threading.local()
+
+
+def get_client(service, region=None, role_arn=None):
+    key = (service, region, role_arn)
+    client = _clients.get(key)
+    if client is None or _is_expired(key):
+        with _lock:
+            client = _clients.get(key)
+            if client is None or _is_expired(key):
+                client = _get_session(region, role_arn).client(service, config=AWS_CLIENT_CONFIG)
+                _clients[key] = client
+    return client
+
+
+def get_resource(service, region=None, role_arn=None):
+    key = (service, region, role_arn)
+    resources = getattr(_thread_resources, 'resources', None)
+    if resources is None:
+        resources = _thread_resources.resources = {}
+    resource = resources.get(key)
+    if resource is None or _is_expired(key):
+        with _lock:
+            resource = _get_session(region, role_arn).resource(service, config=AWS_CLIENT_CONFIG)
+            resources[key] = resource
+    return resource
+
+
+def clear_clients():
+    global _lock, _thread_resources
+    _lock = threading.RLock()
+    _sessions.clear()
+    _clients.clear()
+    _thread_resources = threading.local()
+
+
+def _get_session(region, role_arn):
+    key = (region, role_arn)
+    session, expiration = _sessions.get(key, (None, None))
+    if session is None or _expires_soon(expiration):
+        if role_arn:
+            credentials = get_client('sts', region).assume_role(
+                RoleArn=role_arn,
+                RoleSessionName=ASSUMED_ROLE_SESSION_NAME,
+            )['Credentials']
+            session = Session(
+                aws_access_key_id=credentials['AccessKeyId'],
+                aws_secret_access_key=credentials['SecretAccessKey'],
+                aws_session_token=credentials['SessionToken'],
+                region_name=region,
+            )
+            expiration = credentials['Expiration']
+        else:
+            session = Session(region_name=region)
+        _sessions[key] = (session, expiration)
+    return session
+
+
+def _is_expired(key):
+    _, region, role_arn = key
+    if not role_arn:
+        return False
+    _, expiration = _sessions.get((region, role_arn), (None, None))
+    return _expires_soon(expiration)
+
+
+def _expires_soon(expiration):
+    return expiration is not None and expiration - ASSUMED_ROLE_REFRESH_MARGIN <= datetime.now(tzutc())
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=clear_clients)
@@ -0,0 +1,22 @@
+from cloudlift.config.dynamodb_config import DynamodbConfig
+
+DEPLOYMENT_IDENTIFIER_TABLE = 'deployment_identifiers'
+
+
+class DeploymentIdentifierIndex(DynamodbConfig):
+    '''
+        Maps a deployment_identifier to the task definition registered
+        for it in a task definition family
+    '''
+
+    def __init__(self, family, deployment_identifier):
+        self.family = family
+        self.deployment_identifier = deployment_identifier
+        super(DeploymentIdentifierIndex, self).__init__(DEPLOYMENT_IDENTIFIER_TABLE, [
+            ('family', self.family), ('deployment_identifier', self.deployment_identifier)])
+
+    def get_task_definition_arn(self):
+        return self.get_config_in_db()
+
+    def set_task_definition_arn(self, task_definition_arn):
+        return self.set_config_in_db(task_definition_arn)
@@ -1,17 +1,18 @@
-import boto3
 from botocore.exceptions import ClientError
 from cloudlift.version import VERSION
+from cloudlift.config.aws_clients import get_client, get_resource
 from cloudlift.exceptions import UnrecoverableException
 from cloudlift.config.logging import log_bold, log_err, log_warning
 
+_existing_tables = set()
+
 
 class DynamodbConfig:
     """
         Handles configuration in DynamoDB for cloudlift
     """
     def __init__(self, table_name, kv_pairs):
-        session = boto3.session.Session()
-        self.dynamodb = session.resource('dynamodb')
+        self.dynamodb = get_resource('dynamodb')
         self.kv_pairs = kv_pairs
         self.table_name = table_name
         self.table = self._get_table()
@@ -54,13 +55,21 @@ class DynamodbConfig:
             raise UnrecoverableException("Unable to store service configuration in DynamoDB.")
 
     def _get_table(self):
-        dynamodb_client = boto3.session.Session().client('dynamodb')
-        table_names = dynamodb_client.list_tables()['TableNames']
-        if self.table_name not in table_names:
-            log_warning("Could not find configuration table, creating one..")
-            self._create_configuration_table()
+        if self.table_name not in _existing_tables:
+            if not self._table_exists():
+                log_warning("Could not find configuration table, creating one..")
+                self._create_configuration_table()
+            _existing_tables.add(self.table_name)
         return self.dynamodb.Table(self.table_name)
 
+    def _table_exists(self):
+        dynamodb_client = get_client('dynamodb')
+        try:
+            dynamodb_client.describe_table(TableName=self.table_name)
+            return True
+        except dynamodb_client.exceptions.ResourceNotFoundException:
+            return False
+
     def _create_configuration_table(self):
         key_schema = [{'AttributeName': self.kv_pairs[0][0], 'KeyType': 'HASH'}]
         key_schema.extend([{'AttributeName': key, 'KeyType': 'RANGE'} for key, _ in self.kv_pairs[1:]])
@@ -70,6 +79,7 @@ class DynamodbConfig:
             AttributeDefinitions=[{'AttributeName': key, 'AttributeType': 'S'} for key, _ in self.kv_pairs],
             BillingMode='PAY_PER_REQUEST'
         )
+        get_client('dynamodb').get_waiter('table_exists').wait(TableName=self.table_name)
         log_bold("{} table created!".format(self.table_name))
 
     def _validate_changes(self, config):
@@ -195,7 +195,9 @@ class EnvironmentConfiguration(DynamodbConfig):
         '''
             Set configuration in DynamoDB
         '''
+        from cloudlift.config.region import forget_environment_context
         self.set_config_in_db(config)
+        forget_environment_context(self.environment)
 
     def _validate_changes(self, configuration):
         log_bold("\nValidating schema..")
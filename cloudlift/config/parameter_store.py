@@ -1,4 +1,5 @@
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 from cloudlift.exceptions import UnrecoverableException
 
@@ -6,6 +7,11 @@ from cloudlift.config import get_client_for
 from cloudlift.config.logging import log_err
 from cloudlift.utils import chunks
 
+PARAMETER_STORE_PAGE_SIZE = 10
+PARAMETER_STORE_BATCH_SIZE = 10
+PARAMETER_STORE_READ_CONCURRENCY = 5
+PARAMETER_STORE_WRITE_CONCURRENCY = 5
+
 
 class ParameterStore(object):
     def __init__(self, service_name, environment):
@@ -21,11 +27,10 @@ class ParameterStore(object):
         self.client = get_client_for('ssm', environment)
 
     def get_existing_config_as_string(self, sidecar_name=None):
-        environment_configs, sidecar_configs = self.get_existing_config()
-
-        result_configs = sidecar_configs.get(sidecar_name, {}) \
-            if sidecar_name is not None and sidecar_name != "" \
-            else environment_configs
+        if sidecar_name is not None and sidecar_name != "":
+            result_configs = self.get_sidecar_config(sidecar_name)
+        else:
+            result_configs, _ = self.get_existing_config()
 
         return '\n'.join('{}={}'.format(key, val) for key, val in sorted(
             result_configs.items()
@@ -34,68 +39,101 @@ class ParameterStore(object):
     def get_existing_config(self):
         environment_configs = {}
         sidecars_configs = {}
-        next_token = None
-        while True:
-            if next_token:
-                response = self.client.get_parameters_by_path(
-                    Path=self.path_prefix,
-                    Recursive=True,
-                    WithDecryption=True,
-                    MaxResults=10,
-                    NextToken=next_token
-                )
+        for parameter in self._get_parameters_by_path(self.path_prefix):
+            parameter_name = parameter['Name'].split(self.path_prefix)[1]
+            if parameter_name.startswith('sidecars/'):
+                sidecar_name, sidecar_parameter = parameter_name.replace('sidecars/', '', 1).split('/')
+                if sidecar_name not in sidecars_configs:
+                    sidecars_configs[sidecar_name] = {}
+
+                sidecars_configs[sidecar_name].update({sidecar_parameter: parameter['Value']})
             else:
-                response = self.client.get_parameters_by_path(
-                    Path=self.path_prefix,
-                    Recursive=True,
-                    WithDecryption=True,
-                    MaxResults=10
-                )
-            for parameter in response['Parameters']:
-                parameter_name = parameter['Name'].split(self.path_prefix)[1]
-                if parameter_name.startswith('sidecars/'):
-                    sidecar_name, sidecar_parameter = parameter_name.replace('sidecars/', '', 1).split('/')
-                    if sidecar_name not in sidecars_configs:
-                        sidecars_configs[sidecar_name] = {}
-
-                    sidecars_configs[sidecar_name].update({sidecar_parameter: parameter['Value']})
-                else:
-                    environment_configs[parameter_name] = parameter['Value']
-
-            try:
-                next_token = response['NextToken']
-            except KeyError:
-                break
+                environment_configs[parameter_name] = parameter['Value']
         return environment_configs, sidecars_configs
 
+    def get_sidecar_config(self, sidecar_name):
+        sidecar_path_prefix = '{}sidecars/{}/'.format(self.path_prefix, sidecar_name)
+        sidecar_configs = {}
+        for parameter in self._get_parameters_by_path(sidecar_path_prefix):
+            if not parameter['Name'].startswith(sidecar_path_prefix):
+                continue
+            parameter_name = parameter['Name'][len(sidecar_path_prefix):]
+            if '/' not in parameter_name:
+                sidecar_configs[parameter_name] = parameter['Value']
+        return sidecar_configs
+
+    def get_config_for_keys(self, keys):
+        '''
+            Fetch only the given keys of the main container, in batches of
+            get_parameters calls. Keys that do not exist are left out.
+            Throttled calls are retried by the client's standard retry mode.
+        '''
+        names = ['%s%s' % (self.path_prefix, key) for key in sorted(keys)]
+        environment_configs = {}
+        with ThreadPoolExecutor(max_workers=PARAMETER_STORE_READ_CONCURRENCY) as executor:
+            responses = executor.map(
+                lambda batch: self.client.get_parameters(Names=batch, WithDecryption=True),
+                chunks(names, PARAMETER_STORE_BATCH_SIZE),
+            )
+            for response in responses:
+                for parameter in response['Parameters']:
+                    environment_configs[parameter['Name'][len(self.path_prefix):]] = parameter['Value']
+        return environment_configs
+
+    def _get_parameters_by_path(self, path):
+        page_loader = ThreadPoolExecutor(max_workers=1)
+        try:
+            response = self._get_parameters_page(path)
+            while True:
+                next_page = None
+                if 'NextToken' in response:
+                    next_page = page_loader.submit(self._get_parameters_page, path, response['NextToken'])
+                yield from response['Parameters']
+                if next_page is None:
+                    return
+                response = next_page.result()
+        finally:
+            page_loader.shutdown(wait=False)
+
+    def _get_parameters_page(self, path, next_token=None):
+        kwargs = dict(Path=path, Recursive=True, WithDecryption=True, MaxResults=PARAMETER_STORE_PAGE_SIZE)
+        if next_token:
+            kwargs['NextToken'] = next_token
+        return self.client.get_parameters_by_path(**kwargs)
+
     def set_config(self, differences, sidecar_name=None):
         self._validate_changes(differences)
         path_prefix = self.path_prefix if sidecar_name is None else '{}sidecars/{}/'.format(self.path_prefix,
                                                                                             sidecar_name)
+        requests = []
         for parameter_change in differences:
             if parameter_change[0] == 'change':
-                self.client.put_parameter(
+                requests.append((self.client.put_parameter, dict(
                     Name='%s%s' % (path_prefix, parameter_change[1]),
                     Value=parameter_change[2][1],
                     Type='SecureString',
                     KeyId='alias/aws/ssm',
                     Overwrite=True
-                )
+                )))
             elif parameter_change[0] == 'add':
                 for added_parameter in parameter_change[2]:
-                    self.client.put_parameter(
+                    requests.append((self.client.put_parameter, dict(
                         Name='%s%s' % (path_prefix, added_parameter[0]),
                         Value=added_parameter[1],
                         Type='SecureString',
                         KeyId='alias/aws/ssm',
                         Overwrite=False
-                    )
+                    )))
             elif parameter_change[0] == 'remove':
                 deleted_parameters = ["%s%s" % (path_prefix, item[0]) for item in parameter_change[2]]
-                for chunked_parameters in chunks(deleted_parameters, 10):
-                    self.client.delete_parameters(
+                for chunked_parameters in chunks(deleted_parameters, PARAMETER_STORE_BATCH_SIZE):
+                    requests.append((self.client.delete_parameters, dict(
                         Names=chunked_parameters
-                    )
+                    )))
+        with ThreadPoolExecutor(max_workers=PARAMETER_STORE_WRITE_CONCURRENCY) as executor:
+            futures = [executor.submit(request, **kwargs) for request, kwargs in requests]
+            for future in futures:
+                future.result()
 
     def _validate_changes(self, differences):
         errors = []
@@ -2,71 +2,100 @@ import boto3
 from cloudlift.exceptions import UnrecoverableException
 
 from cloudlift.config import EnvironmentConfiguration
-
-local_cache = {}
+from cloudlift.config.aws_clients import get_client, get_resource
+
+_environment_contexts = {}
+
+
+class EnvironmentContext(object):
+    '''
+        Environment configuration loaded from DynamoDB at most once and
+        shared by every region, bucket, listener, SNS and certificate lookup
+        for that environment.
+    '''
+
+    def __init__(self, environment):
+        self.environment = environment
+        self._config = None
+        self._region = None
+
+    @property
+    def config(self):
+        if self._config is None:
+            self._config = EnvironmentConfiguration(self.environment).get_config()[self.environment]
+        return self._config
+
+    @property
+    def region(self):
+        if self._region is None:
+            if self.environment:
+                self._region = self.config['region']
+            else:
+                # Get the region from the AWS credentials used to execute cloudlift
+                self._region = boto3.session.Session().region_name
+        return self._region
+
+    @property
+    def service_templates_bucket(self):
+        return self.config.get('service_templates_bucket')
+
+    @property
+    def alb_listener_arn(self):
+        if 'loadbalancer_listener_arn' not in self.config:
+            raise UnrecoverableException('environment level ALB not defined. ' +
+                                         'Please run update_environment and set "loadbalancer_listener_arn".')
+        return self.config['loadbalancer_listener_arn']
+
+    @property
+    def notifications_arn(self):
+        try:
+            return self.config['environment']["notifications_arn"]
+        except KeyError:
+            raise UnrecoverableException(
+                "Unable to find notifications arn for {environment}".format(environment=self.environment))
+
+    @property
+    def ssl_certificate_arn(self):
+        try:
+            return self.config['environment']["ssl_certificate_arn"]
+        except KeyError:
+            raise UnrecoverableException(
+                "Unable to find ssl certificate for {environment}".format(environment=self.environment))
+
+
+def get_environment_context(environment):
+    if environment not in _environment_contexts:
+        _environment_contexts[environment] = EnvironmentContext(environment)
+    return _environment_contexts[environment]
+
+
+def forget_environment_context(environment):
+    _environment_contexts.pop(environment, None)
 
 
 def get_region_for_environment(environment):
-    global local_cache
-    if 'region' not in local_cache:
-        if environment:
-            local_cache['region'] = EnvironmentConfiguration(environment).get_config()[environment]['region']
-        else:
-            # Get the region from the AWS credentials used to execute cloudlift
-            aws_session = boto3.session.Session()
-            local_cache['region'] = aws_session.region_name
-
-    return local_cache['region']
+    return get_environment_context(environment).region
 
 
 def get_environment_level_alb_listener(environment):
-    env_spec = EnvironmentConfiguration(environment).get_config()[environment]
-    if 'loadbalancer_listener_arn' not in env_spec:
-        raise UnrecoverableException('environment level ALB not defined. ' +
-                                     'Please run update_environment and set "loadbalancer_listener_arn".')
-
-    return env_spec['loadbalancer_listener_arn']
+    return get_environment_context(environment).alb_listener_arn
 
 
 def get_service_templates_bucket_for_environment(environment):
-    global local_cache
-
-    if 'bucket' not in local_cache:
-        config = EnvironmentConfiguration(environment).get_config()
-
-        if 'service_templates_bucket' not in config[environment]:
-            return None
-
-        local_cache['bucket'] = config[environment]['service_templates_bucket']
-
-    return local_cache['bucket']
+    return get_environment_context(environment).service_templates_bucket
 
 
 def get_client_for(resource, environment):
-    return boto3.session.Session(
-        region_name=get_region_for_environment(environment)
-    ).client(resource)
+    return get_client(resource, get_region_for_environment(environment))
 
 
 def get_resource_for(resource, environment):
-    return boto3.session.Session(
-        region_name=get_region_for_environment(environment)
-    ).resource(resource)
+    return get_resource(resource, get_region_for_environment(environment))
 
 
 def get_notifications_arn_for_environment(environment):
-    try:
-        return EnvironmentConfiguration(
-            environment
-        ).get_config()[environment]['environment']["notifications_arn"]
-    except KeyError:
-        raise UnrecoverableException("Unable to find notifications arn for {environment}".format(**locals()))
+    return get_environment_context(environment).notifications_arn
 
 
 def get_ssl_certification_for_environment(environment):
-    try:
-        return EnvironmentConfiguration(
-            environment
-        ).get_config()[environment]['environment']["ssl_certificate_arn"]
-    except KeyError:
-        raise UnrecoverableException("Unable to find ssl certificate for {environment}".format(**locals()))
+    return get_environment_context(environment).ssl_certificate_arn
@@ -1,7 +1,17 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
 from cloudlift.config import get_client_for
-from cloudlift.config.logging import log
+from cloudlift.config.logging import log, log_warning
+from cloudlift.utils import chunks
 import json
 
+SECRETS_BATCH_SIZE = 20
+SECRETS_FETCH_CONCURRENCY = 8
+CONTENT_HASH_TAG = 'cloudlift_content_hash'
+
 _secret_manager_cache = {}
 
 
@@ -9,23 +19,116 @@ def set_secrets_manager_config(env, secret_name, config):
     client = get_client_for('secretsmanager', env)
     secret_string = json.dumps(config)
     try:
-        client.put_secret_value(SecretId=secret_name, SecretString=secret_string)
+        response = client.put_secret_value(SecretId=secret_name, SecretString=secret_string)
+    except client.exceptions.ResourceNotFoundException:
+        response = client.create_secret(Name=secret_name, SecretString=secret_string)
+    _tag_content_hash(client, secret_name, config, response['VersionId'])
+    _secret_manager_cache[secret_name] = {'secrets': config,
+                                          'ARN': f"{response['ARN']}:::{response['VersionId']}"}
+    return _secret_manager_cache[secret_name]
+
+
+def set_secrets_manager_config_if_changed(env, secret_name, config):
+    '''
+        Make sure the secret holds config and return the ARN of its current
+        version. The content hash tag written with each value names the
+        version it describes, and lets an unchanged secret be confirmed from
+        its metadata alone, without reading the value back. Roles that may
+        not describe the secret fall back to reading and comparing it.
+    '''
+    client = get_client_for('secretsmanager', env)
+    try:
+        metadata = client.describe_secret(SecretId=secret_name)
+    except client.exceptions.ResourceNotFoundException:
+        log_warning(f'secret {secret_name} does not exist. It will be created')
+        return set_secrets_manager_config(env, secret_name, config)['ARN']
+    except ClientError as err:
+        if err.response['Error']['Code'] != 'AccessDeniedException':
+            raise
+        log_warning(f'Unable to describe secret {secret_name}, comparing its value instead: {err}')
+        return _set_secrets_manager_config_if_value_changed(client, env, secret_name, config)
+    tags = {tag['Key']: tag['Value'] for tag in metadata.get('Tags', [])}
+    current_version = next((version for version, stages in metadata.get('VersionIdsToStages', {}).items()
+                            if 'AWSCURRENT' in stages), None)
+    tagged_hash, _, tagged_version = tags.get(CONTENT_HASH_TAG, '').partition(':')
+    if current_version is None or tagged_version != current_version:
+        # The tag is missing, or describes an older version because it could
+        # not be written with the current one
+        return _set_secrets_manager_config_if_value_changed(client, env, secret_name, config)
+    if tagged_hash == content_hash(config):
+        return f"{metadata['ARN']}:::{current_version}"
+    log(f"Updating {secret_name}")
+    return set_secrets_manager_config(env, secret_name, config)['ARN']
+
+
+def _set_secrets_manager_config_if_value_changed(client, env, secret_name, config):
+    try:
+        existing = get_config(secret_name, env)
     except client.exceptions.ResourceNotFoundException:
-        client.create_secret(Name=secret_name, SecretString=secret_string)
-    clear_cache()
+        log_warning(f'secret {secret_name} does not exist. It will be created')
+        return set_secrets_manager_config(env, secret_name, config)['ARN']
+    if existing['secrets'] != config:
+        log(f"Updating {secret_name}")
+        return set_secrets_manager_config(env, secret_name, config)['ARN']
+    _tag_content_hash(client, secret_name, config, existing['ARN'].rpartition(':::')[2])
+    return existing['ARN']
+
+
+def _tag_content_hash(client, secret_name, config, version_id):
+    try:
+        client.tag_resource(SecretId=secret_name,
+                            Tags=[{'Key': CONTENT_HASH_TAG, 'Value': f'{content_hash(config)}:{version_id}'}])
+    except ClientError as err:
+        log_warning(f'Unable to tag secret {secret_name} with its content hash: {err}')
+
+
+def content_hash(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
 
 
 def get_config(secret_name, env):
     if secret_name not in _secret_manager_cache:
         log(f"Fetching config from AWS secrets manager for secret {secret_name}")
         response = get_client_for('secretsmanager', env).get_secret_value(SecretId=secret_name)
-        log(f"Fetched secret {secret_name}. Version: {response['VersionId']}")
-        secret_val = json.loads(response['SecretString'])
-        _secret_manager_cache[secret_name] = {'secrets': secret_val,
-                                              'ARN': f"{response['ARN']}:::{response['VersionId']}"}
+        _cache_secret_value(secret_name, response)
     return _secret_manager_cache[secret_name]
 
 
+def get_configs(secret_names, env):
+    '''
+        Fetch several secrets at once, returning {secret_name: {'secrets', 'ARN'}}.
+        Uses batch_get_secret_value where the installed botocore supports it and
+        concurrent get_secret_value calls otherwise, or when the batch call is
+        rejected, e.g. by an IAM policy that only allows GetSecretValue. Secrets
+        the batch call could not return are fetched individually, so that their
+        errors surface as they would from get_config.
+    '''
+    missing = [name for name in dict.fromkeys(secret_names) if name not in _secret_manager_cache]
+    if missing:
+        client = get_client_for('secretsmanager', env)
+        if hasattr(client, 'batch_get_secret_value'):
+            for batch in chunks(missing, SECRETS_BATCH_SIZE):
+                log(f"Fetching config from AWS secrets manager for secrets {', '.join(batch)}")
+                try:
+                    response = client.batch_get_secret_value(SecretIdList=batch)
+                except ClientError as err:
+                    log_warning(f"Unable to fetch secrets in batch, fetching them one by one: {err}")
+                    break
+                for secret_value in response['SecretValues']:
+                    _cache_secret_value(secret_value['Name'], secret_value)
+        with ThreadPoolExecutor(max_workers=SECRETS_FETCH_CONCURRENCY) as executor:
+            list(executor.map(lambda name: get_config(name, env),
+                              [name for name in missing if name not in _secret_manager_cache]))
+    return {name: _secret_manager_cache[name] for name in secret_names}
+
+
+def _cache_secret_value(secret_name, response):
+    log(f"Fetched secret {secret_name}. Version: {response['VersionId']}")
+    secret_val = json.loads(response['SecretString'])
+    _secret_manager_cache[secret_name] = {'secrets': secret_val,
+                                          'ARN': f"{response['ARN']}:::{response['VersionId']}"}
+
+
 def clear_cache():
     global _secret_manager_cache
     _secret_manager_cache = {}
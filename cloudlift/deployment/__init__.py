@@ -7,7 +7,9 @@ from .environment_creator import *
 from .progress import *
 from .service_creator import *
 from .service_information_fetcher import *
+from .service_status_poller import *
 from .service_template_generator import *
 from .service_updater import *
+from .multi_service_updater import *
 from .template_generator import *
 from .ecr import *
\ No newline at end of file
@@ -0,0 +1,129 @@
+'''
+Content hash of a Docker build context.
+
+The hash covers the inputs of a build that cloudlift controls: the
+dockerfile, the build args, the target platforms and every file of the
+context that .dockerignore does not exclude. Two builds with the same hash
+can reuse the same image, so an image tagged with the hash is reused
+instead of being built again.
+'''
+
+import hashlib
+import os
+import re
+import stat
+
+DOCKERIGNORE_FILE = '.dockerignore'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def build_context_hash(working_dir, dockerfile_path, build_args=None, platforms=None):
+    digest = hashlib.sha256()
+    with open(dockerfile_path, 'rb') as f:
+        digest.update(b'dockerfile\0' + hashlib.sha256(f.read()).digest())
+    for key, value in sorted((build_args or {}).items()):
+        digest.update('build-arg\0{}\0{}\0'.format(key, value).encode())
+    for platform in sorted(platforms or []):
+        digest.update('platform\0{}\0'.format(platform).encode())
+    for path, file_hash in context_files(working_dir):
+        digest.update('file\0{}\0'.format(path).encode() + file_hash)
+    return digest.hexdigest()
+
+
+def context_files(working_dir):
+    '''
+        Yield (path relative to working_dir, content hash) for every file
+        of the build context, in a stable order.
+    '''
+    ignore_patterns = _read_dockerignore(working_dir)
+    can_prune = not any(negated for negated, _ in ignore_patterns)
+    for directory, dir_names, file_names in os.walk(working_dir):
+        relative_dir = os.path.relpath(directory, working_dir)
+        relative_dir = '' if relative_dir == '.' else relative_dir.replace(os.sep, '/') + '/'
+        if can_prune:
+            dir_names[:] = [name for name in dir_names if not _is_ignored(relative_dir + name, ignore_patterns)]
+        dir_names.sort()
+        for name in sorted(file_names):
+            path = relative_dir + name
+            if not _is_ignored(path, ignore_patterns):
+                yield path, _file_hash(os.path.join(directory, name))
+
+
+def _file_hash(path):
+    mode = os.lstat(path).st_mode
+    digest = hashlib.sha256(b'x' if mode & stat.S_IXUSR else b'-')
+    if stat.S_ISLNK(mode):
+        digest.update(b'link\0' + os.readlink(path).encode())
+    else:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.digest()
+
+
+def _read_dockerignore(working_dir):
+    try:
+        with open(os.path.join(working_dir, DOCKERIGNORE_FILE)) as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    patterns = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        negated = line.startswith('!')
+        pattern = os.path.normpath(line.lstrip('!').strip()).replace(os.sep, '/').lstrip('/')
+        if pattern and pattern != '.':
+            patterns.append((negated, _pattern_regex(pattern)))
+    return patterns
+
+
+def _is_ignored(path, ignore_patterns):
+    '''
+        Like docker, a path is matched by a pattern that matches the path or
+        any of its parent directories, and the last matching pattern wins.
+    '''
+    parts = path.split('/')
+    candidates = ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+    ignored = False
+    for negated, regex in ignore_patterns:
+        if any(regex.match(candidate) for candidate in candidates):
+            ignored = not negated
+    return ignored
+
+
+def _pattern_regex(pattern):
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+            continue
+        if char == '*':
+            regex += '[^/]*'
+        elif char == '?':
+            regex += '[^/]'
+        elif char == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                char_class = pattern[i + 1:end].replace('\\', '\\\\')
+                if char_class.startswith('!'):
+                    char_class = '^' + char_class[1:]
+                regex += '[' + char_class + ']'
+                i = end
+        elif char == '\\' and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(char)
+        i += 1
+    return re.compile(regex + '$')
@@ -1,20 +1,23 @@
 import os
+from contextlib import contextmanager
 from datetime import datetime
 from glob import glob
 from pprint import pformat
 from time import sleep, time
 
-import boto3
 from deepdiff import DeepDiff
 
 from cloudlift.config import ParameterStore
 from cloudlift.config import secrets_manager
-from cloudlift.config.logging import log_bold, log_err, log_intent, log_with_color, log_warning, log
+from cloudlift.config.aws_clients import get_client
+from cloudlift.config.logging import log_bold, log_err, log_intent, log_with_color
 from cloudlift.deployment.ecs import DeployAction
-from cloudlift.deployment.ecs import EcsTaskDefinition
+from cloudlift.deployment.ecs import EcsTaskDefinition, TASK_DEFINITION_HASH_TAG
+from cloudlift.deployment.progress import EventWatermark
 from cloudlift.deployment.task_definition_builder import TaskDefinitionBuilder
 from cloudlift.exceptions import UnrecoverableException
 
+_resolved_config = None
 
 
 def find_essential_container(container_definitions):
@@ -24,17 +27,19 @@ def find_essential_container(container_definitions):
     raise UnrecoverableException('no essential containers found')
 
 
-def revert_deployment(client, cluster_name, ecs_service_name, color, timeout_seconds, deployment_identifier, **kwargs):
+def revert_deployment(client, cluster_name, ecs_service_name, color, timeout_seconds, deployment_identifier,
+                      status_poller=None, **kwargs):
     deployment = DeployAction(client, cluster_name, ecs_service_name)
     previous_task_defn = deployment.get_task_definition_by_deployment_identifier(deployment.service,
                                                                                  deployment_identifier)
-    deploy_task_definition(client, previous_task_defn, cluster_name, ecs_service_name, color, timeout_seconds, 'Revert')
+    deploy_task_definition(client, previous_task_defn, cluster_name, ecs_service_name, color, timeout_seconds, 'Revert',
+                           status_poller)
 
 
 def deploy_new_version(client, cluster_name, ecs_service_name, ecs_service_logical_name, deployment_identifier,
                        service_name, sample_env_file_path,
                        timeout_seconds, env_name, secrets_name, service_configuration, region, ecr_image_uri,
-                       color='white'):
+                       color='white', status_poller=None, image_upload=None):
     task_definition = create_new_task_definition(
         color=color,
         ecr_image_uri=ecr_image_uri,
@@ -49,19 +54,25 @@ def deploy_new_version(client, cluster_name, ecs_service_name, ecs_service_logic
         ecs_service_logical_name=ecs_service_logical_name,
         service_configuration=service_configuration,
         region=region,
+        image_upload=image_upload,
     )
-    deploy_task_definition(client, task_definition, cluster_name, ecs_service_name, color, timeout_seconds, 'Deploy')
+    deploy_task_definition(client, task_definition, cluster_name, ecs_service_name, color, timeout_seconds, 'Deploy',
+                           status_poller)
 
 
-def deploy_task_definition(client, task_definition, cluster_name, ecs_service_name, color, timeout_secs, action_name):
+def deploy_task_definition(client, task_definition, cluster_name, ecs_service_name, color, timeout_secs, action_name,
+                           status_poller=None):
     deployment = DeployAction(client, cluster_name, ecs_service_name)
+    if is_already_deployed(deployment.service, task_definition):
+        log_with_color(f"{ecs_service_name} is already running {task_definition.arn}. Skipping {action_name}.", color)
+        return
     log_with_color(f"Starting {action_name} for {ecs_service_name}", color)
     if deployment.service.desired_count == 0:
         desired_count = 1
     else:
         desired_count = deployment.service.desired_count
     deployment.service.set_desired_count(desired_count)
-    deployment_succeeded = deploy_and_wait(deployment, task_definition, color, timeout_secs)
+    deployment_succeeded = deploy_and_wait(deployment, task_definition, color, timeout_secs, status_poller)
     if not deployment_succeeded:
         record_deployment_failure_metric(deployment.cluster_name, deployment.service_name)
         raise UnrecoverableException(ecs_service_name + f" {action_name} failed.")
@@ -70,13 +81,16 @@ def deploy_task_definition(client, task_definition, cluster_name, ecs_service_na
 
 def create_new_task_definition(color, ecr_image_uri, ecs_service_name, env_name,
                                sample_env_file_path, secrets_name, service_name, client, cluster_name,
-                               deployment_identifier, ecs_service_logical_name, service_configuration, region):
+                               deployment_identifier, ecs_service_logical_name, service_configuration, region,
+                               image_upload=None):
     deployment = DeployAction(client, cluster_name, ecs_service_name)
     task_definition = deployment.get_current_task_definition(deployment.service)
     essential_container = find_essential_container(task_definition[u'containerDefinitions'])
     container_configurations = build_config(env_name, service_name, ecs_service_logical_name, sample_env_file_path,
                                             essential_container,
                                             secrets_name)
+    if image_upload is not None:
+        ecr_image_uri = image_upload.wait_for_image_uri()
     task_definition.compute_diffs(essential_container, ecr_image_uri)
     print_task_diff(ecs_service_name, task_definition.diff, color)
 
@@ -97,14 +111,29 @@ def create_new_task_definition(color, ecr_image_uri, ecs_service_name, env_name,
 
     if diff:
         log_with_color(f"{ecs_service_name} task definition diffs: {pformat(diff)}", color)
+    if task_definition.tags.get(TASK_DEFINITION_HASH_TAG) == updated_task_definition.content_hash:
+        reused_task_definition = deployment.reuse_task_definition(task_definition, deployment_identifier)
+        if reused_task_definition is not None:
+            log_with_color(f"{ecs_service_name} task definition unchanged. Reusing {task_definition.arn}", color)
+            return reused_task_definition
+        log_with_color(f"{ecs_service_name} task definition unchanged but cannot be reused. "
+                       f"Registering a new revision", color)
     return deployment.update_task_definition(updated_task_definition, deployment_identifier)
 
 
-def deploy_and_wait(deployment, new_task_definition, color, timeout_seconds):
-    existing_events = fetch_events(deployment.get_service())
+def deploy_and_wait(deployment, new_task_definition, color, timeout_seconds, status_poller=None):
+    event_watermark = EventWatermark('id', 'createdAt')
+    event_watermark.mark(deployment.get_service().get(u'events'))
     deploy_end_time = time() + timeout_seconds
     deployment.deploy(new_task_definition)
-    return wait_for_finish(deployment, existing_events, color, deploy_end_time)
+    if status_poller is None:
+        return wait_for_finish(deployment, event_watermark, color, deploy_end_time)
+
+    status_poller.watch(deployment.cluster_name, deployment.service_name)
+    try:
+        return wait_for_finish(deployment, event_watermark, color, deploy_end_time, status_poller)
+    finally:
+        status_poller.unwatch(deployment.cluster_name, deployment.service_name)
 
 
 def get_env_sample_file_name(namespace):
@@ -129,12 +158,14 @@ def get_namespaces_from_directory(directory_path):
 
 
 def find_duplicate_keys(directory_path, namespaces):
+    return _find_duplicate_keys({ns: get_sample_keys(directory_path, ns) for ns in namespaces})
+
+
+def _find_duplicate_keys(sample_keys_by_namespace):
     duplicates = []
     all_keys = set()
-    sorted_namespaces = list(namespaces)
-    sorted_namespaces.sort()
-    for ns in sorted_namespaces:
-        keys_for_namespace = get_sample_keys(directory_path, ns)
+    for ns in sorted(sample_keys_by_namespace):
+        keys_for_namespace = sample_keys_by_namespace[ns]
         duplicates_for_namespace = all_keys.intersection(keys_for_namespace)
         if duplicates_for_namespace:
             duplicates.append(
@@ -157,11 +188,8 @@ def build_config(env_name, service_name, ecs_service_name, sample_env_file_path,
     secrets = {}
     env = {}
     if secrets_name is None:
-        sample_config_keys = set(read_config(open(sample_env_file_path).read()))
-        env_config_param_store = _get_parameter_store_config(service_name, env_name)
-        _validate_config_availability(sample_config_keys,
-                                      set(env_config_param_store))
-        env = {k: env_config_param_store[k] for k in sample_config_keys}
+        env = _resolve_once(('parameter_store', env_name, service_name, sample_env_file_path),
+                            lambda: _get_parameter_store_env(env_name, service_name, sample_env_file_path))
     else:
         sample_env_folder_path = os.getcwd()
         secrets = build_secrets_for_all_namespaces(env_name, service_name, ecs_service_name, sample_env_folder_path,
@@ -173,43 +201,87 @@ def get_automated_injected_secret_name(env_name, service_name, ecs_service_name)
     return f"cloudlift-injected/{env_name}/{service_name}/{ecs_service_name}"
 
 
-def build_secrets_for_all_namespaces(env_name, service_name, ecs_service_name, sample_env_folder_path, secrets_name):
+@contextmanager
+def resolved_config_scope():
+    '''
+        Resolves each env sample, secret and parameter store lookup at most
+        once while the scope is open. Worker processes forked inside the
+        scope inherit everything the parent has already resolved.
+    '''
+    global _resolved_config
+    previous = _resolved_config
+    if previous is None:
+        _resolved_config = {}
+    try:
+        yield
+    finally:
+        _resolved_config = previous
+
+
+def resolve_config(env_name, service_name, sample_env_file_path, secrets_names, sample_env_folder_path=None):
+    sample_env_folder_path = sample_env_folder_path or os.getcwd()
+    for secrets_name in set(secrets_names):
+        if secrets_name is None:
+            _resolve_once(('parameter_store', env_name, service_name, sample_env_file_path),
+                          lambda: _get_parameter_store_env(env_name, service_name, sample_env_file_path))
+        else:
+            get_secrets_for_all_namespaces(env_name, sample_env_folder_path, secrets_name)
+
+
+def _resolve_once(key, resolve):
+    if _resolved_config is None:
+        return resolve()
+    if key not in _resolved_config:
+        _resolved_config[key] = resolve()
+    return _resolved_config[key]
+
+
+def get_secrets_for_all_namespaces(env_name, sample_env_folder_path, secrets_name):
+    return _resolve_once(('namespace_secrets', env_name, sample_env_folder_path, secrets_name),
+                         lambda: _fetch_secrets_for_all_namespaces(env_name, sample_env_folder_path, secrets_name))
+
+
+def _fetch_secrets_for_all_namespaces(env_name, sample_env_folder_path, secrets_name):
     secrets_across_namespaces = {}
-    namespaces = get_namespaces_from_directory(sample_env_folder_path)
-    duplicates = find_duplicate_keys(sample_env_folder_path, namespaces)
+    sample_keys_by_namespace = {ns: get_sample_keys(sample_env_folder_path, ns)
+                                for ns in get_namespaces_from_directory(sample_env_folder_path)}
+    duplicates = _find_duplicate_keys(sample_keys_by_namespace)
     if len(duplicates) != 0:
         raise UnrecoverableException('duplicate keys found in env sample files {} '.format(duplicates))
-    for namespace in namespaces:
-        secrets_for_namespace = _get_secrets_for_namespace(env_name, namespace,
-                                                           sample_env_folder_path,
-                                                           secrets_name)
+    secret_names = {ns: get_secret_name(secrets_name, ns) for ns in sample_keys_by_namespace}
+    configs = secrets_manager.get_configs(list(secret_names.values()), env_name)
+    for namespace, sample_config_keys in sample_keys_by_namespace.items():
+        secrets_for_namespace = _select_secrets_for_namespace(sample_config_keys,
+                                                              configs[secret_names[namespace]]['secrets'])
         secrets_across_namespaces.update(secrets_for_namespace)
+    return secrets_across_namespaces
+
+
+def build_secrets_for_all_namespaces(env_name, service_name, ecs_service_name, sample_env_folder_path, secrets_name):
+    secrets_across_namespaces = get_secrets_for_all_namespaces(env_name, sample_env_folder_path, secrets_name)
 
     automated_secret_name = get_automated_injected_secret_name(env_name, service_name, ecs_service_name)
-    existing_secrets = {}
-    try:
-        existing_secrets = secrets_manager.get_config(automated_secret_name, env_name)['secrets']
-    except Exception as err:
-        log_warning(f'secret {automated_secret_name} does not exist. It will be created: {err}')
-    if existing_secrets != secrets_across_namespaces:
-        log(f"Updating {automated_secret_name}")
-        secrets_manager.set_secrets_manager_config(env_name, automated_secret_name,
-                                                   secrets_across_namespaces)
-    arn = secrets_manager.get_config(automated_secret_name, env_name)['ARN']
+    arn = secrets_manager.set_secrets_manager_config_if_changed(env_name, automated_secret_name,
+                                                                secrets_across_namespaces)
     return dict(CLOUDLIFT_INJECTED_SECRETS=arn)
 
 
-def _get_secrets_for_namespace(env_name, namespace, sample_env_folder_path, secrets_name):
-    inferred_secrets_name = get_secret_name(secrets_name, namespace)
-    secrets_for_namespace = secrets_manager.get_config(inferred_secrets_name, env_name)['secrets']
-    sample_config_keys = get_sample_keys(sample_env_folder_path, namespace)
+def _select_secrets_for_namespace(sample_config_keys, secrets_for_namespace):
     _validate_config_availability(sample_config_keys, set(secrets_for_namespace.keys()))
     return {k: secrets_for_namespace[k] for k in sample_config_keys}
 
 
-def _get_parameter_store_config(service_name, env_name):
+def _get_parameter_store_env(env_name, service_name, sample_env_file_path):
+    sample_config_keys = set(read_config(open(sample_env_file_path).read()))
+    env_config_param_store = _get_parameter_store_config(service_name, env_name, sample_config_keys)
+    _validate_config_availability(sample_config_keys,
+                                  set(env_config_param_store))
+    return {k: env_config_param_store[k] for k in sorted(sample_config_keys)}
+
+
+def _get_parameter_store_config(service_name, env_name, keys):
     try:
-        environment_config, _ = ParameterStore(service_name, env_name).get_existing_config()
+        environment_config = ParameterStore(service_name, env_name).get_config_for_keys(keys)
     except Exception as err:
         log_intent(str(err))
         ex_msg = f"Cannot find the configuration in parameter store [env: ${env_name} | service: ${service_name}]."
@@ -234,20 +306,28 @@ def read_config(file_content):
     return config
 
 
-def wait_for_finish(action, existing_events, color, deploy_end_time):
+def wait_for_finish(action, event_watermark, color, deploy_end_time, status_poller=None):
+    polled_at = time()
     while time() <= deploy_end_time:
-        service = action.get_service()
-        existing_events = fetch_and_print_new_events(service, existing_events, color)
+        if status_poller is None:
+            service = action.get_service()
+        else:
+            service, polled_at = status_poller.wait_for_service(action.cluster_name, action.service_name,
+                                                                polled_at, deploy_end_time)
+            if service is None:
+                break
+        print_new_service_events(service, event_watermark, color)
         if is_deployed(service):
             return True
-        sleep(5)
+        if status_poller is None:
+            sleep(5)
 
     log_err("Deployment timed out!")
     return False
 
 
 def record_deployment_failure_metric(cluster_name, service_name):
-    cloudwatch_client = boto3.client('cloudwatch')
+    cloudwatch_client = get_client('cloudwatch')
     cloudwatch_client.put_metric_data(
         Namespace='ECS/DeploymentMetrics',
         MetricData=[
@@ -276,16 +356,13 @@ def is_deployed(service):
     return False
 
 
-def fetch_events(service):
-    return sorted(service.get(u'events'), key=lambda k: k['createdAt'])
+def is_already_deployed(service, task_definition):
+    return service.task_definition == task_definition.arn and service.desired_count != 0 and is_deployed(service)
 
 
-def fetch_and_print_new_events(service, existing_events, color):
-    all_events = fetch_events(service)
-    new_events = [evnt for evnt in all_events if evnt not in existing_events]
-    for event in new_events:
+def print_new_service_events(service, event_watermark, color):
+    for event in event_watermark.take_new(service.get(u'events')):
         log_with_color(event['message'].replace("(", "").replace(")", "")[8:], color)
-    return all_events
 
 
 def print_task_diff(ecs_service_name, diffs, color):
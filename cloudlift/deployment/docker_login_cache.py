@@ -0,0 +1,74 @@
+'''
+Local on-disk record of Docker logins to ECR registries.
+
+An ECR authorization token is valid for 12 hours and docker keeps the
+credentials in its own config, so a login only needs to be repeated when
+the token is about to expire. The expiry of every login is recorded per
+registry and Docker config directory, and is shared by later pushes of the
+same run and by later runs on the same machine.
+'''
+
+import json
+import os
+from datetime import datetime, timedelta
+from tempfile import NamedTemporaryFile
+
+from dateutil.parser import parse as parse_datetime
+from dateutil.tz.tz import tzutc
+
+DOCKER_LOGIN_CACHE_PATH = os.environ.get(
+    'CLOUDLIFT_DOCKER_LOGIN_CACHE_PATH',
+    os.path.join(os.path.expanduser('~'), '.cloudlift', 'docker_logins.json'),
+)
+DOCKER_LOGIN_REFRESH_MARGIN = timedelta(minutes=30)
+
+
+class DockerLoginCache(object):
+    '''
+        Expiry of Docker logins keyed by registry. Any error reading or
+        writing the cache is treated as a miss.
+    '''
+
+    def __init__(self, path=None):
+        self.path = path or DOCKER_LOGIN_CACHE_PATH
+
+    def is_logged_in(self, registry):
+        expires_at = self._read().get(self._key(registry))
+        if not isinstance(expires_at, str):
+            return False
+        try:
+            return parse_datetime(expires_at) - DOCKER_LOGIN_REFRESH_MARGIN > datetime.now(tzutc())
+        except (TypeError, ValueError, OverflowError):
+            return False
+
+    def put(self, registry, expires_at):
+        logins = self._read()
+        logins[self._key(registry)] = expires_at.isoformat()
+        self._write(logins)
+
+    def forget(self, registry):
+        logins = self._read()
+        if logins.pop(self._key(registry), None) is not None:
+            self._write(logins)
+
+    def _key(self, registry):
+        docker_config = os.environ.get('DOCKER_CONFIG', os.path.join(os.path.expanduser('~'), '.docker'))
+        return '{}|{}'.format(os.path.abspath(docker_config), registry)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                logins = json.load(f)
+            return logins if isinstance(logins, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, logins):
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f:
+                json.dump(logins, f)
+            os.replace(f.name, self.path)
+        except OSError:
+            pass
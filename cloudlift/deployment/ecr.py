@@ -1,22 +1,48 @@
 import base64
+import multiprocessing
+import re
 import subprocess
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+from time import time
+from urllib.request import urlopen
 
-import boto3
 import json
+from botocore.exceptions import BotoCoreError, ClientError
 from stringcase import spinalcase
 import os
 
 from cloudlift.config.logging import log_bold, log_err, log_intent, log_warning
 from cloudlift.exceptions import UnrecoverableException
 from cloudlift.config.account import get_account_id
+from cloudlift.config.aws_clients import get_client
+from cloudlift.deployment.build_context import build_context_hash
+from cloudlift.deployment.docker_login_cache import DockerLoginCache
+from cloudlift.deployment.image_promotion import copy_image, LAYER_DOWNLOAD_TIMEOUT_SECONDS, \
+    MANIFEST_LIST_MEDIA_TYPES, MANIFEST_MEDIA_TYPES
 
 ECR_DOCKER_PATH = "{}.dkr.ecr.{}.amazonaws.com/{}"
 DEFAULT_DOCKER_FILE = "Dockerfile"
+REGISTRY_CACHE_TAG = "cloudlift-build-cache"
+BUILDX_BUILDER = "cloudlift"
+CONTEXT_TAG_PREFIX = "context-"
+DOCKER_AUTH_ERROR_MARKERS = ('no basic auth credentials', 'authorization token has expired', 'unauthorized')
+BUILD_OUTPUT_TAIL_LINES = 200
+MISSING_IMAGE_ERROR_CODES = ('ImageNotFoundException', 'RepositoryNotFoundException')
+TAG_CONCURRENCY = 10
+TAG_ADDED = 'added'
+TAG_EXISTS = 'exists'
+TAG_FAILED = 'failed'
+IMAGE_UPLOAD_TIMEOUT_SECONDS = int(os.environ.get('CLOUDLIFT_IMAGE_UPLOAD_TIMEOUT_SECONDS', 3600))
+IMAGE_UPLOAD_POLL_SECONDS = 5
 
 
 class ECR:
     def __init__(self, region, repo_name, account_id=None, assume_role_arn=None, version=None,
-                 build_args=None, dockerfile=None, working_dir='.', ssh=None, cache_from=None):
+                 build_args=None, dockerfile=None, working_dir='.', ssh=None, cache_from=None,
+                 registry_cache=False, content_version=False, platforms=None):
         self.repo_name = repo_name
         self.region = region
         self.account_id = account_id or get_account_id()
@@ -27,50 +53,84 @@ class ECR:
         self.working_dir = working_dir
         self.ssh = ssh
         self.cache_from = cache_from
+        self.registry_cache = registry_cache
+        self.content_version = content_version
+        self.platforms = [platform.strip() for value in (platforms or []) for platform in value.split(',')
+                          if platform.strip()]
+        self._manifests = {}
+        self._git_commit = None
 
     def ensure_image_in_ecr(self):
         if self.version:
             log_intent("Using commit hash " + self.version + " to find image")
-            image = self._find_image_in_ecr(self.version)
-            if not image:
+            version_tags = [self._epoch_tag()]
+            digests = self._find_image_digests([self.version] + version_tags)
+            if self.version not in digests:
                 log_warning("Please build, tag and upload the image for the \
 commit " + self.version)
                 raise UnrecoverableException("Image for given version could not be found.")
+            if not self._has_platforms(digests[self.version]):
+                log_warning("Image for the commit " + self.version + " is not built for " + ", ".join(self.platforms))
         else:
-            dirty = subprocess.check_output(
-                ["git", "status", "--short"]
-            ).decode("utf-8")
+            dirty = self._is_build_context_dirty()
             if dirty:
                 log_intent("Repository has uncommitted changes. Marking version as dirty.")
                 self.version = '{}-dirty'.format(self._derive_version())
-                image = None
             else:
                 self.version = self._derive_version()
-                image = self._find_image_in_ecr(self.version)
+            context_tag = self._context_tag() if self.content_version else None
+            version_tags = [tag for tag in [self._epoch_tag(), context_tag] if tag]
+            lookup_tags = [self.version] + version_tags
+            digests = self._find_image_digests(lookup_tags) if context_tag or not dirty else {}
+            if dirty:
+                digests.pop(self.version, None)
+            if self.version in digests and not self._has_platforms(digests[self.version]):
+                log_intent("Image in ECR is not built for " + ", ".join(self.platforms))
+                digests.pop(self.version)
 
             log_intent("Version parameter was not provided. Determined version to be " +
                        self.version + " based on current status")
-            if image:
+            if self.version in digests:
                 log_intent("Image found in ECR")
+            elif context_tag in digests:
+                log_intent("Build context is unchanged. Reusing image " + context_tag)
+                result = self._add_image_tags(context_tag, [self.version], digests)[self.version]
+                if result['status'] == TAG_FAILED:
+                    raise UnrecoverableException("Unable to tag the image: " + result['error'])
+                digests[self.version] = digests[context_tag]
             else:
                 log_bold("Image not found in ECR. Building image")
                 self._build_image()
-                self._push_image()
-                image = self._find_image_in_ecr(self.version)
-        try:
-            image_manifest = image['imageManifest']
-            self.client.put_image(
-                repositoryName=self.repo_name,
-                imageTag=self.version,
-                imageManifest=image_manifest
-            )
-        except Exception:
-            pass
-        self._add_image_tag(self.version, f'{self.version}-{self._git_epoch_time()}')
+                if not self.platforms:
+                    self._push_image()
+                digests = self._find_image_digests(lookup_tags)
+        self._add_image_tags(self.version, version_tags, digests)
 
     def add_tags(self, additional_tags):
-        for new_tag in additional_tags:
-            self._add_image_tag(self.version, new_tag)
+        '''
+            Point each of the additional tags at the image of the current
+            version. Returns a result per tag: {'status': TAG_ADDED},
+            {'status': TAG_EXISTS} when the tag already points at the image,
+            or {'status': TAG_FAILED, 'error': message}.
+        '''
+        return self._add_image_tags(self.version, additional_tags)
+
+    def promote_from(self, source):
+        '''
+            Copy the image of source.version into this repository through
+            the registry API, without a local Docker daemon. Nothing is
+            copied when the version already points at the same image.
+        '''
+        self.version = self.version or source.version
+        source_digest = source._find_image_in_ecr(source.version)
+        if source_digest is None:
+            raise UnrecoverableException("Image {} not found in {}".format(source.version, source.repo_path))
+        if self._find_image_in_ecr(self.version) == source_digest:
+            log_intent("Image found in ECR")
+            return
+        log_bold("Promoting {} to {}".format(source.image_uri, self.image_uri))
+        copy_image(source, self, source.version, self.version)
+        log_intent("Promoted the image to ECR successfully.")
 
     def upload_artefacts(self):
         self.ensure_repository()
@@ -79,9 +139,7 @@ commit " + self.version)
     def upload_image(self, additional_tags):
         self.ensure_repository()
         self._push_image()
-
-        for new_tag in additional_tags:
-            self._add_image_tag(self.version, new_tag)
+        return self.add_tags(additional_tags)
 
     def ensure_repository(self):
         try:
@@ -147,7 +205,23 @@ commit " + self.version)
     def local_image_uri(self):
         return spinalcase(self.repo_name) + ':' + self.version
 
-    def _login_to_ecr(self):
+    @property
+    def registry_cache_ref(self):
+        cache_tag = REGISTRY_CACHE_TAG
+        if self.dockerfile is not None and self.dockerfile != DEFAULT_DOCKER_FILE:
+            cache_tag = "{}-{}".format(cache_tag, re.sub(r'[^A-Za-z0-9_.-]', '-', self.dockerfile))
+        return "{}:{}".format(self.repo_path, cache_tag)
+
+    def _login_to_ecr(self, force=False):
+        registry = self.repo_path.split('/')[0]
+        login_cache = DockerLoginCache()
+        if not force and login_cache.is_logged_in(registry):
+            log_intent('Reusing Docker login to ECR.')
+            return
+        if force:
+            # The recorded login was rejected by the registry, drop it so a
+            # failed login below is not reused by the next push.
+            login_cache.forget(registry)
         log_intent("Attempting login...")
         auth_token_res = self.client.get_authorization_token()
         user, auth_token = base64.b64decode(
@@ -156,30 +230,64 @@ commit " + self.version)
         ecr_url = auth_token_res['authorizationData'][0]['proxyEndpoint']
         subprocess.check_call(["docker", "login", "-u", user,
                                "-p", auth_token, ecr_url])
+        expires_at = auth_token_res['authorizationData'][0].get('expiresAt')
+        if expires_at:
+            login_cache.put(registry, expires_at)
         log_intent('Docker login to ECR succeeded.')
 
-    def _git_epoch_time(self, git_version=None):
-        return subprocess.check_output(
-            ["git", "show", "-s", "--format=\"%ct\"", git_version or "HEAD"]
-        ).strip().decode("utf-8").replace('"', '')
+    def _epoch_tag(self):
+        return f'{self.version}-{self._git_epoch_time()}'
 
-    def _derive_version(self, git_version=None):
-        log_intent("Finding commit SHA")
+    def _context_tag(self):
+        log_intent("Hashing the build context")
+        dockerfile_path = self.dockerfile or os.path.join(self.working_dir, DEFAULT_DOCKER_FILE)
         try:
-            version_to_find = git_version or "HEAD"
-            commit_sha = subprocess.check_output(
-                ["git", "rev-list", "-n", "1", version_to_find]
-            ).strip().decode("utf-8")
+            return CONTEXT_TAG_PREFIX + build_context_hash(self.working_dir, dockerfile_path, self.build_args,
+                                                           self.platforms)
+        except OSError as err:
+            raise UnrecoverableException("Unable to hash the build context: {}".format(err))
+
+    def _git_epoch_time(self):
+        return self._head_commit()[1]
+
+    def _head_commit(self):
+        '''
+            Commit SHA and commit epoch time of HEAD of the repository that
+            holds the build context, read with one git call and reused for
+            the rest of the command.
+        '''
+        if self._git_commit is None:
+            try:
+                commit_sha, epoch_time = subprocess.check_output(
+                    ["git", "show", "-s", "--format=%H %ct", "HEAD"], cwd=self.working_dir
+                ).decode("utf-8").split()
+            except (subprocess.CalledProcessError, ValueError):
+                raise UnrecoverableException("Commit SHA not found. Given version is not a git tag, \
+branch or commit SHA")
+            self._git_commit = (commit_sha, epoch_time)
+        return self._git_commit
+
+    def _is_build_context_dirty(self):
+        '''
+            Only changes inside the build context and to the dockerfile make
+            the image dirty, so git status is limited to those paths instead
+            of scanning the whole repository.
+        '''
+        build_context_paths = [self.working_dir]
+        if self.dockerfile:
+            build_context_paths.append(self.dockerfile)
+        return bool(subprocess.check_output(
+            ["git", "status", "--porcelain", "--no-renames", "--"] + build_context_paths
+        ).decode("utf-8").strip())
 
-            derived_version = commit_sha
-            if self.dockerfile is not None and self.dockerfile != DEFAULT_DOCKER_FILE:
-                derived_version = "{}-{}".format(derived_version, self.dockerfile)
+    def _derive_version(self):
+        log_intent("Finding commit SHA")
+        derived_version = self._head_commit()[0]
+        if self.dockerfile is not None and self.dockerfile != DEFAULT_DOCKER_FILE:
+            derived_version = "{}-{}".format(derived_version, self.dockerfile)
 
-            log_intent("Derived version is " + derived_version)
-            return derived_version
-        except:
-            raise UnrecoverableException("Commit SHA not found. Given version is not a git tag, \
-branch or commit SHA")
+        log_intent("Derived version is " + derived_version)
+        return derived_version
 
     def _push_image(self):
         local_name = self.local_image_uri
@@ -189,50 +297,176 @@ branch or commit SHA")
         except:
             raise UnrecoverableException("Local image was not found.")
         self._login_to_ecr()
-        subprocess.check_call(["docker", "push", ecr_name])
+        push = self._docker_push(ecr_name)
+        if push.returncode != 0 and _is_docker_auth_error(push.stderr):
+            log_warning('Docker push was not authorized. Logging in to ECR again.')
+            self._login_to_ecr(force=True)
+            push = self._docker_push(ecr_name)
+        if push.returncode != 0:
+            raise UnrecoverableException('docker push exited with status: {}'.format(push.returncode))
         subprocess.check_call(["docker", "rmi", ecr_name])
         log_intent('Pushed the image (' + local_name + ') to ECR sucessfully.')
 
-    def _add_image_tag(self, existing_tag, new_tag):
+    def _docker_push(self, ecr_name):
+        push = subprocess.run(["docker", "push", ecr_name], stderr=subprocess.PIPE)
+        sys.stderr.write(push.stderr.decode("utf-8", "replace"))
+        return push
+
+    def _add_image_tags(self, existing_tag, new_tags, digests=None):
+        new_tags = [str(tag) for tag in dict.fromkeys(new_tags)]
+        if not new_tags:
+            return {}
+        if digests is None:
+            digests = self._find_image_digests([existing_tag] + new_tags)
+        digest = digests.get(existing_tag)
+        tags_to_put = [tag for tag in new_tags if digests.get(tag) != digest]
         try:
-            image_manifest = self.client.batch_get_image(
-                repositoryName=self.repo_name,
-                imageIds=[
-                    {'imageTag': existing_tag}
-                ])['images'][0]['imageManifest']
-            self.client.put_image(
-                repositoryName=self.repo_name,
-                imageTag=new_tag,
-                imageManifest=image_manifest
-            )
-            log_intent(f'Added additional tag: {new_tag}')
-        except:
-            log_err("Unable to add additional tag " + str(new_tag))
+            if digest is None:
+                raise UnrecoverableException(f'Image {existing_tag} not found')
+            image = self._get_image_manifest(digest) if tags_to_put else None
+        except (UnrecoverableException, ClientError, BotoCoreError) as err:
+            results = {tag: {'status': TAG_FAILED, 'error': _error_message(err)} for tag in new_tags}
+        else:
+            results = {tag: {'status': TAG_EXISTS} for tag in new_tags}
+            with ThreadPoolExecutor(max_workers=TAG_CONCURRENCY) as executor:
+                results.update(zip(tags_to_put, executor.map(
+                    lambda tag: self._put_image_tag(tag, image), tags_to_put,
+                )))
+        for tag, result in results.items():
+            if result['status'] == TAG_ADDED:
+                log_intent(f'Added additional tag: {tag}')
+            elif result['status'] == TAG_EXISTS:
+                log_intent(f'Tag {tag} already points at the image')
+            else:
+                log_err(f"Unable to add additional tag {tag}: {result['error']}")
+        return results
+
+    def _put_image_tag(self, tag, image):
+        image_manifest, media_type = image
+        put_image_args = dict(repositoryName=self.repo_name, imageTag=tag, imageManifest=image_manifest)
+        if media_type:
+            put_image_args['imageManifestMediaType'] = media_type
+        try:
+            self.client.put_image(**put_image_args)
+            return {'status': TAG_ADDED}
+        except ClientError as err:
+            if err.response['Error']['Code'] == 'ImageAlreadyExistsException':
+                return {'status': TAG_EXISTS}
+            return {'status': TAG_FAILED, 'error': _error_message(err)}
+        except BotoCoreError as err:
+            return {'status': TAG_FAILED, 'error': _error_message(err)}
 
     def _find_image_in_ecr(self, tag):
+        return self._find_image_digests([tag]).get(tag)
+
+    def _find_image_digests(self, tags):
+        '''
+            Map each of the given tags that exists in the repository to its
+            image digest. All tags are looked up with one describe_images
+            call, which does not download manifests. describe_images fails
+            the whole call when any tag is missing, so on a miss the tags are
+            looked up one by one.
+        '''
+        tags = list(dict.fromkeys(tags))
         try:
-            return self.client.batch_get_image(
+            image_details = self.client.describe_images(
+                repositoryName=self.repo_name,
+                imageIds=[{'imageTag': tag} for tag in tags],
+            )['imageDetails']
+        except ClientError as err:
+            if err.response['Error']['Code'] not in MISSING_IMAGE_ERROR_CODES:
+                raise
+            if len(tags) == 1 or err.response['Error']['Code'] == 'RepositoryNotFoundException':
+                return {}
+            digests = {}
+            for tag in tags:
+                digests.update(self._find_image_digests([tag]))
+            return digests
+        digests = {}
+        for image_detail in image_details:
+            for tag in image_detail.get('imageTags', []):
+                if tag in tags:
+                    digests[tag] = image_detail['imageDigest']
+        return digests
+
+    def _get_image_manifest(self, digest):
+        '''
+            Manifest and manifest media type of the image with the given
+            digest. A multi-architecture image is a manifest list, which is
+            returned as it is rather than resolved to one platform.
+        '''
+        if digest not in self._manifests:
+            image = self.client.batch_get_image(
                 repositoryName=self.repo_name,
-                imageIds=[{'imageTag': tag}]
+                imageIds=[{'imageDigest': digest}],
+                acceptedMediaTypes=MANIFEST_MEDIA_TYPES,
             )['images'][0]
-        except:
-            return None
+            self._manifests[digest] = (image['imageManifest'], image.get('imageManifestMediaType'))
+        return self._manifests[digest]
+
+    def _has_platforms(self, digest):
+        '''
+            A manifest list names the platform of each of its images. A
+            single image only records its platform in its config blob, which
+            is downloaded to read it.
+        '''
+        if not self.platforms:
+            return True
+        image_manifest, media_type = self._get_image_manifest(digest)
+        manifest = json.loads(image_manifest)
+        if media_type in MANIFEST_LIST_MEDIA_TYPES:
+            platforms = [child.get('platform', {}) for child in manifest['manifests']]
+        else:
+            try:
+                platforms = [self._get_image_config(manifest['config']['digest'])]
+            except (KeyError, ValueError, OSError, ClientError, BotoCoreError) as err:
+                log_warning("Unable to read the platform of image {}: {}".format(digest, _error_message(err)))
+                return False
+        image_platforms = [
+            '/'.join(filter(None, [platform.get('os'), platform.get('architecture'), platform.get('variant')]))
+            for platform in platforms
+        ]
+        return all(
+            any(image_platform == platform or image_platform.startswith(platform + '/')
+                for image_platform in image_platforms)
+            for platform in self.platforms
+        )
+
+    def _get_image_config(self, config_digest):
+        download_url = self.client.get_download_url_for_layer(
+            repositoryName=self.repo_name,
+            layerDigest=config_digest,
+        )['downloadUrl']
+        with urlopen(download_url, timeout=LAYER_DOWNLOAD_TIMEOUT_SECONDS) as blob:
+            return json.load(blob)
 
     def _should_enable_buildkit(self):
-        if self.ssh:
+        if self.ssh or self.registry_cache or self.platforms:
             return True
         if self.cache_from and len(self.cache_from) > 0:
             return True
         return False
 
     def _build_image(self):
-        image_name = self.local_image_uri
+        image_name = self.image_uri if self.platforms else self.local_image_uri
         log_bold(
             f'Building docker image {image_name} using {"default Dockerfile" if self.dockerfile is None else self.dockerfile}')
         command = self._build_command(image_name)
         env = os.environ
         if self._should_enable_buildkit():
             env['DOCKER_BUILDKIT'] = '1'
+        if self.registry_cache or self.platforms:
+            self._login_to_ecr()
+            self._ensure_buildx_builder()
+            returncode, stderr = self._docker_buildx_build(command, env)
+            if returncode != 0 and _is_docker_auth_error(stderr):
+                log_warning('Docker build was not authorized by ECR. Logging in to ECR again.')
+                self._login_to_ecr(force=True)
+                returncode, stderr = self._docker_buildx_build(command, env)
+            if returncode != 0:
+                raise UnrecoverableException('docker build exited with status: {}'.format(returncode))
+            log_bold("Built " + image_name)
+            return
         try:
             subprocess.check_call(command, env=env, shell=True)
         except subprocess.CalledProcessError as e:
@@ -248,8 +482,39 @@ branch or commit SHA")
             raise UnrecoverableException(message)
         log_bold("Built " + image_name)
 
+    def _docker_buildx_build(self, command, env):
+        '''
+            Builds that push the image or the cache talk to ECR, so their
+            output is streamed and its tail kept to detect an expired login.
+        '''
+        build = subprocess.Popen(command, env=env, shell=True, stderr=subprocess.PIPE)
+        tail = deque(maxlen=BUILD_OUTPUT_TAIL_LINES)
+        for line in build.stderr:
+            sys.stderr.write(line.decode("utf-8", "replace"))
+            tail.append(line)
+        return build.wait(), b''.join(tail)
+
+    def _ensure_buildx_builder(self):
+        '''
+            The default docker driver of buildx cannot export cache to a
+            registry or build for several platforms, so those builds run on
+            a docker-container builder that is created once per machine.
+        '''
+        inspect = subprocess.run(['docker', 'buildx', 'inspect', BUILDX_BUILDER],
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if inspect.returncode != 0:
+            log_intent(f'Creating buildx builder {BUILDX_BUILDER}')
+            subprocess.check_call(['docker', 'buildx', 'create', '--name', BUILDX_BUILDER,
+                                   '--driver', 'docker-container'])
+
     def _build_command(self, image_name):
-        command = ['docker', 'build']
+        if self.platforms:
+            command = ['docker', 'buildx', 'build', f'--builder {BUILDX_BUILDER}',
+                       f'--platform {",".join(self.platforms)}', '--push']
+        elif self.registry_cache:
+            command = ['docker', 'buildx', 'build', f'--builder {BUILDX_BUILDER}', '--load']
+        else:
+            command = ['docker', 'build']
         if self.dockerfile:
             command.append(f'-f {self.dockerfile}')
 
@@ -262,6 +527,12 @@ branch or commit SHA")
             for cache in self.cache_from:
                 command.append(f'--cache-from {cache}')
 
+        if self.registry_cache:
+            cache_ref = self.registry_cache_ref
+            command.append(f'--cache-from type=registry,ref={cache_ref}')
+            command.append(f'--cache-to type=registry,ref={cache_ref},mode=max,image-manifest=true,'
+                           f'oci-mediatypes=true,ignore-error=true')
+
         command.extend(self._build_args_opts())
         command.append(self.working_dir)
 
@@ -277,14 +548,74 @@ branch or commit SHA")
             return build_args_command_fragment
 
 
+class ImageUpload(object):
+    '''
+        Uploads the artefacts of an ECR repository in a separate process, so
+        that deployment workers can prepare their task definitions meanwhile
+        and only wait for the image URI when they need it. Workers forked
+        after start() share the upload process's sentinel, so they notice
+        when it dies without a result.
+    '''
+
+    def __init__(self, ecr, timeout_seconds=None):
+        self._ecr = ecr
+        self._timeout_seconds = timeout_seconds or IMAGE_UPLOAD_TIMEOUT_SECONDS
+        self._manager = multiprocessing.Manager()
+        self._result = self._manager.dict()
+        self._done = multiprocessing.Event()
+        self._process = None
+        self._deadline = None
+
+    def start(self):
+        self._deadline = time() + self._timeout_seconds
+        self._process = multiprocessing.Process(target=self._upload)
+        self._process.start()
+
+    def join(self):
+        if self._process is not None:
+            self._process.join(max(0, self._deadline - time()))
+            if self._process.is_alive():
+                log_err("Image upload did not finish in {} seconds. Stopping it".format(self._timeout_seconds))
+                self._process.terminate()
+                self._process.join()
+            self._process = None
+        self._manager.shutdown()
+
+    def wait_for_image_uri(self):
+        while not self._done.wait(IMAGE_UPLOAD_POLL_SECONDS):
+            if wait([self._process.sentinel], 0) and not self._done.is_set():
+                raise UnrecoverableException("Image upload exited with no result")
+            if time() > self._deadline:
+                raise UnrecoverableException(
+                    "Image upload did not finish in {} seconds".format(self._timeout_seconds))
+        if 'error' in self._result:
+            raise UnrecoverableException("Image upload failed: {}".format(self._result['error']))
+        return self._result['image_uri']
+
+    def _upload(self):
+        try:
+            self._ecr.upload_artefacts()
+            self._result['image_uri'] = self._ecr.image_uri
+        except UnrecoverableException as e:
+            self._result['error'] = e.value
+        except Exception as e:
+            self._result['error'] = str(e)
+        finally:
+            self._done.set()
+
+
 def _create_ecr_client(region, assume_role_arn=None):
-    if assume_role_arn:
-        credentials = boto3.client('sts').assume_role(RoleArn=assume_role_arn,
-                                                      RoleSessionName='ecrCloudliftAgent')
-        return boto3.session.Session(
-            aws_access_key_id=credentials['Credentials']['AccessKeyId'],
-            aws_secret_access_key=credentials['Credentials']['SecretAccessKey'],
-            aws_session_token=credentials['Credentials']['SessionToken']
-        ).client('ecr')
-    else:
-        return boto3.session.Session(region_name=region).client('ecr')
+    return get_client('ecr', region, assume_role_arn)
+
+
+def _is_docker_auth_error(stderr):
+    output = stderr.decode("utf-8", "replace").lower()
+    return any(marker in output for marker in DOCKER_AUTH_ERROR_MARKERS)
+
+
+def _error_message(err):
+    if isinstance(err, UnrecoverableException):
+        return err.value
+    if isinstance(err, ClientError):
+        return err.response['Error'].get('Message') or err.response['Error']['Code']
+    return str(err)
@@ -11,28 +11,43 @@ Copy the new contents, but ensure that apply_container_environment_and_secrets i
 or updated. If the package supports deleting configs, use that.
 """
 
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from json import dumps
 
 from boto3.session import Session
 from botocore.exceptions import ClientError, NoCredentialsError
-from botocore.config import Config
 from dateutil.tz.tz import tzlocal
+from cloudlift.config import DeploymentIdentifierIndex
+from cloudlift.config.aws_clients import AWS_CLIENT_CONFIG, get_client
+from cloudlift.config.logging import log_warning
+from cloudlift.deployment import task_definition_cache
 from cloudlift.exceptions import UnrecoverableException
 
+TASK_DEFINITION_LOOKUP_CONCURRENCY = 10
+TASK_DEFINITION_HASH_TAG = 'task_definition_hash'
+REUSED_DEPLOYMENT_IDENTIFIER_TAG_PREFIX = 'deployment_identifier:'
+MAX_TASK_DEFINITION_TAGS = 50
+
 
 class EcsClient(object):
     def __init__(self, access_key_id=None, secret_access_key=None,
                  region=None, profile=None):
-        session = Session(aws_access_key_id=access_key_id,
-                          aws_secret_access_key=secret_access_key,
-                          region_name=region,
-                          profile_name=profile)
-        config = Config(retries=dict(
-            max_attempts=10,
-            mode='standard',
-        ))
-        self.boto = session.client(u'ecs', config=config)
+        self._region = region
+        self._boto = None
+        if access_key_id or secret_access_key or profile:
+            session = Session(aws_access_key_id=access_key_id,
+                              aws_secret_access_key=secret_access_key,
+                              region_name=region,
+                              profile_name=profile)
+            self._boto = session.client(u'ecs', config=AWS_CLIENT_CONFIG)
+
+    @property
+    def boto(self):
+        # Deployment workers are forked with an EcsClient built in the parent,
+        # so the shared client is looked up on use to get the worker's own.
+        return self._boto or get_client(u'ecs', self._region)
 
     def describe_services(self, cluster_name, service_name):
         return self.boto.describe_services(
@@ -40,6 +55,12 @@ class EcsClient(object):
             services=[service_name]
         )
 
+    def describe_many_services(self, cluster_name, service_names):
+        return self.boto.describe_services(
+            cluster=cluster_name,
+            services=service_names
+        )
+
     def list_task_definitions(self, family):
         response = self.boto.list_task_definitions(familyPrefix=family, status='ACTIVE', sort='DESC')
         return response.get('taskDefinitionArns', []), response.get('nextToken', None)
@@ -49,14 +70,9 @@ class EcsClient(object):
                                                    nextToken=next_token)
         return response.get('taskDefinitionArns', []), response.get('nextToken', None)
 
-    def describe_task_definition(self, task_definition_arn):
+    def describe_task_definition(self, task_definition_arn, cached=True):
         try:
-            return self.boto.describe_task_definition(
-                taskDefinition=task_definition_arn,
-                include=[
-                    'TAGS',
-                ]
-            )
+            return task_definition_cache.describe_task_definition(self.boto, task_definition_arn, cached=cached)
         except ClientError:
             raise UnknownTaskDefinitionError(
                 u'Unknown task definition arn: %s' % task_definition_arn
@@ -82,6 +98,12 @@ class EcsClient(object):
             taskDefinition=task_definition_arn
         )
 
+    def tag_resource(self, resource_arn, tags):
+        return self.boto.tag_resource(
+            resourceArn=resource_arn,
+            tags=tags
+        )
+
     def update_service(self, cluster, service, desired_count, task_definition):
         return self.boto.update_service(
             cluster=cluster,
@@ -175,6 +197,31 @@ class EcsTaskDefinition(dict):
     def tags(self):
         return {tag['key']: tag['value'] for tag in self.get('tags', [])}
 
+    def has_deployment_identifier(self, deployment_identifier):
+        '''
+            A revision carries the deployment_identifier it was registered
+            with, and one extra tag per deployment_identifier it was reused for.
+        '''
+        tags = self.tags
+        return tags.get('deployment_identifier') == deployment_identifier or \
+            REUSED_DEPLOYMENT_IDENTIFIER_TAG_PREFIX + deployment_identifier in tags
+
+    @property
+    def content_hash(self):
+        '''
+            Hash of the definition without its tags. The order of container
+            environment variables and secrets does not change the task, so
+            they are sorted by name before hashing.
+        '''
+        payload = {key: value for key, value in self.items() if key != 'tags'}
+        if 'containerDefinitions' in payload:
+            payload['containerDefinitions'] = [
+                dict(container, **{key: sorted(container[key], key=lambda item: item.get('name', ''))
+                                   for key in ('environment', 'secrets') if key in container})
+                for container in payload['containerDefinitions']
+            ]
+        return hashlib.sha256(dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
     @property
     def containers(self):
         return self.get(u'containerDefinitions')
@@ -346,34 +393,86 @@ class EcsAction(object):
         task_definition_arn = service.task_definition
         return self.getEcsTaskDefinitionByArn(task_definition_arn)
 
-    def _find_task_definition_by_deployment_identifier(self, task_definition_arns, deployment_identifier):
-        for task_definition_arn in task_definition_arns:
-            ecs_task_definition = self.getEcsTaskDefinitionByArn(task_definition_arn)
-            if ecs_task_definition.tags.get('deployment_identifier') == deployment_identifier:
-                return ecs_task_definition
-        return None
+    def _find_task_definition_by_deployment_identifier(self, task_definition_arns, deployment_identifier,
+                                                       cached=True, reusable_arns=None):
+        executor = ThreadPoolExecutor(max_workers=TASK_DEFINITION_LOOKUP_CONCURRENCY)
+        futures = [executor.submit(self.getEcsTaskDefinitionByArn, arn, cached) for arn in task_definition_arns]
+        try:
+            for future in futures:
+                ecs_task_definition = future.result()
+                if ecs_task_definition.has_deployment_identifier(deployment_identifier):
+                    return ecs_task_definition
+                if reusable_arns is not None and TASK_DEFINITION_HASH_TAG in ecs_task_definition.tags:
+                    reusable_arns.append(ecs_task_definition.arn)
+            return None
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
 
     def get_task_definition_by_deployment_identifier(self, service, deployment_identifier):
         current_task_definition = self.get_current_task_definition(service)
-        task_definition_arns, next_token = self._client.list_task_definitions(family=current_task_definition.family)
-        td = self._find_task_definition_by_deployment_identifier(task_definition_arns, deployment_identifier)
+        family = current_task_definition.family
+        td = self._get_indexed_task_definition(family, deployment_identifier)
         if td:
             return td
 
-        while next_token is not None:
-            task_definition_arns, next_token = self._client.list_task_definitions_for_next_token(
-                family=current_task_definition.family, next_token=next_token,
-            )
-            td = self._find_task_definition_by_deployment_identifier(task_definition_arns, deployment_identifier)
-            if td:
-                return td
+        # A revision can be tagged with a deployment_identifier after its
+        # payload was cached when it is reused, so on a miss the revisions
+        # that can be reused, those with a content hash, are described again.
+        reusable_arns = []
+        td = self._scan_task_definitions_for_deployment_identifier(family, deployment_identifier, reusable_arns) or \
+            self._find_task_definition_by_deployment_identifier(reusable_arns, deployment_identifier, cached=False)
+        if td:
+            self._index_task_definition(family, deployment_identifier, td.arn)
+            return td
 
         raise UnrecoverableException(
             f'task definition does not exist for deployment_identifier: {deployment_identifier}')
 
-    def getEcsTaskDefinitionByArn(self, task_definition_arn):
+    def _scan_task_definitions_for_deployment_identifier(self, family, deployment_identifier, reusable_arns=None):
+        page_loader = ThreadPoolExecutor(max_workers=1)
+        try:
+            task_definition_arns, next_token = self._client.list_task_definitions(family=family)
+            while True:
+                next_page = None
+                if next_token is not None:
+                    next_page = page_loader.submit(self._client.list_task_definitions_for_next_token,
+                                                   family=family, next_token=next_token)
+                td = self._find_task_definition_by_deployment_identifier(task_definition_arns, deployment_identifier,
+                                                                         reusable_arns=reusable_arns)
+                if td:
+                    return td
+                if next_page is None:
+                    return None
+                task_definition_arns, next_token = next_page.result()
+        finally:
+            page_loader.shutdown(wait=False)
+
+    def _get_indexed_task_definition(self, family, deployment_identifier):
+        try:
+            task_definition_arn = DeploymentIdentifierIndex(family, deployment_identifier).get_task_definition_arn()
+            if task_definition_arn is None:
+                return None
+            task_definition = self.getEcsTaskDefinitionByArn(task_definition_arn, cached=False)
+            if task_definition.get('status') != 'ACTIVE' or \
+                    not task_definition.has_deployment_identifier(deployment_identifier):
+                return None
+            return task_definition
+        except Exception as err:
+            log_warning(f'Unable to look up deployment_identifier {deployment_identifier} in index: {err}')
+            return None
+
+    def _index_task_definition(self, family, deployment_identifier, task_definition_arn):
+        try:
+            DeploymentIdentifierIndex(family, deployment_identifier).set_task_definition_arn(task_definition_arn)
+        except Exception as err:
+            log_warning(f'Unable to index deployment_identifier {deployment_identifier}: {err}')
+
+    def getEcsTaskDefinitionByArn(self, task_definition_arn, cached=True):
         task_definition_payload = self._client.describe_task_definition(
             task_definition_arn=task_definition_arn,
+            cached=cached,
         )
         task_definition_payload[u'taskDefinition']['tags'] = task_definition_payload['tags']
         task_definition = EcsTaskDefinition(
@@ -397,16 +496,51 @@ class EcsAction(object):
                 'value': deployment_identifier
             },
         ] if deployment_identifier is not None else []
+        tags.append({
+            'key': TASK_DEFINITION_HASH_TAG,
+            'value': task_definition.content_hash
+        })
 
         response = self._client.register_task_definition(
             tags=tags,
             **task_definition
         )
         new_task_definition = EcsTaskDefinition(response[u'taskDefinition'])
+        if deployment_identifier is not None:
+            self._index_task_definition(new_task_definition.family, deployment_identifier, new_task_definition.arn)
         if 'previous_task_definition_arn' in task_definition.tags:
             self._client.deregister_task_definition(task_definition.tags.get('previous_task_definition_arn'))
         return new_task_definition
 
+    def reuse_task_definition(self, task_definition, deployment_identifier):
+        '''
+            Tag an unchanged revision with deployment_identifier so it can be
+            found by it. Returns None when the revision cannot be tagged and
+            a new revision has to be registered instead.
+        '''
+        if deployment_identifier is None:
+            return task_definition
+        if not task_definition.has_deployment_identifier(deployment_identifier):
+            if len(task_definition.tags) >= MAX_TASK_DEFINITION_TAGS:
+                return None
+            tag = {'key': REUSED_DEPLOYMENT_IDENTIFIER_TAG_PREFIX + deployment_identifier, 'value': ''}
+            try:
+                self._client.tag_resource(task_definition.arn, [tag])
+            except ClientError as err:
+                log_warning(f'Unable to tag {task_definition.arn} with deployment_identifier '
+                            f'{deployment_identifier}: {err}')
+                return None
+            task_definition['tags'] = task_definition.get('tags', []) + [tag]
+            self._refresh_cached_task_definition(task_definition.arn)
+        self._index_task_definition(task_definition.family, deployment_identifier, task_definition.arn)
+        return task_definition
+
+    def _refresh_cached_task_definition(self, task_definition_arn):
+        try:
+            self._client.describe_task_definition(task_definition_arn=task_definition_arn, cached=False)
+        except Exception as err:
+            log_warning(f'Unable to refresh {task_definition_arn}: {err}')
+
     def update_service(self, service):
         response = self._client.update_service(
             cluster=service.cluster,
@@ -10,7 +10,7 @@ from cloudlift.config import get_cluster_name
 from cloudlift.deployment.changesets import create_change_set
 from cloudlift.deployment.cluster_template_generator import ClusterTemplateGenerator
 from cloudlift.config.logging import log, log_bold, log_err
-from cloudlift.deployment.progress import get_stack_events, print_new_events
+from cloudlift.deployment.progress import StackEventStream
 from cloudlift.deployment.cloud_formation_stack import prepare_stack_options_for_template
 
 
@@ -45,7 +45,7 @@ class EnvironmentCreator(object):
                 self.environment,
                 self.configuration
             ).generate_cluster()
-            self.existing_events = get_stack_events(
+            self.stack_events = StackEventStream(
                 self.client,
                 self.cluster_name
             )
@@ -81,7 +81,7 @@ class EnvironmentCreator(object):
                 self.__get_parameter_values(),
                 self.environment
             )
-            self.existing_events = get_stack_events(
+            self.stack_events = StackEventStream(
                 self.client,
                 self.cluster_name
             )
@@ -144,9 +144,7 @@ class EnvironmentCreator(object):
             response = self.client.describe_stacks(StackName=self.cluster_name)
             if "IN_PROGRESS" not in response['Stacks'][0]['StackStatus']:
                 break
-            all_events = get_stack_events(self.client, self.cluster_name)
-            print_new_events(all_events, self.existing_events)
-            self.existing_events = all_events
+            self.stack_events.print_new_events()
             sleep(5)
         log_bold("Finished and Status: %s" % (response['Stacks'][0]['StackStatus']))
 
@@ -0,0 +1,146 @@
+'''
+Registry-side copy of images between ECR repositories.
+
+An image is copied by manifest and blob through the ECR API, so promoting
+an image to another repository, account or region needs no local Docker
+daemon. Layers the destination already has are skipped, so the time taken
+depends on the layers that differ rather than on the image size.
+'''
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from urllib.request import urlopen
+
+from botocore.exceptions import ClientError
+
+from cloudlift.config.logging import log_intent
+from cloudlift.exceptions import UnrecoverableException
+from cloudlift.utils import chunks
+
+DOCKER_MANIFEST_MEDIA_TYPE = 'application/vnd.docker.distribution.manifest.v2+json'
+DOCKER_MANIFEST_LIST_MEDIA_TYPE = 'application/vnd.docker.distribution.manifest.list.v2+json'
+OCI_MANIFEST_MEDIA_TYPE = 'application/vnd.oci.image.manifest.v1+json'
+OCI_INDEX_MEDIA_TYPE = 'application/vnd.oci.image.index.v1+json'
+MANIFEST_MEDIA_TYPES = [
+    DOCKER_MANIFEST_MEDIA_TYPE,
+    DOCKER_MANIFEST_LIST_MEDIA_TYPE,
+    OCI_MANIFEST_MEDIA_TYPE,
+    OCI_INDEX_MEDIA_TYPE,
+]
+MANIFEST_LIST_MEDIA_TYPES = (DOCKER_MANIFEST_LIST_MEDIA_TYPE, OCI_INDEX_MEDIA_TYPE)
+LAYER_AVAILABILITY_BATCH_SIZE = 100
+LAYER_COPY_CONCURRENCY = 4
+LAYER_DOWNLOAD_TIMEOUT_SECONDS = 60
+
+
+def copy_image(source, destination, source_tag, destination_tag):
+    '''
+        Copy the image tagged source_tag in the source ECR repository to
+        destination_tag in the destination ECR repository. Both are ECR
+        instances, and may be in different accounts or regions.
+    '''
+    try:
+        image = _get_image(source, {'imageTag': source_tag})
+        _copy_manifest(source, destination, image, destination_tag)
+    except (ClientError, OSError, HTTPException) as err:
+        raise UnrecoverableException("Unable to copy {}:{} to {}:{}: {}".format(
+            source.repo_name, source_tag, destination.repo_name, destination_tag, err))
+
+
+def _copy_manifest(source, destination, image, tag=None):
+    manifest = json.loads(image['imageManifest'])
+    media_type = image.get('imageManifestMediaType') or manifest.get('mediaType')
+    if media_type in MANIFEST_LIST_MEDIA_TYPES:
+        for child in manifest['manifests']:
+            _copy_manifest(source, destination, _get_image(source, {'imageDigest': child['digest']}))
+    elif 'layers' in manifest:
+        _copy_layers(source, destination, [manifest['config']['digest']] +
+                     [layer['digest'] for layer in manifest['layers']])
+    else:
+        raise UnrecoverableException("Unsupported image manifest: {}".format(media_type))
+
+    put_image_args = dict(
+        repositoryName=destination.repo_name,
+        imageManifest=image['imageManifest'],
+        imageManifestMediaType=media_type,
+    )
+    if tag:
+        put_image_args['imageTag'] = tag
+    else:
+        put_image_args['imageDigest'] = image['imageId']['imageDigest']
+    try:
+        destination.client.put_image(**put_image_args)
+    except ClientError as err:
+        if err.response['Error']['Code'] != 'ImageAlreadyExistsException':
+            raise
+
+
+def _get_image(ecr, image_id):
+    response = ecr.client.batch_get_image(
+        repositoryName=ecr.repo_name,
+        imageIds=[image_id],
+        acceptedMediaTypes=MANIFEST_MEDIA_TYPES,
+    )
+    if not response['images']:
+        raise UnrecoverableException("Image {} not found in {}".format(
+            list(image_id.values())[0], ecr.repo_name))
+    return response['images'][0]
+
+
+def _copy_layers(source, destination, digests):
+    digests = list(dict.fromkeys(digests))
+    missing_digests = []
+    for batch in chunks(digests, LAYER_AVAILABILITY_BATCH_SIZE):
+        response = destination.client.batch_check_layer_availability(
+            repositoryName=destination.repo_name,
+            layerDigests=batch,
+        )
+        missing_digests.extend(layer['layerDigest'] for layer in response['layers']
+                               if layer['layerAvailability'] != 'AVAILABLE')
+        missing_digests.extend(failure['layerDigest'] for failure in response['failures'])
+    log_intent("Copying {} of {} layers to {}".format(len(missing_digests), len(digests), destination.repo_name))
+    with ThreadPoolExecutor(max_workers=LAYER_COPY_CONCURRENCY) as executor:
+        list(executor.map(lambda digest: _copy_layer(source, destination, digest), missing_digests))
+
+
+def _copy_layer(source, destination, digest):
+    download_url = source.client.get_download_url_for_layer(
+        repositoryName=source.repo_name,
+        layerDigest=digest,
+    )['downloadUrl']
+    upload = destination.client.initiate_layer_upload(repositoryName=destination.repo_name)
+    first_byte = 0
+    with urlopen(download_url, timeout=LAYER_DOWNLOAD_TIMEOUT_SECONDS) as blob:
+        for part in _read_parts(blob, upload['partSize']):
+            destination.client.upload_layer_part(
+                repositoryName=destination.repo_name,
+                uploadId=upload['uploadId'],
+                partFirstByte=first_byte,
+                partLastByte=first_byte + len(part) - 1,
+                layerPartBlob=part,
+            )
+            first_byte += len(part)
+    try:
+        destination.client.complete_layer_upload(
+            repositoryName=destination.repo_name,
+            uploadId=upload['uploadId'],
+            layerDigests=[digest],
+        )
+    except ClientError as err:
+        if err.response['Error']['Code'] != 'LayerAlreadyExistsException':
+            raise
+
+
+def _read_parts(blob, part_size):
+    part = b''
+    while True:
+        data = blob.read(part_size - len(part))
+        if not data:
+            break
+        part += data
+        if len(part) == part_size:
+            yield part
+            part = b''
+    if part:
+        yield part
@@ -0,0 +1,157 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from cloudlift.config.logging import log_bold, log_err, log_intent
+from cloudlift.deployment import deployer
+from cloudlift.deployment.ecs import EcsClient
+from cloudlift.deployment.service_status_poller import ServiceStatusPoller
+from cloudlift.deployment.service_updater import DEPLOYMENT_CONCURRENCY, ServiceUpdater, report_failed_jobs
+from cloudlift.exceptions import UnrecoverableException
+from cloudlift.utils import run_processes
+
+MANIFEST_REQUIRED_KEYS = ['name', 'environment', 'version', 'deployment_identifier']
+
+
+class MultiServiceUpdater(object):
+    '''
+        Deploys many cloudlift applications from one process. All ECS
+        services of all applications share a single concurrency limit and
+        one ECS status poller per region.
+    '''
+
+    def __init__(self, manifest, timeout_seconds=None, deployment_concurrency=None):
+        self.manifest = manifest
+        self.timeout_seconds = timeout_seconds
+        self.deployment_concurrency = deployment_concurrency or DEPLOYMENT_CONCURRENCY
+
+    def run(self):
+        results = {}
+        updaters = []
+        for entry in self.manifest:
+            app = app_label(entry)
+            try:
+                updaters.append((app, self._create_updater(entry)))
+                results[app] = []
+            except UnrecoverableException as err:
+                log_err(f"Unable to prepare {app}: {err.value}")
+                results[app] = [err.value]
+
+        jobs = []
+        status_pollers = {}
+        log_bold("Deploy concurrency: {}".format(self.deployment_concurrency))
+        try:
+            with deployer.resolved_config_scope():
+                resolved_updaters = []
+                for app, updater in updaters:
+                    log_intent(f"{app} | version: {updater.version} | "
+                               f"deployment_identifier: {updater.deployment_identifier}")
+                    try:
+                        updater.resolve_config()
+                        resolved_updaters.append((app, updater))
+                    except UnrecoverableException as err:
+                        log_err(f"Unable to resolve configuration of {app}: {err.value}")
+                        results[app].append(err.value)
+
+                image_uris = self._ensure_images(resolved_updaters, results)
+                for app, updater in resolved_updaters:
+                    if app not in image_uris:
+                        continue
+                    if updater.region not in status_pollers:
+                        status_pollers[updater.region] = ServiceStatusPoller(EcsClient(None, None, updater.region))
+                    for ecs_service_name, process in updater.create_jobs("Deploy", deployer.deploy_new_version,
+                                                                         updater.deploy_kwargs(
+                                                                             ecr_image_uri=image_uris[app]),
+                                                                         status_pollers[updater.region]):
+                        jobs.append((app, ecs_service_name, process))
+
+                for status_poller in status_pollers.values():
+                    status_poller.start()
+                exit_codes = run_processes([process for _, _, process in jobs], self.deployment_concurrency)
+        finally:
+            for status_poller in status_pollers.values():
+                status_poller.stop()
+
+        report_failed_jobs("Deploy", [f"{ecs_service_name} ({app})" for app, ecs_service_name, _ in jobs], exit_codes)
+        for (app, ecs_service_name, _), exit_code in zip(jobs, exit_codes):
+            if exit_code != 0:
+                results[app].append(f"deploy of {ecs_service_name} failed")
+        self._log_results(results)
+        if any(results.values()):
+            raise UnrecoverableException("Deploy failed")
+        return results
+
+    def _ensure_images(self, updaters, results):
+        '''
+            Versions are mandatory in a manifest, so making sure the images
+            are in ECR only takes ECR API calls. They run on threads of this
+            process, at most deployment_concurrency at a time, and return
+            {app: image URI} for the apps whose image is ready.
+        '''
+        log_bold("Checking images in ECR")
+        image_uris = {}
+        with ThreadPoolExecutor(max_workers=self.deployment_concurrency) as executor:
+            futures = [(app, executor.submit(_ensure_image, updater.ecr)) for app, updater in updaters]
+            for app, future in futures:
+                try:
+                    image_uris[app] = future.result()
+                except UnrecoverableException as err:
+                    log_err(f"Image check of {app} failed: {err.value}")
+                    results[app].append(f"image check failed: {err.value}")
+                except Exception as err:
+                    log_err(f"Image check of {app} failed: {err}")
+                    results[app].append(f"image check failed: {err}")
+        return image_uris
+
+    def _create_updater(self, entry):
+        working_dir = os.path.abspath(entry.get('working_dir', '.'))
+        env_sample_file = os.path.join(working_dir, entry.get('env_sample_file', 'env.sample'))
+        if not os.path.exists(env_sample_file):
+            raise UnrecoverableException(f'{env_sample_file} not found.')
+        return ServiceUpdater(
+            entry['name'],
+            environment=entry['environment'],
+            env_sample_file=env_sample_file,
+            timeout_seconds=entry.get('timeout_seconds', self.timeout_seconds),
+            version=entry['version'],
+            deployment_identifier=entry['deployment_identifier'],
+            working_dir=working_dir,
+            deployment_concurrency=self.deployment_concurrency,
+        )
+
+    def _log_results(self, results):
+        log_bold("Deployment results")
+        for app, failures in results.items():
+            if failures:
+                log_err(f"  {app}: {'; '.join(failures)}")
+            else:
+                log_intent(f"{app}: deployed")
+
+
+def _ensure_image(ecr):
+    ecr.upload_artefacts()
+    return ecr.image_uri
+
+
+def app_label(entry):
+    return "{}/{}".format(entry['name'], entry['environment'])
+
+
+def read_manifest(path):
+    '''
+        Read a JSON list of applications to deploy. Each entry needs name,
+        environment, version and deployment_identifier, and may set
+        working_dir, env_sample_file and timeout_seconds.
+    '''
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as err:
+        raise UnrecoverableException(f"Unable to read manifest {path}: {err}")
+    if not isinstance(manifest, list):
+        raise UnrecoverableException("Manifest must be a list of applications")
+    for index, entry in enumerate(manifest):
+        missing_keys = [key for key in MANIFEST_REQUIRED_KEYS if not entry.get(key)]
+        if missing_keys:
+            raise UnrecoverableException(f"Manifest entry {index} is missing {', '.join(missing_keys)}")
+    return manifest
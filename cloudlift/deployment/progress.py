@@ -1,27 +1,92 @@
 from cloudlift.config.logging import log_intent, log_intent_err
 
 
-def get_stack_events(client, stack_name):
-    try:
-        return sorted(
-            client.describe_stack_events(
-                StackName=stack_name
-            )['StackEvents'], key=lambda k: k['Timestamp'])
-    except Exception:
-        return []
-
-
-def print_new_events(all_events, existing_events):
-    new_events = [evnt for evnt in all_events if evnt not in existing_events]
-    for event in new_events:
-        update = "%s: Resource: %s\t\tStatus: %s" % (
-            event['Timestamp'],
-            event['LogicalResourceId'],
-            event['ResourceStatus']
-        )
-        if 'ResourceStatusReason' in event:
-            update += "\t\tReason: %s" % event['ResourceStatusReason']
-        if "ERROR" in update or "FAIL" in update:
-            log_intent_err(update)
-        else:
-            log_intent(update)
+class EventWatermark(object):
+    '''
+        Remembers the newest event seen in a stream of events ordered newest
+        first, so that each poll only walks the stream until it reaches
+        events that were already reported.
+    '''
+
+    def __init__(self, id_key, timestamp_key):
+        self.id_key = id_key
+        self.timestamp_key = timestamp_key
+        self.event_id = None
+        self.timestamp = None
+
+    def mark(self, events):
+        for event in events:
+            self._advance(event)
+            break
+
+    def take_new(self, events):
+        new_events = []
+        for event in events:
+            if self._is_seen(event):
+                break
+            new_events.append(event)
+        if new_events:
+            self._advance(new_events[0])
+        new_events.reverse()
+        return new_events
+
+    def _advance(self, event):
+        self.event_id = event.get(self.id_key)
+        self.timestamp = event[self.timestamp_key]
+
+    def _is_seen(self, event):
+        if self.timestamp is None:
+            return False
+        if self.event_id is None:
+            return event[self.timestamp_key] <= self.timestamp
+        return event.get(self.id_key) == self.event_id or event[self.timestamp_key] < self.timestamp
+
+
+class StackEventStream(object):
+    '''
+        Streams CloudFormation stack events created after the stream was
+        opened, following describe_stack_events pagination only as far as
+        the last event already seen.
+    '''
+
+    def __init__(self, client, stack_name):
+        self.client = client
+        self.stack_name = stack_name
+        self.watermark = EventWatermark('EventId', 'Timestamp')
+        try:
+            self.watermark.mark(self._events_newest_first())
+        except Exception:
+            pass
+
+    def new_events(self):
+        try:
+            return self.watermark.take_new(self._events_newest_first())
+        except Exception:
+            return []
+
+    def print_new_events(self):
+        for event in self.new_events():
+            print_stack_event(event)
+
+    def _events_newest_first(self):
+        kwargs = dict(StackName=self.stack_name)
+        while True:
+            response = self.client.describe_stack_events(**kwargs)
+            yield from response['StackEvents']
+            if 'NextToken' not in response:
+                return
+            kwargs['NextToken'] = response['NextToken']
+
+
+def print_stack_event(event):
+    update = "%s: Resource: %s\t\tStatus: %s" % (
+        event['Timestamp'],
+        event['LogicalResourceId'],
+        event['ResourceStatus']
+    )
+    if 'ResourceStatusReason' in event:
+        update += "\t\tReason: %s" % event['ResourceStatusReason']
+    if "ERROR" in update or "FAIL" in update:
+        log_intent_err(update)
+    else:
+        log_intent(update)
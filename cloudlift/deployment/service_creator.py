@@ -13,7 +13,7 @@ from cloudlift.config import ServiceConfiguration
 from cloudlift.config import get_cluster_name, get_service_stack_name, get_region_for_environment
 from cloudlift.deployment.changesets import create_change_set
 from cloudlift.config.logging import log, log_bold, log_err
-from cloudlift.deployment.progress import get_stack_events, print_new_events
+from cloudlift.deployment.progress import StackEventStream
 from cloudlift.deployment.service_template_generator import ServiceTemplateGenerator
 from cloudlift.deployment.cloud_formation_stack import prepare_stack_options_for_template
 from cloudlift.deployment.ecr import ECR
@@ -32,11 +32,12 @@ class ServiceCreator(object):
         self.stack_name = get_service_stack_name(environment, name)
         self.client = get_client_for('cloudformation', self.environment)
         self.environment_stack = self._get_environment_stack()
-        self.existing_events = get_stack_events(self.client, self.stack_name)
+        self.stack_events = StackEventStream(self.client, self.stack_name)
         self.service_configuration = ServiceConfiguration(self.name, self.environment)
         self.env_sample_file = env_sample_file
 
-    def create(self, config_body=None, version=None, build_arg=None, dockerfile=None, ssh=None, cache_from=None):
+    def create(self, config_body=None, version=None, build_arg=None, dockerfile=None, ssh=None, cache_from=None,
+               registry_cache=False, content_version=False, platforms=None):
         '''
             Create and execute CloudFormation template for ECS service
             and related dependencies
@@ -59,6 +60,9 @@ class ServiceCreator(object):
             dockerfile=dockerfile,
             ssh=ssh,
             cache_from=cache_from,
+            registry_cache=registry_cache,
+            content_version=content_version,
+            platforms=platforms,
         )
         ecr.upload_artefacts()
 
@@ -158,9 +162,7 @@ cluster using `create_environment` command.")
             response = self.client.describe_stacks(StackName=self.stack_name)
             if "IN_PROGRESS" not in response['Stacks'][0]['StackStatus']:
                 break
-            all_events = get_stack_events(self.client, self.stack_name)
-            print_new_events(all_events, self.existing_events)
-            self.existing_events = all_events
+            self.stack_events.print_new_events()
             sleep(5)
         final_status = response['Stacks'][0]['StackStatus']
         if "FAIL" in final_status:
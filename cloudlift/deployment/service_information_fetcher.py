@@ -4,6 +4,7 @@ from cloudlift.config import get_client_for
 from cloudlift.config import get_cluster_name, get_service_stack_name
 from cloudlift.config import get_region_for_environment
 from cloudlift.config.logging import log, log_warning, log_intent
+from cloudlift.deployment import task_definition_cache
 from cloudlift.deployment.ecs import DeployAction, EcsClient
 from cloudlift.exceptions import UnrecoverableException
 
@@ -108,9 +109,7 @@ class ServiceInformationFetcher(object):
         )['tasks']
 
         task_definition_arns = tasks[0]['taskDefinitionArn']
-        task_definition = ecs_client.describe_task_definition(
-            taskDefinition=task_definition_arns
-        )
+        task_definition = task_definition_cache.describe_task_definition(ecs_client, task_definition_arns)
         return task_definition['taskDefinition']['containerDefinitions'][0]['image']
 
     def _get_stack_resource_summaries(self):
@@ -0,0 +1,93 @@
+import multiprocessing
+from time import sleep, time
+
+from cloudlift.config.logging import log_warning
+from cloudlift.deployment.ecs import EcsService
+from cloudlift.exceptions import UnrecoverableException
+from cloudlift.utils import chunks
+
+DESCRIBE_SERVICES_BATCH_SIZE = 10
+POLL_INTERVAL_SECONDS = 5
+WAIT_INTERVAL_SECONDS = 1
+
+
+class ServiceStatusPoller(object):
+    '''
+        Polls ECS for the status of all watched services using batched
+        describe_services calls and shares the latest status of each service
+        with the deployment processes waiting on it. Services that ECS reports
+        as failures (e.g. MISSING) are shared as well, so that waiting on
+        them fails fast instead of running into the timeout.
+    '''
+
+    def __init__(self, client, interval_seconds=POLL_INTERVAL_SECONDS):
+        self._client = client
+        self._interval_seconds = interval_seconds
+        self._manager = multiprocessing.Manager()
+        self._watched = self._manager.dict()
+        self._statuses = self._manager.dict()
+        self._failures = self._manager.dict()
+        self._stopped = multiprocessing.Event()
+        self._process = None
+
+    def start(self):
+        self._process = multiprocessing.Process(target=self._run, daemon=True)
+        self._process.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._process is not None:
+            self._process.join()
+            self._process = None
+        self._manager.shutdown()
+
+    def watch(self, cluster_name, service_name):
+        self._watched[(cluster_name, service_name)] = True
+
+    def unwatch(self, cluster_name, service_name):
+        self._watched.pop((cluster_name, service_name), None)
+        self._statuses.pop((cluster_name, service_name), None)
+        self._failures.pop((cluster_name, service_name), None)
+
+    def poll(self):
+        services_by_cluster = {}
+        for cluster_name, service_name in self._watched.keys():
+            services_by_cluster.setdefault(cluster_name, []).append(service_name)
+
+        for cluster_name, service_names in services_by_cluster.items():
+            for batch in chunks(service_names, DESCRIBE_SERVICES_BATCH_SIZE):
+                response = self._client.describe_many_services(cluster_name=cluster_name, service_names=batch)
+                polled_at = time()
+                for service in response[u'services']:
+                    self._statuses[(cluster_name, service[u'serviceName'])] = (polled_at, service)
+                for failure in response.get(u'failures', []):
+                    service_name = failure.get(u'arn', '').split('/')[-1]
+                    if service_name in batch:
+                        self._failures[(cluster_name, service_name)] = failure.get(u'reason', 'UNKNOWN')
+
+    def wait_for_service(self, cluster_name, service_name, polled_after, until):
+        '''
+            Blocks until a status of the service polled after `polled_after`
+            is available. Returns the service and the time it was polled at,
+            or (None, polled_after) if nothing new arrived before `until`.
+            Raises UnrecoverableException if ECS reported the service as a
+            failure.
+        '''
+        while time() <= until:
+            reason = self._failures.get((cluster_name, service_name))
+            if reason is not None:
+                raise UnrecoverableException(
+                    "Unable to describe service {} in cluster {}: {}".format(service_name, cluster_name, reason))
+            polled_at, service = self._statuses.get((cluster_name, service_name), (None, None))
+            if polled_at is not None and polled_at > polled_after:
+                return EcsService(cluster_name, service), polled_at
+            sleep(WAIT_INTERVAL_SECONDS)
+        return None, polled_after
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll()
+            except Exception as err:
+                log_warning(f"Unable to poll ECS service status: {err}")
+            self._stopped.wait(self._interval_seconds)
@@ -36,7 +36,8 @@ from cloudlift.config.region import get_environment_level_alb_listener, get_clie
 from cloudlift.config.service_configuration import DEFAULT_TARGET_GROUP_DEREGISTRATION_DELAY, \
     DEFAULT_LOAD_BALANCING_ALGORITHM, DEFAULT_HEALTH_CHECK_INTERVAL_SECONDS, DEFAULT_HEALTH_CHECK_TIMEOUT_SECONDS, \
     DEFAULT_HEALTH_CHECK_HEALTHY_THRESHOLD_COUNT, DEFAULT_HEALTH_CHECK_UNHEALTHY_THRESHOLD_COUNT
-from cloudlift.deployment.deployer import build_config, get_automated_injected_secret_name
+from cloudlift.deployment.deployer import build_config, get_automated_injected_secret_name, \
+    resolved_config_scope
 from cloudlift.deployment.template_generator import TemplateGenerator
 from cloudlift.exceptions import UnrecoverableException
 from cloudlift.deployment.task_definition_builder import TaskDefinitionBuilder, container_name
@@ -71,8 +72,9 @@ class ServiceTemplateGenerator(TemplateGenerator):
         return to_yaml(self.template.to_json())
 
     def _add_cluster_services(self):
-        for ecs_service_name, config in self.configuration['services'].items():
-            self._add_service(ecs_service_name, config)
+        with resolved_config_scope():
+            for ecs_service_name, config in self.configuration['services'].items():
+                self._add_service(ecs_service_name, config)
 
     def _add_service_alarms(self, svc):
         cloudlift_timedout_deployments_alarm = Alarm(
@@ -1,17 +1,15 @@
 import multiprocessing
 import os
-from time import sleep
-
-import boto3
 
 from cloudlift.config import get_account_id, get_cluster_name, \
     ServiceConfiguration, get_region_for_environment
-from cloudlift.config.logging import log_bold, log_intent, log_warning
+from cloudlift.config.logging import log_bold, log_err, log_intent, log_warning
 from cloudlift.deployment import deployer, ServiceInformationFetcher
 from cloudlift.deployment.ecs import EcsClient
+from cloudlift.deployment.service_status_poller import ServiceStatusPoller
 from cloudlift.exceptions import UnrecoverableException
-from cloudlift.utils import chunks
-from cloudlift.deployment.ecr import ECR
+from cloudlift.utils import run_processes
+from cloudlift.deployment.ecr import ECR, ImageUpload
 from stringcase import spinalcase
 
 DEPLOYMENT_COLORS = ['blue', 'magenta', 'white', 'cyan']
@@ -21,14 +19,16 @@ DEPLOYMENT_CONCURRENCY = int(os.environ.get('CLOUDLIFT_DEPLOYMENT_CONCURRENCY',
 class ServiceUpdater(object):
     def __init__(self, name, environment='', env_sample_file='', timeout_seconds=None, version=None,
                  build_args=None, dockerfile=None, ssh=None, cache_from=None,
-                 deployment_identifier=None, working_dir='.'):
+                 deployment_identifier=None, working_dir='.', deployment_concurrency=None, registry_cache=False,
+                 content_version=False, platforms=None):
         self.name = name
         self.environment = environment
         self.deployment_identifier = deployment_identifier
         self.env_sample_file = env_sample_file
         self.timeout_seconds = timeout_seconds
         self.version = version
-        self.ecr_client = boto3.session.Session(region_name=self.region).client('ecr')
+        self.working_dir = working_dir
+        self.deployment_concurrency = deployment_concurrency or DEPLOYMENT_CONCURRENCY
         self.cluster_name = get_cluster_name(environment)
         self.service_configuration = ServiceConfiguration(service_name=name, environment=environment).get_config()
         self.service_info_fetcher = ServiceInformationFetcher(self.name, self.environment, self.service_configuration)
@@ -46,7 +46,10 @@ class ServiceUpdater(object):
             dockerfile,
             working_dir,
             ssh,
-            cache_from
+            cache_from,
+            registry_cache,
+            content_version,
+            platforms,
         )
 
     def run(self):
@@ -57,19 +60,29 @@ class ServiceUpdater(object):
                    self.environment + " | version: " + str(self.version) +
                    " | deployment_identifier: " + self.deployment_identifier)
         log_bold("Checking image in ECR")
-        self.ecr.upload_artefacts()
+        image_upload = ImageUpload(self.ecr)
+        image_upload.start()
         log_bold("Initiating deployment\n")
-        ecs_client = EcsClient(None, None, self.region)
+        try:
+            with deployer.resolved_config_scope():
+                self.resolve_config()
+                self.run_job_for_all_services("Deploy", deployer.deploy_new_version, self.deploy_kwargs(image_upload))
+        finally:
+            image_upload.join()
+
+    def deploy_kwargs(self, image_upload=None, ecr_image_uri=None):
+        return dict(client=EcsClient(None, None, self.region), cluster_name=self.cluster_name,
+                    service_name=self.name, sample_env_file_path=self.env_sample_file,
+                    timeout_seconds=self.timeout_seconds, env_name=self.environment,
+                    ecr_image_uri=ecr_image_uri, image_upload=image_upload,
+                    deployment_identifier=self.deployment_identifier,
+                    )
 
-        image_url = self.ecr.image_uri
-        target = deployer.deploy_new_version
-        kwargs = dict(client=ecs_client, cluster_name=self.cluster_name,
-                      service_name=self.name, sample_env_file_path=self.env_sample_file,
-                      timeout_seconds=self.timeout_seconds, env_name=self.environment,
-                      ecr_image_uri=image_url,
-                      deployment_identifier=self.deployment_identifier,
-                      )
-        self.run_job_for_all_services("Deploy", target, kwargs)
+    def resolve_config(self):
+        log_bold("Resolving configuration")
+        secrets_names = [info.get('secrets_name') for info in self.service_info_fetcher.service_info.values()]
+        deployer.resolve_config(self.environment, self.name, self.env_sample_file, secrets_names,
+                                os.path.realpath(self.working_dir))
 
     def revert(self):
         target = deployer.revert_deployment
@@ -83,7 +96,18 @@ class ServiceUpdater(object):
         self.ecr.add_tags(additional_tags)
 
     def run_job_for_all_services(self, job_name, target, kwargs):
-        log_bold("{} concurrency: {}".format(job_name, DEPLOYMENT_CONCURRENCY))
+        log_bold("{} concurrency: {}".format(job_name, self.deployment_concurrency))
+        status_poller = ServiceStatusPoller(EcsClient(None, None, self.region))
+        jobs = self.create_jobs(job_name, target, kwargs, status_poller)
+        status_poller.start()
+        try:
+            exit_codes = run_processes([process for _, process in jobs], self.deployment_concurrency)
+        finally:
+            status_poller.stop()
+        if report_failed_jobs(job_name, [ecs_service_name for ecs_service_name, _ in jobs], exit_codes):
+            raise UnrecoverableException(f"{job_name} failed")
+
+    def create_jobs(self, job_name, target, kwargs, status_poller):
         jobs = []
         service_info = self.service_info_fetcher.service_info
         for index, ecs_service_logical_name in enumerate(service_info):
@@ -97,28 +121,51 @@ class ServiceUpdater(object):
                                color=color,
                                service_configuration=services_configuration.get(ecs_service_logical_name),
                                region=self.region,
+                               status_poller=status_poller,
                                ))
             process = multiprocessing.Process(
-                target=target,
+                target=_run_in_directory,
+                args=(self.working_dir, target),
                 kwargs=kwargs
             )
-            jobs.append(process)
-        all_exit_codes = []
-        for chunk_of_jobs in chunks(jobs, DEPLOYMENT_CONCURRENCY):
-            for process in chunk_of_jobs:
-                process.start()
-
-            while True:
-                sleep(1)
-                exit_codes = [proc.exitcode for proc in chunk_of_jobs]
-                if None not in exit_codes:
-                    break
-
-            for exit_code in exit_codes:
-                all_exit_codes.append(exit_code)
-        if any(all_exit_codes) != 0:
-            raise UnrecoverableException(f"{job_name} failed")
+            jobs.append((ecs_service_info['ecs_service_name'], process))
+        return jobs
 
     @property
     def region(self):
         return get_region_for_environment(self.environment)
+
+
+def promote_image(name, environment, source_environment, version, additional_tags):
+    '''
+        Copy the image of version from the ECR repo of source_environment to
+        the one of environment. Only the service configuration is read, so
+        an image can be promoted before the service's stack is created.
+    '''
+    ecr = _service_ecr(name, environment, version)
+    ecr.ensure_repository()
+    ecr.promote_from(_service_ecr(name, source_environment, version))
+    ecr.add_tags(additional_tags)
+
+
+def _service_ecr(name, environment, version):
+    ecr_repo_config = ServiceConfiguration(service_name=name, environment=environment).get_config().get('ecr_repo')
+    return ECR(
+        get_region_for_environment(environment),
+        ecr_repo_config.get('name', spinalcase(name + '-repo')),
+        ecr_repo_config.get('account_id', get_account_id()),
+        ecr_repo_config.get('assume_role_arn', None),
+        version,
+    )
+
+
+def report_failed_jobs(job_name, job_labels, exit_codes):
+    failed_jobs = [label for label, exit_code in zip(job_labels, exit_codes) if exit_code != 0]
+    for label in failed_jobs:
+        log_err(f"{job_name} of {label} failed")
+    return failed_jobs
+
+
+def _run_in_directory(working_dir, target, **kwargs):
+    os.chdir(working_dir)
+    target(**kwargs)
@@ -0,0 +1,127 @@
+'''
+Local on-disk cache of describe_task_definition payloads.
+
+Task definition revisions are immutable apart from their status, so a
+payload fetched once for a full revision ARN can be reused by every later
+command on the same machine. The status is never cached: callers that need
+it describe the revision again with cached=False.
+'''
+
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from tempfile import NamedTemporaryFile
+
+from dateutil.parser import parse as parse_datetime
+
+TASK_DEFINITION_CACHE_DIR = os.environ.get(
+    'CLOUDLIFT_TASK_DEFINITION_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cloudlift', 'task_definitions'),
+)
+TASK_DEFINITION_CACHE_SIZE = int(os.environ.get('CLOUDLIFT_TASK_DEFINITION_CACHE_SIZE', 500))
+REVISION_ARN_PATTERN = re.compile(r'^arn:[^:]+:ecs:[^:]+:\d+:task-definition/[^:/]+:\d+$')
+MUTABLE_TASK_DEFINITION_FIELDS = ('status', 'deregisteredAt')
+
+
+class TaskDefinitionCache(object):
+    '''
+        Size-bounded LRU cache of task definition payloads, stored as one
+        JSON file per revision ARN. Any error reading or writing the cache
+        is treated as a miss.
+    '''
+
+    def __init__(self, directory=TASK_DEFINITION_CACHE_DIR, max_entries=TASK_DEFINITION_CACHE_SIZE):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    def get(self, task_definition_arn):
+        if not self._is_cacheable(task_definition_arn):
+            return None
+        path = self._path(task_definition_arn)
+        try:
+            with open(path) as f:
+                payload = json.load(f, object_hook=_decode_datetime)
+            os.utime(path)
+            return _without_mutable_fields(payload)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, task_definition_arn, payload):
+        if not self._is_cacheable(task_definition_arn):
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with NamedTemporaryFile('w', dir=self.directory, suffix='.tmp', delete=False) as f:
+                try:
+                    json.dump(_without_mutable_fields(payload), f, default=_encode_datetime)
+                except (TypeError, ValueError):
+                    os.remove(f.name)
+                    raise
+            os.replace(f.name, self._path(task_definition_arn))
+            self._evict()
+        except (OSError, TypeError, ValueError):
+            pass
+
+    def _is_cacheable(self, task_definition_arn):
+        return self.max_entries > 0 and bool(REVISION_ARN_PATTERN.match(str(task_definition_arn)))
+
+    def _path(self, task_definition_arn):
+        return os.path.join(self.directory, hashlib.sha256(task_definition_arn.encode()).hexdigest() + '.json')
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                entries.append((entry.stat().st_mtime, entry.path))
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def describe_task_definition(boto_client, task_definition_arn, cache=None, cached=True):
+    '''
+        Describe a task definition with its tags. A cached payload has no
+        status; with cached=False the revision is always described again,
+        the full response is returned and the cache is refreshed.
+    '''
+    cache = cache or TaskDefinitionCache()
+    if cached:
+        payload = cache.get(task_definition_arn)
+        if payload is not None:
+            return payload
+    payload = boto_client.describe_task_definition(
+        taskDefinition=task_definition_arn,
+        include=[
+            'TAGS',
+        ]
+    )
+    payload.pop('ResponseMetadata', None)
+    cache.put(task_definition_arn, payload)
+    return _without_mutable_fields(payload) if cached else payload
+
+
+def _without_mutable_fields(payload):
+    task_definition = payload.get('taskDefinition')
+    if not isinstance(task_definition, dict) or not any(
+            field in task_definition for field in MUTABLE_TASK_DEFINITION_FIELDS):
+        return payload
+    task_definition = {key: value for key, value in task_definition.items()
+                       if key not in MUTABLE_TASK_DEFINITION_FIELDS}
+    return dict(payload, taskDefinition=task_definition)
+
+
+def _encode_datetime(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _decode_datetime(value):
+    if '__datetime__' in value:
+        return parse_datetime(value['__datetime__'])
+    return value
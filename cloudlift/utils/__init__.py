@@ -1 +1,2 @@
-from .chunks import *
\ No newline at end of file
+from .chunks import *
+from .process_pool import *
@@ -0,0 +1,28 @@
+from itertools import islice
+from multiprocessing.connection import wait
+
+
+def run_processes(processes, concurrency):
+    '''
+        Runs the given processes with at most `concurrency` of them alive at
+        a time. The next pending process is started as soon as any running
+        process exits. Returns the exit codes in the order of the processes.
+    '''
+    pending = iter(processes)
+    running = {}
+
+    def start(process):
+        process.start()
+        running[process.sentinel] = process
+
+    for process in islice(pending, max(1, concurrency)):
+        start(process)
+
+    while running:
+        for sentinel in wait(list(running)):
+            running.pop(sentinel).join()
+            next_process = next(pending, None)
+            if next_process is not None:
+                start(next_process)
+
+    return [process.exitcode for process in processes]
@@ -0,0 +1,33 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+HEAVY_MODULES = ['boto3', 'botocore', 'troposphere', 'awacs', 'cfn_flip', 'deepdiff', 'jsonschema']
+
+
+def _run_python(code):
+    return subprocess.check_output([sys.executable, '-c', code]).decode('utf-8').strip()
+
+
+class TestCliStartup(TestCase):
+    def test_importing_cli_does_not_import_heavy_modules(self):
+        loaded = _run_python(
+            "import sys; import cloudlift; "
+            "print(','.join(m for m in {!r} if m in sys.modules))".format(HEAVY_MODULES)
+        )
+
+        self.assertEqual('', loaded)
+
+    def test_version_does_not_import_heavy_modules(self):
+        loaded = _run_python(
+            "import sys\n"
+            "from cloudlift import cli\n"
+            "try:\n"
+            "    cli(['--version'])\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print('loaded:' + ','.join(m for m in {!r} if m in sys.modules))".format(HEAVY_MODULES)
+        )
+
+        self.assertEqual('loaded:', loaded.splitlines()[-1])
+        self.assertIn('cloudlift, version', loaded)
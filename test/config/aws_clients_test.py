@@ -0,0 +1,72 @@
+import os
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+from dateutil.tz.tz import tzutc
+from mock import patch, MagicMock
+
+from cloudlift.config import aws_clients
+
+
+class TestAwsClients(unittest.TestCase):
+    def setUp(self):
+        aws_clients.clear_clients()
+        self.addCleanup(aws_clients.clear_clients)
+
+    @patch('cloudlift.config.aws_clients.Session')
+    def test_get_client_is_memoized_per_service_and_region(self, mock_session):
+        ecs_client = aws_clients.get_client('ecs', 'us-east-1')
+
+        self.assertIs(ecs_client, aws_clients.get_client('ecs', 'us-east-1'))
+        aws_clients.get_client('ecr', 'us-east-1')
+        aws_clients.get_client('ecs', 'us-west-2')
+
+        self.assertEqual(2, mock_session.call_count)
+        mock_session.return_value.client.assert_any_call('ecs', config=aws_clients.AWS_CLIENT_CONFIG)
+
+    @patch('cloudlift.config.aws_clients.Session')
+    def test_get_client_assumes_role_once_until_expiry(self, mock_session):
+        sts_client = MagicMock()
+        sts_client.assume_role.return_value = {'Credentials': {
+            'AccessKeyId': 'key', 'SecretAccessKey': 'secret', 'SessionToken': 'token',
+            'Expiration': datetime.now(tzutc()) + timedelta(hours=1),
+        }}
+        mock_session.return_value.client.side_effect = \
+            lambda service, config: sts_client if service == 'sts' else MagicMock()
+
+        ecr_client = aws_clients.get_client('ecr', 'us-east-1', 'arn:aws:iam::123:role/ecr')
+
+        self.assertIs(ecr_client, aws_clients.get_client('ecr', 'us-east-1', 'arn:aws:iam::123:role/ecr'))
+        sts_client.assume_role.assert_called_once_with(RoleArn='arn:aws:iam::123:role/ecr',
+                                                       RoleSessionName=aws_clients.ASSUMED_ROLE_SESSION_NAME)
+
+        aws_clients._sessions[('us-east-1', 'arn:aws:iam::123:role/ecr')] = (MagicMock(), datetime.now(tzutc()))
+        self.assertIsNot(ecr_client, aws_clients.get_client('ecr', 'us-east-1', 'arn:aws:iam::123:role/ecr'))
+        self.assertEqual(2, sts_client.assume_role.call_count)
+
+    @patch('cloudlift.config.aws_clients.Session')
+    def test_get_resource_is_memoized_per_thread(self, mock_session):
+        mock_session.return_value.resource.side_effect = lambda service, config: MagicMock()
+        resource = aws_clients.get_resource('dynamodb')
+        other_thread_resources = []
+        thread = threading.Thread(target=lambda: other_thread_resources.append(aws_clients.get_resource('dynamodb')))
+        thread.start()
+        thread.join()
+
+        self.assertIs(resource, aws_clients.get_resource('dynamodb'))
+        self.assertIsNot(resource, other_thread_resources[0])
+
+    @patch('cloudlift.config.aws_clients.Session')
+    def test_forked_child_does_not_reuse_parent_clients(self, mock_session):
+        aws_clients.get_client('ecs', 'us-east-1')
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.write(write_fd, str(len(aws_clients._clients)).encode())
+            os._exit(0)
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(b'0', os.read(read_fd, 8))
+        os.close(read_fd)
@@ -1,4 +1,5 @@
 import unittest
+from cloudlift.config import dynamodb_config
 from cloudlift.config.dynamodb_config import DynamodbConfig
 from moto import mock_dynamodb2
 import boto3
@@ -41,6 +42,8 @@ class ConfigClassWithPassingValidate(DynamodbConfig):
 
 
 class TestDynamodbConfig(unittest.TestCase):
+    def setUp(self):
+        dynamodb_config._existing_tables.clear()
 
     @mock_dynamodb2
     def test_set_and_get_config_in_db(self):
@@ -89,3 +92,11 @@ class TestDynamodbConfig(unittest.TestCase):
         assert fetched_table.table_status == 'ACTIVE'
         assert fetched_table.key_schema == [{'AttributeName': 'primary_attr', 'KeyType': 'HASH'}, {'AttributeName': 'secondary_attr', 'KeyType': 'RANGE'}]
         assert fetched_table.attribute_definitions == [{'AttributeName': 'primary_attr', 'AttributeType': 'S'}, {'AttributeName': 'secondary_attr', 'AttributeType': 'S'}]
+
+    @mock_dynamodb2
+    def test_get_table_checks_existence_once_per_table(self):
+        DynamodbConfig('memoized_table', [('key1', 'valuexyz')])
+        with patch('cloudlift.config.dynamodb_config.get_client') as mock_get_client:
+            DynamodbConfig('memoized_table', [('key1', 'valuexyz')])
+            DynamodbConfig('memoized_table', [('key1', 'other')])
+        mock_get_client.assert_not_called()
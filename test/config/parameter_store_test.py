@@ -1,4 +1,5 @@
 import pytest
+from botocore.exceptions import ClientError
 from mock import patch, call, MagicMock
 
 from cloudlift.config import ParameterStore
@@ -128,7 +129,7 @@ KEY2=value2"""
                  KeyId='alias/aws/ssm', Overwrite=False),
             call(Name='/dummy-staging/test-service/DUMMY_VAR21', Value='test_add_21', Type='SecureString',
                  KeyId='alias/aws/ssm', Overwrite=False),
-        ])
+        ], any_order=True)
         mock_client.delete_parameters.assert_called_with(
             Names=['/dummy-staging/test-service/DUMMY_VAR13', '/dummy-staging/test-service/DUMMY_VAR10']
         )
@@ -153,13 +154,68 @@ KEY2=value2"""
                  Type='SecureString', KeyId='alias/aws/ssm', Overwrite=False),
             call(Name='/dummy-staging/test-service/sidecars/nginx/DUMMY_VAR21', Value='test_add_21',
                  Type='SecureString', KeyId='alias/aws/ssm', Overwrite=False),
-        ])
+        ], any_order=True)
         mock_client.delete_parameters.assert_called_with(
             Names=[
                 '/dummy-staging/test-service/sidecars/nginx/DUMMY_VAR13',
                 '/dummy-staging/test-service/sidecars/nginx/DUMMY_VAR10']
         )
 
+    @patch("cloudlift.config.parameter_store.get_client_for")
+    def test_get_existing_config_follows_next_token(self, mock_get_client_for):
+        mock_client = MagicMock()
+        mock_get_client_for.return_value = mock_client
+        mock_client.get_parameters_by_path.side_effect = [
+            {'Parameters': [{'Name': '/staging/test-service/VAR1', 'Value': '1'}], 'NextToken': 'token1'},
+            {'Parameters': [{'Name': '/staging/test-service/VAR2', 'Value': '2'}]},
+        ]
+
+        env_configs, _ = ParameterStore('test-service', 'staging').get_existing_config()
+
+        assert env_configs == {'VAR1': '1', 'VAR2': '2'}
+        mock_client.get_parameters_by_path.assert_called_with(
+            Path='/staging/test-service/', Recursive=True, WithDecryption=True, MaxResults=10, NextToken='token1'
+        )
+
+    @patch("cloudlift.config.parameter_store.get_client_for")
+    def test_get_existing_config_as_string_for_sidecar_queries_sidecar_path(self, mock_get_client_for):
+        mock_client = MagicMock()
+        mock_get_client_for.return_value = mock_client
+        mock_client.get_parameters_by_path.return_value = {
+            'Parameters': [{'Name': '/staging/test-service/sidecars/redis/KEY1', 'Value': 'value1'}]
+        }
+
+        assert ParameterStore('test-service', 'staging').get_existing_config_as_string('redis') == "KEY1=value1"
+        mock_client.get_parameters_by_path.assert_called_once_with(
+            Path='/staging/test-service/sidecars/redis/', Recursive=True, WithDecryption=True, MaxResults=10
+        )
+
+    @patch("cloudlift.config.parameter_store.get_client_for")
+    def test_get_config_for_keys_batches_get_parameters(self, mock_get_client_for):
+        mock_client = MagicMock()
+        mock_get_client_for.return_value = mock_client
+        mock_client.get_parameters.side_effect = lambda Names, WithDecryption: {
+            'Parameters': [{'Name': name, 'Value': name.rsplit('/', 1)[1].lower()} for name in Names
+                           if not name.endswith('MISSING')]
+        }
+        keys = ['KEY{:02d}'.format(i) for i in range(25)] + ['MISSING']
+
+        config = ParameterStore('test-service', 'staging').get_config_for_keys(keys)
+
+        assert config == {'KEY{:02d}'.format(i): 'key{:02d}'.format(i) for i in range(25)}
+        assert sorted(len(c.kwargs['Names']) for c in mock_client.get_parameters.call_args_list) == [6, 10, 10]
+
+    @patch("cloudlift.config.parameter_store.get_client_for")
+    def test_set_config_raises_client_errors(self, mock_get_client_for):
+        mock_client = MagicMock()
+        mock_get_client_for.return_value = mock_client
+        mock_client.put_parameter.side_effect = ClientError(
+            {'Error': {'Code': 'ParameterAlreadyExists', 'Message': 'exists'}}, 'PutParameter')
+
+        with pytest.raises(ClientError):
+            ParameterStore('test-service', 'staging').set_config([['add', '', [('VAR1', 'value')]]])
+        assert mock_client.put_parameter.call_count == 1
+
     @patch("cloudlift.config.parameter_store.log_err")
     @patch("cloudlift.config.parameter_store.get_client_for")
     def test_set_config_validation(self, mock_get_client_for, mock_log_err):
@@ -1,7 +1,9 @@
+from botocore.exceptions import ClientError
 from cloudlift.config import secrets_manager
 from mock import patch, MagicMock
 import unittest
 import datetime
+import json
 from dateutil.tz.tz import tzlocal
 
 
@@ -44,3 +46,170 @@ def _get_secret_response():
                                              'connection': 'keep-alive',
                                              'x-amzn-requestid': '17f66dd3-8fad-4dad-a43e-e1ec9c99ef06'},
                              'RetryAttempts': 0}}
+
+
+class TestSecretsManagerBatch(unittest.TestCase):
+    def setUp(self):
+        secrets_manager.clear_cache()
+
+    @patch('cloudlift.config.secrets_manager.get_client_for')
+    def test_get_configs_uses_batch_get_secret_value(self, mock_get_client_for):
+        mock_client = MagicMock()
+        mock_get_client_for.return_value = mock_client
+        mock_client.batch_get_secret_value.return_value = {
+            'SecretValues': [_get_secret_value('dummy-common'), _get_secret_value('dummy-common/app1')],
+            'Errors': [],
+        }
+
+        configs = secrets_manager.get_configs(['dummy-common', 'dummy-common/app1'], 'test')
+
+        mock_client.batch_get_secret_value.assert_called_once_with(SecretIdList=['dummy-common', 'dummy-common/app1'])
+        mock_client.get_secret_value.assert_not_called()
+        self.assertEqual({'secrets': {'NAME': 'dummy-common/app1'}, 'ARN': 'arn:dummy-common/app1:::v1'},
+                         configs['dummy-common/app1'])
+        self.assertEqual(configs['dummy-common'], secrets_manager.get_config('dummy-common', 'test'))
+
+    @patch('cloudlift.config.secrets_manager.get_client_for')
+    def test_get_configs_fetches_batch_errors_individually(self, mock_get_client_for):
+        mock_client = MagicMock()
+        mock_get_client_for.return_value = mock_client
+        mock_client.batch_get_secret_value.return_value = {
+            'SecretValues': [_get_secret_value('dummy-common')],
+            'Errors': [{'SecretId': 'dummy-missing', 'ErrorCode': 'ResourceNotFoundException'}],
+        }
+        mock_client.get_secret_value.side_effect = Exception('not found')
+
+        with self.assertRaises(Exception):
+            secrets_manager.get_configs(['dummy-common', 'dummy-missing'], 'test')
+
+        mock_client.get_secret_value.assert_called_once_with(SecretId='dummy-missing')
+
+    @patch('cloudlift.config.secrets_manager.get_client_for')
+    def test_get_configs_without_batch_api_fetches_concurrently(self, mock_get_client_for):
+        mock_client = MagicMock(spec=['get_secret_value'])
+        mock_get_client_for.return_value = mock_client
+        mock_client.get_secret_value.side_effect = lambda SecretId: _get_secret_value(SecretId)
+
+        configs = secrets_manager.get_configs(['dummy-common', 'dummy-common/app1', 'dummy-common'], 'test')
+
+        self.assertEqual(2, mock_client.get_secret_value.call_count)
+        self.assertEqual(['dummy-common', 'dummy-common/app1'], sorted(configs))
+
+    @patch('cloudlift.config.secrets_manager.get_client_for')
+    def test_get_configs_fetches_individually_when_batch_api_is_denied(self, mock_get_client_for):
+        mock_client = MagicMock()
+        mock_get_client_for.return_value = mock_client
+        mock_client.batch_get_secret_value.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDeniedException', 'Message': 'not authorized'}}, 'BatchGetSecretValue')
+        mock_client.get_secret_value.side_effect = lambda SecretId: _get_secret_value(SecretId)
+
+        configs = secrets_manager.get_configs(['dummy-common', 'dummy-common/app1'], 'test')
+
+        mock_client.batch_get_secret_value.assert_called_once()
+        self.assertEqual(2, mock_client.get_secret_value.call_count)
+        self.assertEqual({'secrets': {'NAME': 'dummy-common/app1'}, 'ARN': 'arn:dummy-common/app1:::v1'},
+                         configs['dummy-common/app1'])
+
+
+def _get_secret_value(name):
+    return {'ARN': f'arn:{name}', 'Name': name, 'VersionId': 'v1', 'SecretString': json.dumps({'NAME': name})}
+
+
+class TestSecretsManagerContentHash(unittest.TestCase):
+    def setUp(self):
+        secrets_manager.clear_cache()
+        self.config = {'PORT': '80', 'LABEL': 'L1'}
+        self.client = MagicMock()
+        self.client.exceptions.ResourceNotFoundException = type('ResourceNotFoundException', (Exception,), {})
+        patcher = patch('cloudlift.config.secrets_manager.get_client_for', return_value=self.client)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+    def _metadata(self, tags):
+        return {'ARN': 'arn:injected', 'Tags': tags,
+                'VersionIdsToStages': {'v1': ['AWSPREVIOUS'], 'v2': ['AWSCURRENT']}}
+
+    def test_unchanged_secret_is_confirmed_from_metadata(self):
+        self.client.describe_secret.return_value = self._metadata(
+            [{'Key': secrets_manager.CONTENT_HASH_TAG, 'Value': secrets_manager.content_hash(self.config) + ':v2'}])
+
+        arn = secrets_manager.set_secrets_manager_config_if_changed('test', 'injected', self.config)
+
+        self.assertEqual('arn:injected:::v2', arn)
+        self.client.get_secret_value.assert_not_called()
+        self.client.put_secret_value.assert_not_called()
+
+    def test_hash_tag_of_older_version_is_confirmed_by_value(self):
+        self.client.describe_secret.return_value = self._metadata(
+            [{'Key': secrets_manager.CONTENT_HASH_TAG, 'Value': secrets_manager.content_hash(self.config) + ':v1'}])
+        self.client.get_secret_value.return_value = {'ARN': 'arn:injected', 'VersionId': 'v2',
+                                                     'SecretString': json.dumps({'PORT': '81'})}
+        self.client.put_secret_value.return_value = {'ARN': 'arn:injected', 'VersionId': 'v3'}
+
+        arn = secrets_manager.set_secrets_manager_config_if_changed('test', 'injected', self.config)
+
+        self.assertEqual('arn:injected:::v3', arn)
+        self.client.get_secret_value.assert_called_once_with(SecretId='injected')
+
+    def test_changed_secret_is_written_and_arn_taken_from_response(self):
+        self.client.describe_secret.return_value = self._metadata(
+            [{'Key': secrets_manager.CONTENT_HASH_TAG, 'Value': 'stale:v2'}])
+        self.client.put_secret_value.return_value = {'ARN': 'arn:injected', 'VersionId': 'v3'}
+
+        arn = secrets_manager.set_secrets_manager_config_if_changed('test', 'injected', self.config)
+
+        self.assertEqual('arn:injected:::v3', arn)
+        self.client.put_secret_value.assert_called_once_with(SecretId='injected', SecretString=json.dumps(self.config))
+        self.client.tag_resource.assert_called_once_with(SecretId='injected', Tags=[
+            {'Key': secrets_manager.CONTENT_HASH_TAG, 'Value': secrets_manager.content_hash(self.config) + ':v3'}])
+        self.client.get_secret_value.assert_not_called()
+
+    def test_untagged_secret_with_same_content_is_only_tagged(self):
+        self.client.describe_secret.return_value = self._metadata([])
+        self.client.get_secret_value.return_value = {'ARN': 'arn:injected', 'VersionId': 'v2',
+                                                     'SecretString': json.dumps(self.config)}
+
+        arn = secrets_manager.set_secrets_manager_config_if_changed('test', 'injected', self.config)
+
+        self.assertEqual('arn:injected:::v2', arn)
+        self.client.put_secret_value.assert_not_called()
+        self.client.tag_resource.assert_called_once()
+
+    def test_missing_secret_is_created_with_hash_tag(self):
+        self.client.describe_secret.side_effect = self.client.exceptions.ResourceNotFoundException()
+        self.client.put_secret_value.side_effect = self.client.exceptions.ResourceNotFoundException()
+        self.client.create_secret.return_value = {'ARN': 'arn:injected', 'VersionId': 'v1'}
+
+        arn = secrets_manager.set_secrets_manager_config_if_changed('test', 'injected', self.config)
+
+        self.assertEqual('arn:injected:::v1', arn)
+        self.client.create_secret.assert_called_once_with(Name='injected', SecretString=json.dumps(self.config))
+        self.client.tag_resource.assert_called_once_with(SecretId='injected', Tags=[
+            {'Key': secrets_manager.CONTENT_HASH_TAG, 'Value': secrets_manager.content_hash(self.config) + ':v1'}])
+
+    def test_secret_that_cannot_be_described_is_compared_by_value(self):
+        self.client.describe_secret.side_effect = _access_denied('DescribeSecret')
+        self.client.get_secret_value.return_value = {'ARN': 'arn:injected', 'VersionId': 'v2',
+                                                     'SecretString': json.dumps(self.config)}
+        self.client.tag_resource.side_effect = _access_denied('TagResource')
+
+        arn = secrets_manager.set_secrets_manager_config_if_changed('test', 'injected', self.config)
+
+        self.assertEqual('arn:injected:::v2', arn)
+        self.client.put_secret_value.assert_not_called()
+
+    def test_failed_hash_tag_does_not_fail_the_write(self):
+        self.client.describe_secret.side_effect = _access_denied('DescribeSecret')
+        self.client.get_secret_value.return_value = {'ARN': 'arn:injected', 'VersionId': 'v2',
+                                                     'SecretString': json.dumps({'PORT': '81'})}
+        self.client.put_secret_value.return_value = {'ARN': 'arn:injected', 'VersionId': 'v3'}
+        self.client.tag_resource.side_effect = _access_denied('TagResource')
+
+        arn = secrets_manager.set_secrets_manager_config_if_changed('test', 'injected', self.config)
+
+        self.assertEqual('arn:injected:::v3', arn)
+        self.client.put_secret_value.assert_called_once_with(SecretId='injected', SecretString=json.dumps(self.config))
+
+
+def _access_denied(operation_name):
+    return ClientError({'Error': {'Code': 'AccessDeniedException', 'Message': 'not authorized'}}, operation_name)
@@ -4,7 +4,7 @@ from mock import patch, MagicMock
 
 
 class TestRegion(TestCase):
-    @patch("cloudlift.config.region.local_cache", {})
+    @patch("cloudlift.config.region._environment_contexts", {})
     @patch("cloudlift.config.region.EnvironmentConfiguration")
     def test_get_region_for_environment_without_cache(self, env_config):
         mock = MagicMock()
@@ -20,15 +20,17 @@ class TestRegion(TestCase):
 
         self.assertEqual(actual, expected)
 
-    @patch("cloudlift.config.region.local_cache", {'region': 'mock-region'})
+    @patch("cloudlift.config.region._environment_contexts", {})
     @patch("cloudlift.config.region.EnvironmentConfiguration")
     def test_get_region_for_environment_with_cache(self, env_config):
+        region.get_environment_context('test-env')._region = 'mock-region'
         expected = 'mock-region'
         actual = region.get_region_for_environment('test-env')
 
         self.assertEqual(actual, expected)
         env_config.assert_not_called()
 
+    @patch("cloudlift.config.region._environment_contexts", {})
     @patch("cloudlift.config.region.EnvironmentConfiguration")
     def test_get_service_templates_bucket_for_environment_without_cache(self, env_config):
         mock = MagicMock()
@@ -44,12 +46,48 @@ class TestRegion(TestCase):
 
         self.assertEqual(actual, expected)
 
-    @patch("cloudlift.config.region.local_cache", {'bucket': 'mock.bucket.url'})
+    @patch("cloudlift.config.region._environment_contexts", {})
     @patch("cloudlift.config.region.EnvironmentConfiguration")
     def test_get_service_templates_bucket_for_environment_with_cache(self, env_config):
+        region.get_environment_context('test-env')._config = {'service_templates_bucket': 'mock.bucket.url'}
         expected = 'mock.bucket.url'
 
         actual = region.get_service_templates_bucket_for_environment('test-env')
 
         self.assertEqual(actual, expected)
         env_config.assert_not_called()
+
+    @patch("cloudlift.config.region._environment_contexts", {})
+    @patch("cloudlift.config.region.EnvironmentConfiguration")
+    def test_environment_lookups_load_configuration_once_per_environment(self, env_config):
+        env_config.return_value.get_config.side_effect = lambda: {
+            'staging': {
+                'region': 'us-west-2',
+                'loadbalancer_listener_arn': 'staging-listener',
+                'environment': {'notifications_arn': 'staging-sns', 'ssl_certificate_arn': 'staging-cert'},
+            },
+            'production': {
+                'region': 'ap-south-1',
+                'environment': {'notifications_arn': 'production-sns', 'ssl_certificate_arn': 'production-cert'},
+            },
+        }
+
+        self.assertEqual('us-west-2', region.get_region_for_environment('staging'))
+        self.assertEqual('staging-listener', region.get_environment_level_alb_listener('staging'))
+        self.assertEqual('staging-sns', region.get_notifications_arn_for_environment('staging'))
+        self.assertEqual('staging-cert', region.get_ssl_certification_for_environment('staging'))
+        self.assertEqual('ap-south-1', region.get_region_for_environment('production'))
+        self.assertEqual('production-cert', region.get_ssl_certification_for_environment('production'))
+
+        self.assertEqual(2, env_config.call_count)
+
+    @patch("cloudlift.config.region._environment_contexts", {})
+    @patch("cloudlift.config.region.EnvironmentConfiguration")
+    def test_forget_environment_context_reloads_configuration(self, env_config):
+        env_config.return_value.get_config.return_value = {'test-env': {'region': 'mock-region'}}
+        region.get_region_for_environment('test-env')
+
+        region.forget_environment_context('test-env')
+        region.get_region_for_environment('test-env')
+
+        self.assertEqual(2, env_config.call_count)
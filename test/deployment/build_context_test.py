@@ -0,0 +1,67 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from cloudlift.deployment.build_context import build_context_hash, context_files
+
+
+class TestBuildContext(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.context = directory.name
+        self._write('Dockerfile', 'FROM python:3.8\nCOPY . /app\n')
+        self._write('app/main.py', 'print("hello")\n')
+        self._write('app/__pycache__/main.pyc', 'bytecode')
+        self._write('docs/README.md', 'docs')
+        self._write('docs/keep.md', 'keep')
+        self._write('.dockerignore', '# generated files\n**/__pycache__\ndocs\n!docs/keep.md\n')
+
+    def _write(self, path, content):
+        path = os.path.join(self.context, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _hash(self, build_args=None):
+        return build_context_hash(self.context, os.path.join(self.context, 'Dockerfile'), build_args)
+
+    def test_context_files_follow_dockerignore(self):
+        self.assertEqual(['.dockerignore', 'Dockerfile', 'app/main.py', 'docs/keep.md'],
+                         [path for path, _ in context_files(self.context)])
+
+    def test_hash_ignores_excluded_files(self):
+        context_hash = self._hash()
+
+        self._write('docs/README.md', 'changed docs')
+        self._write('app/__pycache__/main.pyc', 'changed bytecode')
+
+        self.assertEqual(context_hash, self._hash())
+
+    def test_hash_changes_with_context_files(self):
+        context_hash = self._hash()
+
+        self._write('app/main.py', 'print("bye")\n')
+
+        self.assertNotEqual(context_hash, self._hash())
+
+    def test_hash_changes_with_build_args(self):
+        self.assertEqual(self._hash({'A': '1', 'B': '2'}), self._hash({'B': '2', 'A': '1'}))
+        self.assertNotEqual(self._hash({'A': '1'}), self._hash({'A': '2'}))
+
+    def test_hash_changes_with_platforms(self):
+        self.assertEqual(self._hash(), build_context_hash(self.context, os.path.join(self.context, 'Dockerfile'),
+                                                          platforms=[]))
+        self.assertNotEqual(self._hash(), build_context_hash(self.context, os.path.join(self.context, 'Dockerfile'),
+                                                             platforms=['linux/amd64', 'linux/arm64']))
+
+    def test_hash_includes_dockerfile_outside_context(self):
+        with TemporaryDirectory() as other:
+            dockerfile = os.path.join(other, 'Dockerfile.web')
+            with open(dockerfile, 'w') as f:
+                f.write('FROM python:3.8\n')
+            context_hash = build_context_hash(self.context, dockerfile)
+            with open(dockerfile, 'w') as f:
+                f.write('FROM python:3.9\n')
+
+            self.assertNotEqual(context_hash, build_context_hash(self.context, dockerfile))
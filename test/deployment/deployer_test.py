@@ -2,15 +2,17 @@ import os
 from _datetime import datetime, timedelta
 from copy import deepcopy
 from unittest import TestCase
-from unittest.mock import patch, MagicMock, sentinel, mock_open
+from unittest.mock import patch, MagicMock, sentinel, mock_open, ANY
 
 import pytest
+from botocore.exceptions import ClientError
 from dateutil.tz.tz import tzlocal
 
 from cloudlift.deployment.deployer import is_deployed, \
     record_deployment_failure_metric, deploy_and_wait, build_config, get_env_sample_file_name, \
     get_env_sample_file_contents, get_namespaces_from_directory, find_duplicate_keys, get_sample_keys, get_secret_name, \
-    get_automated_injected_secret_name, create_new_task_definition
+    get_automated_injected_secret_name, create_new_task_definition, deploy_task_definition, \
+    resolve_config, resolved_config_scope
 from cloudlift.deployment.ecs import EcsService, EcsTaskDefinition
 from cloudlift.exceptions import UnrecoverableException
 
@@ -80,8 +82,9 @@ class TestDeployer(TestCase):
         }
         assert not is_deployed(service)
 
+    @patch("cloudlift.deployment.ecs.DeploymentIdentifierIndex")
     @patch("cloudlift.deployment.deployer.build_config")
-    def test_create_new_task_definition(self, mock_build_config):
+    def test_create_new_task_definition(self, mock_build_config, mock_deployment_identifier_index):
         client = MagicMock()
         service_configuration = {
             'command': './start_script.sh',
@@ -123,6 +126,7 @@ class TestDeployer(TestCase):
         expected = deepcopy(current_task_definition)
         expected['containerDefinitions'][0]['image'] = 'nginx:v2'
         expected['tags'][0]['value'] = 'id-01'
+        expected['tags'].append({'key': 'task_definition_hash', 'value': ANY})
         expected['containerDefinitions'][0]['memory'] = 20480
 
         client.describe_services.return_value = {'services': [{
@@ -149,11 +153,71 @@ class TestDeployer(TestCase):
         )
 
         client.describe_services.assert_called_with(cluster_name='cluster-test', service_name='dummy-123')
-        client.describe_task_definition.assert_called_with(task_definition_arn='tdARN1')
+        client.describe_task_definition.assert_called_with(task_definition_arn='tdARN1', cached=True)
         args, kwargs = client.register_task_definition.call_args
         self.assertEqual(expected, kwargs)
         client.register_task_definition.assert_called_with(**expected)
 
+    @patch("cloudlift.deployment.ecs.DeploymentIdentifierIndex")
+    @patch("cloudlift.deployment.deployer.build_config")
+    def test_create_new_task_definition_reuses_unchanged_task_definition(self, mock_build_config,
+                                                                        mock_deployment_identifier_index):
+        client = MagicMock()
+        service_configuration = {'command': './start_script.sh', 'memory_reservation': 100}
+        mock_build_config.return_value = {
+            'DummyContainer': {"secrets": {}, "environment": {"PORT": "80"}},
+        }
+        kwargs = dict(color='white', client=client, cluster_name='cluster-test', ecs_service_name='dummy-123',
+                      ecs_service_logical_name='Dummy', service_name='dummy-test',
+                      sample_env_file_path='./env.sample', env_name='test', secrets_name=None,
+                      service_configuration=service_configuration, region='region1', ecr_image_uri='nginx:v2')
+        client.describe_services.return_value = {'services': [{'taskDefinition': 'tdARN1'}]}
+        client.describe_task_definition.return_value = {
+            'taskDefinition': {'containerDefinitions': [{'name': 'DummyContainer', 'image': 'nginx:v1',
+                                                         'essential': True}],
+                               'family': 'testDummyFamily', 'taskRoleArn': 'oldTaskRoleArn',
+                               'executionRoleArn': 'oldTaskExecRoleArn'},
+            'tags': [{'key': 'deployment_identifier', 'value': 'id-00'}],
+        }
+        create_new_task_definition(deployment_identifier='id-01', **kwargs)
+        registered = client.register_task_definition.call_args[1]
+        registered_tags = registered.pop('tags')
+        self.assertIn({'key': 'task_definition_hash', 'value': EcsTaskDefinition(registered).content_hash},
+                      registered_tags)
+
+        client.describe_task_definition.return_value = {
+            'taskDefinition': dict(registered, taskDefinitionArn='tdARN2'),
+            'tags': registered_tags,
+        }
+        client.register_task_definition.reset_mock()
+        task_definition = create_new_task_definition(deployment_identifier='id-02', **kwargs)
+
+        self.assertEqual('tdARN2', task_definition.arn)
+        client.register_task_definition.assert_not_called()
+        client.tag_resource.assert_called_once_with('tdARN2', [{'key': 'deployment_identifier:id-02', 'value': ''}])
+        mock_deployment_identifier_index.assert_called_with('testDummyFamily', 'id-02')
+        mock_deployment_identifier_index.return_value.set_task_definition_arn.assert_called_with('tdARN2')
+
+        client.tag_resource.side_effect = ClientError({'Error': {'Code': 'InvalidParameterException'}},
+                                                      'TagResource')
+        client.register_task_definition.return_value = {'taskDefinition': dict(registered, taskDefinitionArn='tdARN3')}
+        task_definition = create_new_task_definition(deployment_identifier='id-03', **kwargs)
+
+        self.assertEqual('tdARN3', task_definition.arn)
+        client.register_task_definition.assert_called_once()
+
+    def test_deploy_task_definition_skips_service_already_running_task_definition(self):
+        client = MagicMock()
+        client.describe_services.return_value = {'services': [{
+            'taskDefinition': 'tdARN2', 'desiredCount': 2, 'runningCount': 2,
+            'deployments': [{'status': 'PRIMARY'}], 'events': [],
+        }]}
+
+        deploy_task_definition(client, EcsTaskDefinition({'taskDefinitionArn': 'tdARN2'}), 'cluster-test',
+                               'dummy-123', 'white', 60, 'Deploy')
+
+        client.update_service.assert_not_called()
+
 
 class TestDeployAndWait(TestCase):
     @staticmethod
@@ -338,7 +402,7 @@ class TestDeployAndWait(TestCase):
 
 
 @patch('cloudlift.deployment.deployer.datetime')
-@patch('cloudlift.deployment.deployer.boto3.client')
+@patch('cloudlift.deployment.deployer.get_client')
 def test_create_deployment_timeout_alarm(mock_boto3_client, dt):
     mock_boto3_client.put_metric_data = MagicMock()
     cluster_name = sentinel.cluster_name
@@ -382,7 +446,7 @@ class TestBuildConfig(TestCase):
 
         mock_store = MagicMock()
         mock_parameter_store.return_value = mock_store
-        mock_store.get_existing_config.return_value = ({'PORT': '80', 'LABEL': 'Dummy'}, {})
+        mock_store.get_config_for_keys.return_value = {'PORT': '80', 'LABEL': 'Dummy'}
 
         actual_configurations = build_config(env_name, cloudlift_service_name, "", sample_env_file_path,
                                              essential_container_name, None)
@@ -407,8 +471,7 @@ class TestBuildConfig(TestCase):
         secrets_name = "main"
         mock_store = MagicMock()
         mock_parameter_store.return_value = mock_store
-        mock_store.get_existing_config.return_value = (
-            {'PORT': '80', "LABEL": "arn_for_secret_at_v1"}, {})
+        mock_store.get_config_for_keys.return_value = {'PORT': '80', "LABEL": "arn_for_secret_at_v1"}
         mock_secrets_manager.get_config.return_value = {}
 
         actual_configurations = build_config(env_name, cloudlift_service_name, "", sample_env_file_path,
@@ -433,7 +496,7 @@ class TestBuildConfig(TestCase):
         essential_container_name = "mainService"
         mock_store = MagicMock()
         m_parameter_store.return_value = mock_store
-        mock_store.get_existing_config.return_value = ({'PORT': '80', "LABEL": "arn_for_secret_at_v1"}, {})
+        mock_store.get_config_for_keys.return_value = {'PORT': '80', "LABEL": "arn_for_secret_at_v1"}
         m_secrets_manager.get_config.return_value = {}
 
         with pytest.raises(UnrecoverableException) as pytest_wrapped_e:
@@ -480,6 +543,9 @@ class TestBuildConfig(TestCase):
                 return {'secrets': {}}
 
         m_secrets_manager.get_config.side_effect = MockSecretManager.get_config
+        m_secrets_manager.get_configs.side_effect = \
+            lambda names, env: {name: MockSecretManager.get_config(name, env) for name in names}
+        m_secrets_manager.set_secrets_manager_config_if_changed.return_value = 'injected-secret-arn'
         mock_getcwd.return_value = os.path.join(
             os.path.dirname(__file__),
             '../env_sample_files/env_sample_files_without_duplicate_keys',
@@ -489,7 +555,7 @@ class TestBuildConfig(TestCase):
                               essential_container_name,
                               "dummy-secrets-staging")
 
-        m_secrets_manager.set_secrets_manager_config.assert_called_with(
+        m_secrets_manager.set_secrets_manager_config_if_changed.assert_called_with(
             env_name,
             injected_secret_name,
             {
@@ -538,6 +604,8 @@ class TestBuildConfig(TestCase):
             return {'secrets': {}}
 
         m_secrets_manager.get_config.side_effect = get_config
+        m_secrets_manager.get_configs.side_effect = lambda names, env: {name: get_config(name, env) for name in names}
+        m_secrets_manager.set_secrets_manager_config_if_changed.return_value = 'injected-secret-arn'
         mock_getcwd.return_value = os.path.join(
             os.path.dirname(__file__),
             '../env_sample_files/env_sample_files_without_duplicate_keys',
@@ -547,6 +615,8 @@ class TestBuildConfig(TestCase):
                               essential_container_name,
                               "dummy-secrets-staging")
 
+        m_secrets_manager.set_secrets_manager_config_if_changed.assert_called_with(
+            env_name, get_automated_injected_secret_name(env_name, service_name, ecs_service_name), secrets)
         m_secrets_manager.set_secrets_manager_config.assert_not_called()
         self.assertEqual({
             essential_container_name: {
@@ -564,8 +634,7 @@ class TestBuildConfig(TestCase):
         secrets_name = "main"
         mock_store = MagicMock()
         m_parameter_store.return_value = mock_store
-        mock_store.get_existing_config.return_value = (
-            {"LABEL": "dummyvalue", 'PORT': '80', 'ADDITIONAL_KEY_1': 'true'}, {})
+        mock_store.get_config_for_keys.return_value = {"LABEL": "dummyvalue", 'PORT': '80', 'ADDITIONAL_KEY_1': 'true'}
         m_secrets_mgr.get_config.return_value = {'secrets': {},
                                                  'ARN': "dummy_arn"}
 
@@ -580,6 +649,37 @@ class TestBuildConfig(TestCase):
         }
         self.assertDictEqual(expected_configurations, actual_configurations)
 
+    @patch('cloudlift.deployment.deployer.secrets_manager')
+    @patch('os.getcwd')
+    def test_build_config_resolves_namespace_secrets_once_per_scope(self, mock_getcwd, m_secrets_manager):
+        env_name = "staging"
+        service_name = "Dummy"
+        mock_getcwd.return_value = os.path.join(
+            os.path.dirname(__file__),
+            '../env_sample_files/env_sample_files_without_duplicate_keys',
+        )
+        m_secrets_manager.get_config.return_value = {
+            'secrets': {'key1': 'v1', 'key2': 'v2', 'key3': 'v3', 'key4': 'v4'},
+            'ARN': 'injected-secret-arn',
+        }
+        m_secrets_manager.get_configs.side_effect = \
+            lambda names, env: {name: m_secrets_manager.get_config.return_value for name in names}
+
+        with resolved_config_scope():
+            resolve_config(env_name, service_name, "test-env.sample", ["dummy-secrets-staging"])
+            for ecs_service_name in ["ecs-service-1", "ecs-service-2"]:
+                build_config(env_name, service_name, ecs_service_name, "test-env.sample",
+                             "mainService", "dummy-secrets-staging")
+
+        m_secrets_manager.get_configs.assert_called_once_with(ANY, env_name)
+        self.assertCountEqual(['dummy-secrets-staging', 'dummy-secrets-staging/app1'],
+                              m_secrets_manager.get_configs.call_args.args[0])
+        injected_secret_names = [c.args[1] for c in
+                                 m_secrets_manager.set_secrets_manager_config_if_changed.call_args_list]
+        self.assertEqual([get_automated_injected_secret_name(env_name, service_name, "ecs-service-1"),
+                          get_automated_injected_secret_name(env_name, service_name, "ecs-service-2")],
+                         injected_secret_names)
+
 
 class TestSecrets(TestCase):
 
@@ -0,0 +1,50 @@
+import os
+from datetime import datetime, timedelta
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from dateutil.tz.tz import tzutc
+
+from cloudlift.deployment.docker_login_cache import DockerLoginCache
+
+REGISTRY = '12345.dkr.ecr.us-west-2.amazonaws.com'
+
+
+class TestDockerLoginCache(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cloudlift', 'docker_logins.json')
+
+    def test_login_is_reused_until_refresh_margin(self):
+        cache = DockerLoginCache(self.path)
+        self.assertFalse(cache.is_logged_in(REGISTRY))
+
+        cache.put(REGISTRY, datetime.now(tzutc()) + timedelta(hours=12))
+        self.assertTrue(DockerLoginCache(self.path).is_logged_in(REGISTRY))
+
+        cache.put(REGISTRY, datetime.now(tzutc()) + timedelta(minutes=10))
+        self.assertFalse(cache.is_logged_in(REGISTRY))
+
+    def test_forget_login(self):
+        cache = DockerLoginCache(self.path)
+        cache.put(REGISTRY, datetime.now(tzutc()) + timedelta(hours=12))
+
+        cache.forget(REGISTRY)
+
+        self.assertFalse(cache.is_logged_in(REGISTRY))
+
+    def test_login_is_scoped_to_docker_config(self):
+        cache = DockerLoginCache(self.path)
+        cache.put(REGISTRY, datetime.now(tzutc()) + timedelta(hours=12))
+
+        with patch.dict(os.environ, {'DOCKER_CONFIG': '/tmp/other-docker-config'}):
+            self.assertFalse(cache.is_logged_in(REGISTRY))
+
+    def test_corrupt_cache_is_a_miss(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as f:
+            f.write('{not json')
+
+        self.assertFalse(DockerLoginCache(self.path).is_logged_in(REGISTRY))
@@ -1,4 +1,18 @@
+import io
+import subprocess
+from datetime import datetime, timedelta
+from tempfile import TemporaryDirectory
+from time import sleep
+
+from botocore.exceptions import ClientError
+from dateutil.tz.tz import tzutc
+
+from cloudlift.config import aws_clients
 from cloudlift.deployment import ECR
+from cloudlift.deployment.docker_login_cache import DockerLoginCache
+from cloudlift.deployment.ecr import ImageUpload, TAG_ADDED, TAG_EXISTS, TAG_FAILED
+from cloudlift.deployment.image_promotion import DOCKER_MANIFEST_LIST_MEDIA_TYPE, MANIFEST_MEDIA_TYPES
+from cloudlift.exceptions import UnrecoverableException
 from unittest import TestCase
 import boto3
 import json
@@ -11,6 +25,12 @@ class TestECR(TestCase):
         patcher = patch.object(boto3.session.Session, 'client')
         self.addCleanup(patcher.stop)
         patcher.start()
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        login_cache_patcher = patch('cloudlift.deployment.docker_login_cache.DOCKER_LOGIN_CACHE_PATH',
+                                    os.path.join(directory.name, 'docker_logins.json'))
+        self.addCleanup(login_cache_patcher.stop)
+        login_cache_patcher.start()
 
     def test_build_command_without_build_args(self):
         ecr = ECR("aws-region", "test-repo", "12345", None, None)
@@ -36,6 +56,235 @@ class TestECR(TestCase):
         ecr = ECR("aws-region", "test-repo", "12345", version="v1", cache_from=['image1', 'image2'])
         assert 'docker build -t test:v1 --cache-from image1 --cache-from image2 .' == ecr._build_command("test:v1")
 
+    def test_build_command_with_registry_cache(self):
+        ecr = ECR("aws-region", "test-repo", "12345", version="v1", dockerfile='docker/Dockerfile.web',
+                  registry_cache=True)
+        cache_ref = '12345.dkr.ecr.aws-region.amazonaws.com/test-repo:cloudlift-build-cache-docker-Dockerfile.web'
+
+        assert ecr._build_command("test:v1") == \
+            'docker buildx build --builder cloudlift --load -f docker/Dockerfile.web -t test:v1 ' \
+            f'--cache-from type=registry,ref={cache_ref} ' \
+            f'--cache-to type=registry,ref={cache_ref},mode=max,image-manifest=true,oci-mediatypes=true,' \
+            'ignore-error=true .'
+
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    @patch("cloudlift.deployment.ecr.subprocess")
+    @patch.dict(os.environ, {"PATH": "/usr/bin"}, clear=True)
+    def test_build_with_registry_cache_creates_builder_and_logs_in(self, mock_subprocess, mock_create_ecr_client):
+        mock_create_ecr_client.return_value.get_authorization_token.return_value = {
+            'authorizationData': [
+                {'authorizationToken': 'dXNlcjp0b2tlbgo=', 'proxyEndpoint': 'http://proxy'}
+            ]
+        }
+        mock_subprocess.run.return_value.returncode = 1
+        mock_subprocess.Popen.return_value.stderr = [b'#1 DONE\n']
+        mock_subprocess.Popen.return_value.wait.return_value = 0
+
+        ecr = ECR("aws-region", "test-repo", "12345", version="v1", registry_cache=True)
+        ecr._build_image()
+
+        mock_subprocess.check_call.assert_has_calls([
+            call(['docker', 'login', '-u', 'user', '-p', 'token\n', 'http://proxy']),
+            call(['docker', 'buildx', 'create', '--name', 'cloudlift', '--driver', 'docker-container']),
+        ])
+        mock_subprocess.Popen.assert_called_once_with(ecr._build_command('test-repo:v1'),
+                                                      env={'DOCKER_BUILDKIT': '1', 'PATH': '/usr/bin'}, shell=True,
+                                                      stderr=mock_subprocess.PIPE)
+
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    @patch("cloudlift.deployment.ecr.subprocess")
+    def test_build_for_platforms_logs_in_again_on_auth_error(self, mock_subprocess, mock_create_ecr_client):
+        mock_ecr_client = mock_create_ecr_client.return_value
+        mock_ecr_client.get_authorization_token.return_value = {
+            'authorizationData': [
+                {'authorizationToken': 'dXNlcjp0b2tlbgo=', 'proxyEndpoint': 'http://proxy',
+                 'expiresAt': datetime.now(tzutc()) + timedelta(hours=12)}
+            ]
+        }
+        failed_build, build = MagicMock(stderr=[b'ERROR: failed to push: 401 Unauthorized\n']), MagicMock(stderr=[])
+        failed_build.wait.return_value = 1
+        build.wait.return_value = 0
+        mock_subprocess.Popen.side_effect = [failed_build, build]
+        ecr = ECR("aws-region", "test-repo", "12345", version="v1", platforms=['linux/amd64,linux/arm64'])
+        ecr._login_to_ecr()
+
+        ecr._build_image()
+
+        self.assertEqual(2, mock_ecr_client.get_authorization_token.call_count)
+        self.assertEqual(2, mock_subprocess.Popen.call_count)
+
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    @patch("cloudlift.deployment.ecr.subprocess")
+    def test_build_for_platforms_fails_without_login_retry_on_other_errors(self, mock_subprocess,
+                                                                           mock_create_ecr_client):
+        mock_create_ecr_client.return_value.get_authorization_token.return_value = {
+            'authorizationData': [
+                {'authorizationToken': 'dXNlcjp0b2tlbgo=', 'proxyEndpoint': 'http://proxy'}
+            ]
+        }
+        mock_subprocess.Popen.return_value.stderr = [b'ERROR: failed to solve: process did not complete\n']
+        mock_subprocess.Popen.return_value.wait.return_value = 1
+
+        with self.assertRaises(UnrecoverableException) as error:
+            ECR("aws-region", "test-repo", "12345", version="v1", platforms=['linux/amd64'])._build_image()
+
+        self.assertEqual('docker build exited with status: 1', error.exception.value)
+        mock_create_ecr_client.return_value.get_authorization_token.assert_called_once()
+        mock_subprocess.Popen.assert_called_once()
+
+    def test_build_command_for_multiple_platforms(self):
+        ecr = ECR("aws-region", "test-repo", "12345", version="v1", platforms=['linux/amd64,linux/arm64'])
+
+        self.assertEqual(['linux/amd64', 'linux/arm64'], ecr.platforms)
+        assert ecr._build_command(ecr.image_uri) == \
+            'docker buildx build --builder cloudlift --platform linux/amd64,linux/arm64 --push ' \
+            '-t 12345.dkr.ecr.aws-region.amazonaws.com/test-repo:v1 .'
+
+    @patch("cloudlift.deployment.ecr.subprocess")
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    def test_ensure_image_in_ecr_keeps_manifest_list_covering_platforms(self, mock_create_ecr_client,
+                                                                        mock_subprocess):
+        mock_ecr_client = mock_create_ecr_client.return_value
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images({'v1': 'sha256:01'})
+        mock_ecr_client.batch_get_image.return_value = {'images': [{
+            'imageManifest': _manifest_list('amd64', 'arm64'),
+            'imageManifestMediaType': DOCKER_MANIFEST_LIST_MEDIA_TYPE,
+        }]}
+        mock_subprocess.check_output.side_effect = _mock_git_calls
+        ecr = ECR("aws-region", "target-repo", "acc-id", platforms=['linux/amd64', 'linux/arm64'])
+        ecr._build_image = MagicMock()
+
+        ecr.ensure_image_in_ecr()
+
+        ecr._build_image.assert_not_called()
+        mock_ecr_client.batch_get_image.assert_called_once()
+        mock_ecr_client.put_image.assert_called_once_with(
+            repositoryName='target-repo', imageTag='v1-1602236172', imageManifest=_manifest_list('amd64', 'arm64'),
+            imageManifestMediaType=DOCKER_MANIFEST_LIST_MEDIA_TYPE,
+        )
+
+    @patch("cloudlift.deployment.ecr.subprocess")
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    def test_ensure_image_in_ecr_rebuilds_image_missing_platforms(self, mock_create_ecr_client, mock_subprocess):
+        mock_ecr_client = mock_create_ecr_client.return_value
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images({'v1': 'sha256:01'})
+        mock_ecr_client.batch_get_image.return_value = {'images': [{
+            'imageManifest': _manifest_list('amd64'),
+            'imageManifestMediaType': DOCKER_MANIFEST_LIST_MEDIA_TYPE,
+        }]}
+        mock_subprocess.check_output.side_effect = _mock_git_calls
+        ecr = ECR("aws-region", "target-repo", "acc-id", platforms=['linux/amd64', 'linux/arm64'])
+        ecr._build_image = MagicMock()
+        ecr._push_image = MagicMock()
+
+        ecr.ensure_image_in_ecr()
+
+        ecr._build_image.assert_called_once()
+        ecr._push_image.assert_not_called()
+
+    @patch("cloudlift.deployment.ecr.urlopen")
+    @patch("cloudlift.deployment.ecr.subprocess")
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    def test_ensure_image_in_ecr_reads_platform_of_single_image(self, mock_create_ecr_client, mock_subprocess,
+                                                                mock_urlopen):
+        mock_ecr_client = mock_create_ecr_client.return_value
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images({'v1': 'sha256:01'})
+        mock_ecr_client.batch_get_image.return_value = {'images': [{
+            'imageManifest': json.dumps({'schemaVersion': 2, 'config': {'digest': 'sha256:c0'}, 'layers': []}),
+            'imageManifestMediaType': 'application/vnd.docker.distribution.manifest.v2+json',
+        }]}
+        mock_ecr_client.get_download_url_for_layer.return_value = {'downloadUrl': 'https://layers/c0'}
+        mock_subprocess.check_output.side_effect = _mock_git_calls
+
+        for architecture, rebuilt in [('amd64', False), ('arm64', True)]:
+            mock_urlopen.return_value.__enter__.return_value = io.BytesIO(
+                json.dumps({'os': 'linux', 'architecture': architecture}).encode())
+            ecr = ECR("aws-region", "target-repo", "acc-id", platforms=['linux/amd64'])
+            ecr._build_image = MagicMock()
+
+            ecr.ensure_image_in_ecr()
+
+            self.assertEqual(rebuilt, ecr._build_image.called)
+        mock_ecr_client.get_download_url_for_layer.assert_called_with(repositoryName='target-repo',
+                                                                      layerDigest='sha256:c0')
+
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    @patch("cloudlift.deployment.ecr.subprocess")
+    def test_push_image_reuses_docker_login_until_expiry(self, mock_subprocess, mock_create_ecr_client):
+        mock_ecr_client = mock_create_ecr_client.return_value
+        mock_ecr_client.get_authorization_token.return_value = {
+            'authorizationData': [
+                {'authorizationToken': 'dXNlcjp0b2tlbgo=', 'proxyEndpoint': 'http://proxy',
+                 'expiresAt': datetime.now(tzutc()) + timedelta(hours=12)}
+            ]
+        }
+        mock_subprocess.run.return_value = subprocess.CompletedProcess([], 0, stderr=b'')
+
+        ECR("aws-region", "test-repo", "12345", version="v1")._push_image()
+        ECR("aws-region", "other-repo", "12345", version="v1")._push_image()
+
+        mock_ecr_client.get_authorization_token.assert_called_once()
+        self.assertEqual(2, mock_subprocess.run.call_count)
+
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    @patch("cloudlift.deployment.ecr.subprocess")
+    def test_push_image_logs_in_again_on_auth_error(self, mock_subprocess, mock_create_ecr_client):
+        mock_ecr_client = mock_create_ecr_client.return_value
+        mock_ecr_client.get_authorization_token.return_value = {
+            'authorizationData': [
+                {'authorizationToken': 'dXNlcjp0b2tlbgo=', 'proxyEndpoint': 'http://proxy',
+                 'expiresAt': datetime.now(tzutc()) + timedelta(hours=12)}
+            ]
+        }
+        mock_subprocess.run.side_effect = [
+            subprocess.CompletedProcess([], 1, stderr=b'denied: Your authorization token has expired.'),
+            subprocess.CompletedProcess([], 0, stderr=b''),
+        ]
+        ecr = ECR("aws-region", "test-repo", "12345", version="v1")
+        ecr._login_to_ecr()
+
+        ecr._push_image()
+
+        self.assertEqual(2, mock_ecr_client.get_authorization_token.call_count)
+        self.assertEqual(2, mock_subprocess.run.call_count)
+
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    @patch("cloudlift.deployment.ecr.subprocess")
+    def test_push_image_forgets_rejected_docker_login(self, mock_subprocess, mock_create_ecr_client):
+        mock_create_ecr_client.return_value.get_authorization_token.return_value = {
+            'authorizationData': [
+                {'authorizationToken': 'dXNlcjp0b2tlbgo=', 'proxyEndpoint': 'http://proxy',
+                 'expiresAt': datetime.now(tzutc()) + timedelta(hours=12)}
+            ]
+        }
+        mock_subprocess.run.return_value = subprocess.CompletedProcess(
+            [], 1, stderr=b'denied: Your authorization token has expired.')
+        ecr = ECR("aws-region", "test-repo", "12345", version="v1")
+        ecr._login_to_ecr()
+        mock_subprocess.check_call.side_effect = [None, subprocess.CalledProcessError(1, 'docker login')]
+        mock_subprocess.CalledProcessError = subprocess.CalledProcessError
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            ecr._push_image()
+
+        self.assertFalse(DockerLoginCache().is_logged_in(ecr.repo_path.split('/')[0]))
+
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    @patch("cloudlift.deployment.ecr.subprocess")
+    def test_push_image_fails_without_login_retry_on_other_errors(self, mock_subprocess, mock_create_ecr_client):
+        mock_create_ecr_client.return_value.get_authorization_token.return_value = {
+            'authorizationData': [
+                {'authorizationToken': 'dXNlcjp0b2tlbgo=', 'proxyEndpoint': 'http://proxy'}
+            ]
+        }
+        mock_subprocess.run.return_value = subprocess.CompletedProcess([], 1, stderr=b'connection reset by peer')
+
+        with self.assertRaises(UnrecoverableException) as error:
+            ECR("aws-region", "test-repo", "12345", version="v1")._push_image()
+
+        self.assertEqual('docker push exited with status: 1', error.exception.value)
+        mock_create_ecr_client.return_value.get_authorization_token.assert_called_once()
+
     def test_should_enable_buildkit(self):
         self.assertTrue(
             ECR("aws-region", "test-repo", "12345",
@@ -59,16 +308,17 @@ class TestECR(TestCase):
                                                                                    'PATH': '/usr/bin'}, shell=True,
         )
 
-    @patch("boto3.session.Session")
-    @patch("boto3.client")
-    def test_if_ecr_assumes_given_role_arn(self, mock_boto_client, mock_session):
+    @patch("cloudlift.config.aws_clients.Session")
+    def test_if_ecr_assumes_given_role_arn(self, mock_session):
+        aws_clients.clear_clients()
+        self.addCleanup(aws_clients.clear_clients)
         assume_role_arn = 'test-assume-role-arn'
         mock_sts_client = MagicMock()
-        mock_boto_client.return_value = mock_sts_client
+        mock_session.return_value.client.return_value = mock_sts_client
         mock_sts_client.assume_role.return_value = {
             'Credentials': {
                 'AccessKeyId': 'mockAccessKeyId', 'SecretAccessKey': 'mockSecretAccessKey',
-                'SessionToken': 'mockSessionToken'
+                'SessionToken': 'mockSessionToken', 'Expiration': datetime.now(tzutc()) + timedelta(hours=1),
             }
         }
 
@@ -79,6 +329,7 @@ class TestECR(TestCase):
             aws_access_key_id='mockAccessKeyId',
             aws_secret_access_key='mockSecretAccessKey',
             aws_session_token='mockSessionToken',
+            region_name='aws-region',
         )
 
     @patch("cloudlift.deployment.ecr.get_account_id")
@@ -146,22 +397,13 @@ class TestECR(TestCase):
     def test_ensure_image_in_ecr_for_explicit_version(self, mock_create_ecr_client, mock_subprocess):
         mock_ecr_client = MagicMock()
         mock_create_ecr_client.return_value = mock_ecr_client
-        mock_ecr_client.batch_get_image.return_value = {'images': 'image-01'}
-
-        def mock_check_output(cmd):
-            if " ".join(cmd) == "git rev-list -n 1 HEAD":
-                mock = MagicMock()
-                mock.strip.return_value.decode.return_value = Exception('mocked error')
-                return mock
-
-            if " ".join(cmd) == 'git show -s --format="%ct" HEAD':
-                mock = MagicMock()
-                mock.strip.return_value.decode.return_value = '"1602236172"'
-                return mock
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images({'v1': 'sha256:01'})
+        mock_ecr_client.batch_get_image.return_value = {'images': [{'imageManifest': 'manifest-01'}]}
 
-            mock = MagicMock()
-            mock.decode.return_value = None
-            return mock
+        def mock_check_output(cmd, **kwargs):
+            if cmd[:2] == ["git", "status"]:
+                raise AssertionError("repository status is not needed for an explicit version")
+            return _mock_git_calls(cmd, commit_sha="0123abc")
 
         mock_subprocess.check_output.side_effect = mock_check_output
 
@@ -169,10 +411,33 @@ class TestECR(TestCase):
 
         ecr.ensure_image_in_ecr()
 
-        mock_ecr_client.batch_get_image.assert_called_with(
-            imageIds=[{'imageTag': 'v1'}], repositoryName='target-repo',
+        mock_ecr_client.describe_images.assert_any_call(
+            imageIds=[{'imageTag': 'v1'}, {'imageTag': 'v1-1602236172'}], repositoryName='target-repo',
+        )
+        mock_ecr_client.batch_get_image.assert_called_once_with(
+            imageIds=[{'imageDigest': 'sha256:01'}], repositoryName='target-repo',
+            acceptedMediaTypes=MANIFEST_MEDIA_TYPES,
+        )
+        mock_ecr_client.put_image.assert_called_once_with(
+            imageManifest='manifest-01', imageTag='v1-1602236172', repositoryName='target-repo',
         )
 
+    @patch("cloudlift.deployment.ecr.subprocess")
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    def test_ensure_image_in_ecr_for_missing_explicit_version(self, mock_create_ecr_client, mock_subprocess):
+        mock_ecr_client = MagicMock()
+        mock_create_ecr_client.return_value = mock_ecr_client
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images({})
+        mock_subprocess.check_output.side_effect = _mock_git_calls
+
+        ecr = ECR("aws-region", "target-repo", "acc-id", version="v1")
+
+        with self.assertRaises(UnrecoverableException) as error:
+            ecr.ensure_image_in_ecr()
+
+        self.assertEqual("Image for given version could not be found.", error.exception.value)
+        mock_ecr_client.put_image.assert_not_called()
+
     @patch("cloudlift.deployment.ecr.log_intent")
     @patch("cloudlift.deployment.ecr.subprocess")
     @patch("cloudlift.deployment.ecr._create_ecr_client")
@@ -180,6 +445,7 @@ class TestECR(TestCase):
                                                                        mock_subprocess, mock_log_intent):
         mock_ecr_client = MagicMock()
         mock_create_ecr_client.return_value = mock_ecr_client
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images({'v1': 'sha256:01'})
         mock_ecr_client.batch_get_image.return_value = {'images': [{'imageManifest': 'manifest-01'}]}
 
         mock_subprocess.check_output.side_effect = _mock_git_calls
@@ -189,10 +455,30 @@ class TestECR(TestCase):
         ecr.ensure_image_in_ecr()
 
         mock_log_intent.assert_has_calls([call('Image found in ECR')])
-        mock_ecr_client.put_image.assert_has_calls([
-            call(imageManifest='manifest-01', imageTag='v1', repositoryName='target-repo'),
-            call(imageManifest='manifest-01', imageTag='v1-1602236172', repositoryName='target-repo'),
-        ])
+        mock_ecr_client.put_image.assert_called_once_with(
+            imageManifest='manifest-01', imageTag='v1-1602236172', repositoryName='target-repo',
+        )
+
+    @patch("cloudlift.deployment.ecr.log_intent")
+    @patch("cloudlift.deployment.ecr.subprocess")
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    def test_ensure_image_in_ecr_skips_put_image_when_tags_point_at_image(self, mock_create_ecr_client,
+                                                                          mock_subprocess, mock_log_intent):
+        mock_ecr_client = MagicMock()
+        mock_create_ecr_client.return_value = mock_ecr_client
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images(
+            {'v1': 'sha256:01', 'v1-1602236172': 'sha256:01'})
+
+        mock_subprocess.check_output.side_effect = _mock_git_calls
+
+        ecr = ECR("aws-region", "target-repo", "acc-id")
+
+        ecr.ensure_image_in_ecr()
+
+        mock_ecr_client.describe_images.assert_called_once()
+        mock_ecr_client.batch_get_image.assert_not_called()
+        mock_ecr_client.put_image.assert_not_called()
+        mock_log_intent.assert_any_call('Tag v1-1602236172 already points at the image')
 
     @patch("cloudlift.deployment.ecr.subprocess")
     @patch("cloudlift.deployment.ecr._create_ecr_client")
@@ -201,11 +487,9 @@ class TestECR(TestCase):
                                                                            mock_subprocess):
         mock_ecr_client = MagicMock()
         mock_create_ecr_client.return_value = mock_ecr_client
-        mock_ecr_client.batch_get_image.side_effect = [
-            {'images': []},
-            {'images': [{'imageManifest': 'manifest-01'}]},
-            {'images': [{'imageManifest': 'manifest-01'}]},
-        ]
+        images = {}
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images(images)
+        mock_ecr_client.batch_get_image.return_value = {'images': [{'imageManifest': 'manifest-01'}]}
 
         mock_ecr_client.get_authorization_token.return_value = {
             'authorizationData': [
@@ -214,6 +498,7 @@ class TestECR(TestCase):
         }
 
         mock_subprocess.check_output.side_effect = _mock_git_calls
+        mock_subprocess.run.side_effect = _mock_docker_push(images, 'sha256:01')
 
         ecr = ECR("aws-region", "target-repo", "acc-id")
 
@@ -224,11 +509,8 @@ class TestECR(TestCase):
             call(['docker', 'tag', 'target-repo:v1',
                   'acc-id.dkr.ecr.aws-region.amazonaws.com/target-repo:v1']),
         ])
-        mock_ecr_client.put_image.assert_has_calls([
-            call(imageManifest='manifest-01', imageTag='v1', repositoryName='target-repo'),
-            call(imageManifest='manifest-01', imageTag='v1-1602236172', repositoryName='target-repo'),
-        ]
-
+        mock_ecr_client.put_image.assert_called_once_with(
+            imageManifest='manifest-01', imageTag='v1-1602236172', repositoryName='target-repo',
         )
 
     @patch("cloudlift.deployment.ecr.subprocess")
@@ -239,10 +521,9 @@ class TestECR(TestCase):
                                                                                     mock_subprocess):
         mock_ecr_client = MagicMock()
         mock_create_ecr_client.return_value = mock_ecr_client
-        mock_ecr_client.batch_get_image.side_effect = [
-            {'images': []},
-            {'images': [{'imageManifest': 'manifest-01'}]},
-        ]
+        images = {}
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images(images)
+        mock_ecr_client.batch_get_image.return_value = {'images': [{'imageManifest': 'manifest-01'}]}
 
         mock_ecr_client.get_authorization_token.return_value = {
             'authorizationData': [
@@ -251,6 +532,7 @@ class TestECR(TestCase):
         }
 
         mock_subprocess.check_output.side_effect = _mock_git_calls
+        mock_subprocess.run.side_effect = _mock_docker_push(images, 'sha256:01')
 
         ecr = ECR("aws-region", "target-repo", "acc-id", dockerfile='CustomDockerFile')
 
@@ -263,21 +545,288 @@ class TestECR(TestCase):
 
         self.assertEqual('acc-id.dkr.ecr.aws-region.amazonaws.com/target-repo:v1-CustomDockerFile', ecr.image_uri)
         mock_ecr_client.put_image.assert_called_with(
-            imageManifest='manifest-01', imageTag='v1-CustomDockerFile', repositoryName='target-repo',
+            imageManifest='manifest-01', imageTag='v1-CustomDockerFile-1602236172', repositoryName='target-repo',
+        )
+
+    @patch("cloudlift.deployment.ecr.build_context_hash")
+    @patch("cloudlift.deployment.ecr.subprocess")
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    def test_ensure_image_in_ecr_reuses_image_with_same_build_context(self, mock_create_ecr_client,
+                                                                      mock_subprocess, mock_build_context_hash):
+        mock_ecr_client = MagicMock()
+        mock_create_ecr_client.return_value = mock_ecr_client
+        mock_build_context_hash.return_value = 'abc123'
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images({'context-abc123': 'sha256:01'})
+        mock_ecr_client.batch_get_image.return_value = {'images': [{'imageManifest': 'manifest-01'}]}
+        mock_subprocess.check_output.side_effect = _mock_git_calls
+
+        ecr = ECR("aws-region", "target-repo", "acc-id", build_args={'A': '1'}, working_dir='app',
+                  content_version=True)
+
+        ecr.ensure_image_in_ecr()
+
+        mock_build_context_hash.assert_called_once_with('app', os.path.join('app', 'Dockerfile'), {'A': '1'}, [])
+        mock_subprocess.check_call.assert_not_called()
+        self.assertEqual('v1', ecr.version)
+        mock_ecr_client.put_image.assert_has_calls([
+            call(imageManifest='manifest-01', imageTag='v1', repositoryName='target-repo'),
+            call(imageManifest='manifest-01', imageTag='v1-1602236172', repositoryName='target-repo'),
+        ])
+        mock_ecr_client.batch_get_image.assert_called_once()
+
+    @patch("cloudlift.deployment.ecr.build_context_hash")
+    @patch("cloudlift.deployment.ecr.subprocess")
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    @patch.dict(os.environ, {'ENV': 'test'}, clear=True)
+    def test_ensure_image_in_ecr_tags_built_image_with_build_context(self, mock_create_ecr_client,
+                                                                     mock_subprocess, mock_build_context_hash):
+        mock_ecr_client = MagicMock()
+        mock_create_ecr_client.return_value = mock_ecr_client
+        mock_build_context_hash.return_value = 'abc123'
+        images = {}
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images(images)
+        mock_ecr_client.batch_get_image.return_value = {'images': [{'imageManifest': 'manifest-01'}]}
+        mock_ecr_client.get_authorization_token.return_value = {
+            'authorizationData': [
+                {'authorizationToken': 'dXNlcjp0b2tlbgo=', 'proxyEndpoint': 'http://proxy'}
+            ]
+        }
+        mock_subprocess.check_output.side_effect = _mock_git_calls
+        mock_subprocess.run.side_effect = _mock_docker_push(images, 'sha256:01')
+
+        ecr = ECR("aws-region", "target-repo", "acc-id", content_version=True)
+
+        ecr.ensure_image_in_ecr()
+
+        mock_ecr_client.put_image.assert_has_calls([
+            call(imageManifest='manifest-01', imageTag='v1-1602236172', repositoryName='target-repo'),
+            call(imageManifest='manifest-01', imageTag='context-abc123', repositoryName='target-repo'),
+        ], any_order=True)
+
+    @patch("cloudlift.deployment.ecr.subprocess")
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    def test_repository_state_is_scoped_to_build_context_and_read_once(self, mock_create_ecr_client,
+                                                                       mock_subprocess):
+        mock_subprocess.check_output.side_effect = \
+            lambda cmd, **kwargs: _mock_git_calls(cmd, status=b' M services/web/app.py\n')
+        ecr = ECR("aws-region", "target-repo", "acc-id", dockerfile='docker/Dockerfile.web',
+                  working_dir='services/web')
+
+        self.assertTrue(ecr._is_build_context_dirty())
+        self.assertEqual('v1-docker/Dockerfile.web', ecr._derive_version())
+        self.assertEqual('1602236172', ecr._git_epoch_time())
+
+        mock_subprocess.check_output.assert_has_calls([
+            call(["git", "status", "--porcelain", "--no-renames", "--", "services/web", "docker/Dockerfile.web"]),
+            call(["git", "show", "-s", "--format=%H %ct", "HEAD"], cwd='services/web'),
+        ])
+        self.assertEqual(2, mock_subprocess.check_output.call_count)
+
+    @patch("cloudlift.deployment.ecr.subprocess")
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    def test_ensure_image_in_ecr_marks_version_dirty_for_build_context_changes(self, mock_create_ecr_client,
+                                                                             mock_subprocess):
+        mock_ecr_client = mock_create_ecr_client.return_value
+        mock_subprocess.check_output.side_effect = lambda cmd, **kwargs: _mock_git_calls(cmd, status=b'?? new_file.py\n')
+        ecr = ECR("aws-region", "target-repo", "acc-id")
+        ecr._build_image = MagicMock()
+        ecr._push_image = MagicMock()
+
+        ecr.ensure_image_in_ecr()
+
+        self.assertEqual('v1-dirty', ecr.version)
+        ecr._build_image.assert_called_once()
+
+    @patch("cloudlift.deployment.ecr.copy_image")
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    def test_promote_from_copies_image_through_registry(self, mock_create_ecr_client, mock_copy_image):
+        source_client, target_client = MagicMock(), MagicMock()
+        mock_create_ecr_client.side_effect = [source_client, target_client]
+        source_client.describe_images.side_effect = _mock_describe_images({'v1': 'sha256:01'})
+        target_client.describe_images.side_effect = _mock_describe_images({'v1': 'sha256:00'})
+        source = ECR("us-west-2", "source-repo", "111", version="v1")
+        target = ECR("us-east-1", "target-repo", "222")
+
+        target.promote_from(source)
+
+        self.assertEqual('v1', target.version)
+        mock_copy_image.assert_called_once_with(source, target, 'v1', 'v1')
+
+    @patch("cloudlift.deployment.ecr.copy_image")
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    def test_promote_from_skips_image_already_in_target(self, mock_create_ecr_client, mock_copy_image):
+        mock_create_ecr_client.return_value.describe_images.side_effect = _mock_describe_images({'v1': 'sha256:01'})
+        source = ECR("us-west-2", "source-repo", "111", version="v1")
+        target = ECR("us-east-1", "target-repo", "222", version="v1")
+
+        target.promote_from(source)
+
+        mock_copy_image.assert_not_called()
+
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    def test_add_tags_fetches_manifest_once(self, mock_create_ecr_client):
+        mock_ecr_client = MagicMock()
+        mock_create_ecr_client.return_value = mock_ecr_client
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images({'v1': 'sha256:01'})
+        mock_ecr_client.batch_get_image.return_value = {'images': [{'imageManifest': 'manifest-01'}]}
+
+        ecr = ECR("aws-region", "target-repo", "acc-id", version="v1")
+        results = ecr.add_tags(['release', 'latest'])
+
+        self.assertEqual({'release': {'status': TAG_ADDED}, 'latest': {'status': TAG_ADDED}}, results)
+        mock_ecr_client.batch_get_image.assert_called_once_with(
+            imageIds=[{'imageDigest': 'sha256:01'}], repositoryName='target-repo',
+            acceptedMediaTypes=MANIFEST_MEDIA_TYPES,
         )
+        mock_ecr_client.put_image.assert_has_calls([
+            call(imageManifest='manifest-01', imageTag='release', repositoryName='target-repo'),
+            call(imageManifest='manifest-01', imageTag='latest', repositoryName='target-repo'),
+        ], any_order=True)
+
+    @patch("cloudlift.deployment.ecr.log_err")
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    def test_add_tags_reports_result_per_tag(self, mock_create_ecr_client, mock_log_err):
+        mock_ecr_client = MagicMock()
+        mock_create_ecr_client.return_value = mock_ecr_client
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images({'v1': 'sha256:01', 'stable': 'sha256:01'})
+        mock_ecr_client.batch_get_image.return_value = {'images': [{'imageManifest': 'manifest-01'}]}
+
+        def put_image(repositoryName, imageTag, imageManifest):
+            if imageTag == 'latest':
+                raise ClientError({'Error': {'Code': 'ImageAlreadyExistsException', 'Message': 'exists'}}, 'PutImage')
+            if imageTag == 'prod':
+                raise ClientError({'Error': {'Code': 'ImageTagAlreadyExistsException',
+                                             'Message': 'tag is immutable'}}, 'PutImage')
+
+        mock_ecr_client.put_image.side_effect = put_image
+
+        ecr = ECR("aws-region", "target-repo", "acc-id", version="v1")
+        results = ecr.add_tags(['stable', 'latest', 'prod', 'release'])
+
+        self.assertEqual({
+            'stable': {'status': TAG_EXISTS},
+            'latest': {'status': TAG_EXISTS},
+            'prod': {'status': TAG_FAILED, 'error': 'tag is immutable'},
+            'release': {'status': TAG_ADDED},
+        }, results)
+        self.assertEqual(3, mock_ecr_client.put_image.call_count)
+        mock_log_err.assert_called_once_with('Unable to add additional tag prod: tag is immutable')
+
+    @patch("cloudlift.deployment.ecr._create_ecr_client")
+    def test_add_tags_when_image_is_missing(self, mock_create_ecr_client):
+        mock_ecr_client = MagicMock()
+        mock_create_ecr_client.return_value = mock_ecr_client
+        mock_ecr_client.describe_images.side_effect = _mock_describe_images({})
+
+        ecr = ECR("aws-region", "target-repo", "acc-id", version="v1")
+        results = ecr.add_tags(['release'])
+
+        self.assertEqual({'release': {'status': TAG_FAILED, 'error': 'Image v1 not found'}}, results)
+        mock_ecr_client.put_image.assert_not_called()
+
+
+def _mock_describe_images(images):
+    def describe_images(repositoryName, imageIds):
+        tags = [image_id['imageTag'] for image_id in imageIds]
+        if any(tag not in images for tag in tags):
+            raise ClientError({'Error': {'Code': 'ImageNotFoundException', 'Message': 'not found'}}, 'DescribeImages')
+        digests = {images[tag] for tag in tags}
+        return {'imageDetails': [
+            {'imageDigest': digest, 'imageTags': [tag for tag, d in images.items() if d == digest]}
+            for digest in digests
+        ]}
+
+    return describe_images
+
+
+def _manifest_list(*architectures):
+    return json.dumps({
+        'schemaVersion': 2,
+        'mediaType': DOCKER_MANIFEST_LIST_MEDIA_TYPE,
+        'manifests': [
+            {'digest': 'sha256:' + architecture,
+             'platform': {'os': 'linux', 'architecture': architecture,
+                          'variant': 'v8' if architecture == 'arm64' else None}}
+            for architecture in architectures
+        ],
+    })
+
+
+def _mock_docker_push(images, digest):
+    def run(cmd, **kwargs):
+        if cmd[:2] == ['docker', 'push']:
+            images[cmd[2].split(':')[-1]] = digest
+        return subprocess.CompletedProcess(cmd, 0, stderr=b'')
+
+    return run
+
+
+def _mock_git_calls(cmd, commit_sha=None, epoch=None, status=b'', cwd=None):
+    if cmd == ["git", "show", "-s", "--format=%H %ct", "HEAD"]:
+        return "{} {}\n".format(commit_sha or "v1", epoch or "1602236172").encode()
+
+    if cmd[:2] == ["git", "status"]:
+        return status
+
+    raise AssertionError("unexpected command: {}".format(cmd))
+
+
+class _StubECR(object):
+    def __init__(self, error=None):
+        self.error = error
+        self.image_uri = 'acc-id.dkr.ecr.aws-region.amazonaws.com/target-repo:v1'
+
+    def upload_artefacts(self):
+        if self.error:
+            raise UnrecoverableException(self.error)
+
+
+class _CrashingECR(object):
+    def upload_artefacts(self):
+        os._exit(1)
+
+
+class _HangingECR(object):
+    def upload_artefacts(self):
+        sleep(60)
+
+
+class TestImageUpload(TestCase):
+    def test_wait_for_image_uri(self):
+        image_upload = ImageUpload(_StubECR())
+        image_upload.start()
+        self.addCleanup(image_upload.join)
+
+        self.assertEqual('acc-id.dkr.ecr.aws-region.amazonaws.com/target-repo:v1', image_upload.wait_for_image_uri())
+
+    def test_wait_for_image_uri_when_upload_fails(self):
+        image_upload = ImageUpload(_StubECR(error='docker build exited with status: 1'))
+        image_upload.start()
+        self.addCleanup(image_upload.join)
+
+        with self.assertRaises(UnrecoverableException) as error:
+            image_upload.wait_for_image_uri()
+
+        self.assertEqual('Image upload failed: docker build exited with status: 1', error.exception.value)
+
+    @patch('cloudlift.deployment.ecr.IMAGE_UPLOAD_POLL_SECONDS', 0.01)
+    def test_wait_for_image_uri_when_upload_process_dies(self):
+        image_upload = ImageUpload(_CrashingECR())
+        image_upload.start()
+        self.addCleanup(image_upload.join)
+
+        with self.assertRaises(UnrecoverableException) as error:
+            image_upload.wait_for_image_uri()
 
+        self.assertEqual('Image upload exited with no result', error.exception.value)
 
-def _mock_git_calls(cmd, rev_list=None, epoch=None):
-    if " ".join(cmd) == "git rev-list -n 1 HEAD":
-        mock = MagicMock()
-        mock.strip.return_value.decode.return_value = rev_list or "v1"
-        return mock
+    @patch('cloudlift.deployment.ecr.IMAGE_UPLOAD_POLL_SECONDS', 0.01)
+    def test_wait_for_image_uri_times_out(self):
+        image_upload = ImageUpload(_HangingECR(), timeout_seconds=0.1)
+        image_upload.start()
 
-    if " ".join(cmd) == 'git show -s --format="%ct" HEAD':
-        mock = MagicMock()
-        mock.strip.return_value.decode.return_value = epoch or '"1602236172"'
-        return mock
+        with self.assertRaises(UnrecoverableException) as error:
+            image_upload.wait_for_image_uri()
+        image_upload.join()
 
-    mock = MagicMock()
-    mock.decode.return_value = None
-    return mock
+        self.assertEqual('Image upload did not finish in 0.1 seconds', error.exception.value)
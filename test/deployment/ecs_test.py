@@ -1,8 +1,15 @@
+import os
+import subprocess
+import sys
 import unittest
+from time import sleep
+from cloudlift.config import DeploymentIdentifierIndex
+from cloudlift.config import dynamodb_config
 from cloudlift.deployment.ecs import EcsTaskDefinition, EcsAction, EcsClient
 from cloudlift.exceptions import UnrecoverableException
 
 from mock import MagicMock, patch, call
+from moto import mock_dynamodb2
 
 
 class TestEcsTaskDefinition(unittest.TestCase):
@@ -81,7 +88,50 @@ class TestEcsTaskDefinition(unittest.TestCase):
         self.assertEqual(diff.old_value, {"LABEL": 'arn:v1'})
 
 
+class TestEcsTaskDefinitionContentHash(unittest.TestCase):
+    def test_content_hash_ignores_order_of_environment_and_secrets(self):
+        environment = [{'name': 'PORT', 'value': '80'}, {'name': 'LABEL', 'value': 'L1'}]
+        secrets = [{'name': 'DB_URL', 'valueFrom': 'arn:v1'}, {'name': 'API_KEY', 'valueFrom': 'arn:v2'}]
+        td = _build_task_definition(_build_container_definition(environment=environment, secrets=secrets))
+        reordered_td = _build_task_definition(_build_container_definition(environment=environment[::-1],
+                                                                          secrets=secrets[::-1]))
+
+        self.assertEqual(td.content_hash, reordered_td.content_hash)
+
+    def test_content_hash_is_stable_across_hash_seeds(self):
+        script = '\n'.join([
+            'from cloudlift.deployment.ecs import EcsTaskDefinition',
+            "keys = {'PORT', 'LABEL', 'DB_HOST', 'DB_USER', 'REDIS_URL'}",
+            "environment = [{'name': key, 'value': key.lower()} for key in keys]",
+            "print(EcsTaskDefinition({'family': 'tdFamily', 'containerDefinitions': [",
+            "    {'name': 'DummyContainer', 'environment': environment}]}).content_hash)",
+        ])
+        hashes = set()
+        for seed in ['1', '2', '3', '4']:
+            hashes.add(subprocess.check_output([sys.executable, '-c', script],
+                                               env=dict(os.environ, PYTHONHASHSEED=seed)).strip())
+
+        self.assertEqual(1, len(hashes))
+
+
+class TestEcsClient(unittest.TestCase):
+    @patch("cloudlift.deployment.ecs.get_client")
+    def test_looks_up_shared_client_on_use(self, mock_get_client):
+        client = EcsClient(None, None, 'us-east-1')
+        mock_get_client.assert_not_called()
+
+        client.describe_tasks('cluster-1', ['task-1'])
+
+        mock_get_client.assert_called_once_with('ecs', 'us-east-1')
+        mock_get_client.return_value.describe_tasks.assert_called_once_with(cluster='cluster-1', tasks=['task-1'])
+
+
 class TestEcsAction(unittest.TestCase):
+    def setUp(self):
+        patcher = patch("cloudlift.deployment.ecs.DeploymentIdentifierIndex")
+        self.addCleanup(patcher.stop)
+        patcher.start().return_value.get_task_definition_arn.return_value = None
+
     def test_get_task_definition_by_deployment_identifier(self):
         cluster_name = "cluster-1"
         service_name = MagicMock()
@@ -89,7 +139,7 @@ class TestEcsAction(unittest.TestCase):
         client = MagicMock()
         client.list_task_definitions.return_value = (['arn1', 'arn2', 'arn3', 'arn4'], None)
 
-        def mock_describe_task_definition(task_definition_arn):
+        def mock_describe_task_definition(task_definition_arn, cached=True):
             if task_definition_arn == 'arn3':
                 return {'taskDefinition': {'taskDefinitionArn': task_definition_arn}, 'tags': [
                     {'key': 'deployment_identifier', 'value': 'id-0'},
@@ -108,13 +158,13 @@ class TestEcsAction(unittest.TestCase):
         self.assertEqual({'deployment_identifier': 'id-0'}, actual_td.tags)
         client.list_task_definitions.assert_called_with = 'prodServiceAFamily'
 
-    @patch("cloudlift.deployment.ecs.Session")
-    def test_get_task_definition_by_deployment_identifier_with_next_token(self, mock_session):
+    @patch("cloudlift.deployment.ecs.get_client")
+    def test_get_task_definition_by_deployment_identifier_with_next_token(self, mock_get_client):
         cluster_name = "cluster-1"
         service_name = MagicMock()
         service_name.task_definition.return_value.family.return_value = "prodServiceAFamily"
         mock_boto_client = MagicMock()
-        mock_session.return_value.client.return_value = mock_boto_client
+        mock_get_client.return_value = mock_boto_client
 
         client = EcsClient()
 
@@ -145,13 +195,13 @@ class TestEcsAction(unittest.TestCase):
             call(familyPrefix='tdFamily', status='ACTIVE', sort='DESC', nextToken='token1')
         ])
 
-    @patch("cloudlift.deployment.ecs.Session")
-    def test_get_task_definition_by_deployment_identifier_with_no_matches(self, mock_session):
+    @patch("cloudlift.deployment.ecs.get_client")
+    def test_get_task_definition_by_deployment_identifier_with_no_matches(self, mock_get_client):
         cluster_name = "cluster-1"
         service_name = MagicMock()
         service_name.task_definition.return_value.family.return_value = "stgServiceAFamily"
         mock_boto_client = MagicMock()
-        mock_session.return_value.client.return_value = mock_boto_client
+        mock_get_client.return_value = mock_boto_client
 
         client = EcsClient()
 
@@ -173,6 +223,183 @@ class TestEcsAction(unittest.TestCase):
 
         self.assertEqual("task definition does not exist for deployment_identifier: id-0", error.exception.value)
 
+    def test_get_task_definition_by_deployment_identifier_stops_describing_after_match(self):
+        service = MagicMock()
+        service.task_definition = 'arn0'
+        client = MagicMock()
+        client.list_task_definitions.return_value = (['arn%d' % index for index in range(100)], 'token1')
+
+        def mock_describe_task_definition(task_definition_arn, cached=True):
+            if task_definition_arn == 'arn1':
+                return {'taskDefinition': {'taskDefinitionArn': task_definition_arn, 'family': 'tdFamily'}, 'tags': [
+                    {'key': 'deployment_identifier', 'value': 'id-0'},
+                ]}
+            sleep(0.05)
+            return {'taskDefinition': {'taskDefinitionArn': task_definition_arn, 'family': 'tdFamily'}, 'tags': []}
+
+        client.describe_task_definition.side_effect = mock_describe_task_definition
+        action = EcsAction(client, "cluster-1", service)
+
+        actual_td = action.get_task_definition_by_deployment_identifier(service=service, deployment_identifier="id-0")
+
+        self.assertEqual('arn1', actual_td.arn)
+        self.assertLess(client.describe_task_definition.call_count, 50)
+        client.list_task_definitions_for_next_token.assert_called_once_with(family='tdFamily', next_token='token1')
+
+
+class TestEcsActionDeploymentIdentifierIndex(unittest.TestCase):
+    def setUp(self):
+        dynamodb_config._existing_tables.clear()
+
+    @mock_dynamodb2
+    def test_update_task_definition_indexes_deployment_identifier(self):
+        client = MagicMock()
+        client.register_task_definition.return_value = {'taskDefinition': {
+            'taskDefinitionArn': 'arn:task-definition/tdFamily:5', 'family': 'tdFamily'}}
+        action = EcsAction(client, "cluster-1", None)
+
+        action.update_task_definition(EcsTaskDefinition({'family': 'tdFamily'}), 'id-5')
+
+        self.assertEqual('arn:task-definition/tdFamily:5',
+                         DeploymentIdentifierIndex('tdFamily', 'id-5').get_task_definition_arn())
+
+    @mock_dynamodb2
+    def test_get_task_definition_by_deployment_identifier_from_index(self):
+        DeploymentIdentifierIndex('tdFamily', 'id-0').set_task_definition_arn('arn3')
+        service = MagicMock()
+        service.task_definition = 'arn5'
+        client = MagicMock()
+
+        def mock_describe_task_definition(task_definition_arn, cached=True):
+            tags = [{'key': 'deployment_identifier', 'value': 'id-0'}] if task_definition_arn == 'arn3' else []
+            return {'taskDefinition': {'taskDefinitionArn': task_definition_arn, 'family': 'tdFamily',
+                                       'status': 'ACTIVE'}, 'tags': tags}
+
+        client.describe_task_definition.side_effect = mock_describe_task_definition
+        action = EcsAction(client, "cluster-1", service)
+
+        actual_td = action.get_task_definition_by_deployment_identifier(service=service, deployment_identifier="id-0")
+
+        self.assertEqual('arn3', actual_td.arn)
+        client.list_task_definitions.assert_not_called()
+
+    @mock_dynamodb2
+    def test_get_task_definition_by_deployment_identifier_skips_inactive_indexed_revision(self):
+        DeploymentIdentifierIndex('tdFamily', 'id-0').set_task_definition_arn('arn3')
+        service = MagicMock()
+        service.task_definition = 'arn5'
+        client = MagicMock()
+        client.list_task_definitions.return_value = (['arn5', 'arn4'], None)
+
+        def mock_describe_task_definition(task_definition_arn, cached=True):
+            status = 'INACTIVE' if task_definition_arn == 'arn3' else 'ACTIVE'
+            tags = []
+            if task_definition_arn in ('arn3', 'arn4'):
+                tags = [{'key': 'deployment_identifier', 'value': 'id-0'}]
+            return {'taskDefinition': {'taskDefinitionArn': task_definition_arn, 'family': 'tdFamily',
+                                       'status': status}, 'tags': tags}
+
+        client.describe_task_definition.side_effect = mock_describe_task_definition
+        action = EcsAction(client, "cluster-1", service)
+
+        actual_td = action.get_task_definition_by_deployment_identifier(service=service, deployment_identifier="id-0")
+
+        self.assertEqual('arn4', actual_td.arn)
+        self.assertEqual('arn4', DeploymentIdentifierIndex('tdFamily', 'id-0').get_task_definition_arn())
+
+    @mock_dynamodb2
+    def test_get_task_definition_by_deployment_identifier_skips_indexed_revision_with_other_identifier(self):
+        DeploymentIdentifierIndex('tdFamily', 'id-0').set_task_definition_arn('arn3')
+        service = MagicMock()
+        service.task_definition = 'arn5'
+        client = MagicMock()
+        client.list_task_definitions.return_value = (['arn5', 'arn4', 'arn3'], None)
+
+        def mock_describe_task_definition(task_definition_arn, cached=True):
+            identifier = {'arn3': 'id-1', 'arn4': 'id-0'}.get(task_definition_arn, 'id-2')
+            return {'taskDefinition': {'taskDefinitionArn': task_definition_arn, 'family': 'tdFamily',
+                                       'status': 'ACTIVE'},
+                    'tags': [{'key': 'deployment_identifier', 'value': identifier}]}
+
+        client.describe_task_definition.side_effect = mock_describe_task_definition
+        action = EcsAction(client, "cluster-1", service)
+
+        actual_td = action.get_task_definition_by_deployment_identifier(service=service, deployment_identifier="id-0")
+
+        self.assertEqual('arn4', actual_td.arn)
+        self.assertEqual('arn4', DeploymentIdentifierIndex('tdFamily', 'id-0').get_task_definition_arn())
+
+    @mock_dynamodb2
+    def test_get_task_definition_by_deployment_identifier_describes_only_reusable_revisions_again(self):
+        service = MagicMock()
+        service.task_definition = 'arn5'
+        client = MagicMock()
+        client.list_task_definitions.return_value = (['arn5', 'arn4', 'arn3'], None)
+
+        def mock_describe_task_definition(task_definition_arn, cached=True):
+            tags = [{'key': 'deployment_identifier', 'value': 'id-' + task_definition_arn}]
+            if task_definition_arn == 'arn4':
+                tags.append({'key': 'task_definition_hash', 'value': 'hash4'})
+                if not cached:
+                    tags.append({'key': 'deployment_identifier:id-0', 'value': ''})
+            return {'taskDefinition': {'taskDefinitionArn': task_definition_arn, 'family': 'tdFamily'}, 'tags': tags}
+
+        client.describe_task_definition.side_effect = mock_describe_task_definition
+        action = EcsAction(client, "cluster-1", service)
+
+        actual_td = action.get_task_definition_by_deployment_identifier(service=service, deployment_identifier="id-0")
+
+        self.assertEqual('arn4', actual_td.arn)
+        uncached_calls = [c for c in client.describe_task_definition.call_args_list if c[1].get('cached') is False]
+        self.assertEqual([call(task_definition_arn='arn4', cached=False)], uncached_calls)
+
+    @mock_dynamodb2
+    def test_reuse_task_definition_tags_revision_with_deployment_identifier(self):
+        client = MagicMock()
+        action = EcsAction(client, "cluster-1", None)
+        task_definition = EcsTaskDefinition({'taskDefinitionArn': 'arn3', 'family': 'tdFamily',
+                                             'tags': [{'key': 'deployment_identifier', 'value': 'id-0'}]})
+
+        reused = action.reuse_task_definition(task_definition, 'id-1')
+
+        self.assertIs(task_definition, reused)
+        client.tag_resource.assert_called_once_with('arn3', [{'key': 'deployment_identifier:id-1', 'value': ''}])
+        client.describe_task_definition.assert_called_once_with(task_definition_arn='arn3', cached=False)
+        self.assertTrue(reused.has_deployment_identifier('id-0'))
+        self.assertTrue(reused.has_deployment_identifier('id-1'))
+        self.assertEqual('arn3', DeploymentIdentifierIndex('tdFamily', 'id-1').get_task_definition_arn())
+
+    @mock_dynamodb2
+    def test_reuse_task_definition_returns_none_when_revision_cannot_be_tagged(self):
+        client = MagicMock()
+        action = EcsAction(client, "cluster-1", None)
+        tags = [{'key': 'deployment_identifier:id-%d' % index, 'value': ''} for index in range(50)]
+        task_definition = EcsTaskDefinition({'taskDefinitionArn': 'arn3', 'family': 'tdFamily', 'tags': tags})
+
+        self.assertIsNone(action.reuse_task_definition(task_definition, 'id-50'))
+
+        client.tag_resource.assert_not_called()
+        self.assertIsNone(DeploymentIdentifierIndex('tdFamily', 'id-50').get_task_definition_arn())
+
+    @mock_dynamodb2
+    def test_get_task_definition_by_deployment_identifier_indexes_scanned_result(self):
+        service = MagicMock()
+        service.task_definition = 'arn5'
+        client = MagicMock()
+        client.list_task_definitions.return_value = (['arn5', 'arn4', 'arn3'], None)
+
+        def mock_describe_task_definition(task_definition_arn, cached=True):
+            tags = [{'key': 'deployment_identifier', 'value': 'id-0'}] if task_definition_arn == 'arn3' else []
+            return {'taskDefinition': {'taskDefinitionArn': task_definition_arn, 'family': 'tdFamily'}, 'tags': tags}
+
+        client.describe_task_definition.side_effect = mock_describe_task_definition
+        action = EcsAction(client, "cluster-1", service)
+
+        actual_td = action.get_task_definition_by_deployment_identifier(service=service, deployment_identifier="id-0")
+
+        self.assertEqual('arn3', actual_td.arn)
+        self.assertEqual('arn3', DeploymentIdentifierIndex('tdFamily', 'id-0').get_task_definition_arn())
+
 
 def _build_task_definition(container_defn):
     return EcsTaskDefinition({'taskDefinitionArn': 'arn:aws:ecs:us-west-2:408750594584:task-definition/DummyFamily:4',
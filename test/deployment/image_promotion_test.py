@@ -0,0 +1,130 @@
+import io
+import json
+from unittest import TestCase
+from unittest.mock import patch, MagicMock, call
+from urllib.error import URLError
+
+from botocore.exceptions import ClientError
+
+from cloudlift.deployment.image_promotion import copy_image, DOCKER_MANIFEST_MEDIA_TYPE, \
+    DOCKER_MANIFEST_LIST_MEDIA_TYPE, MANIFEST_MEDIA_TYPES
+from cloudlift.exceptions import UnrecoverableException
+
+MANIFEST = json.dumps({
+    'schemaVersion': 2,
+    'mediaType': DOCKER_MANIFEST_MEDIA_TYPE,
+    'config': {'digest': 'sha256:config'},
+    'layers': [{'digest': 'sha256:base'}, {'digest': 'sha256:app'}],
+})
+
+
+def _ecr(repo_name):
+    ecr = MagicMock()
+    ecr.repo_name = repo_name
+    return ecr
+
+
+class TestCopyImage(TestCase):
+    @patch('cloudlift.deployment.image_promotion.LAYER_COPY_CONCURRENCY', 1)
+    @patch('cloudlift.deployment.image_promotion.urlopen')
+    def test_copy_image_uploads_only_missing_layers(self, mock_urlopen):
+        source, destination = _ecr('source-repo'), _ecr('target-repo')
+        source.client.batch_get_image.return_value = {'images': [
+            {'imageManifest': MANIFEST, 'imageManifestMediaType': DOCKER_MANIFEST_MEDIA_TYPE},
+        ]}
+        destination.client.batch_check_layer_availability.return_value = {
+            'layers': [
+                {'layerDigest': 'sha256:config', 'layerAvailability': 'UNAVAILABLE'},
+                {'layerDigest': 'sha256:base', 'layerAvailability': 'AVAILABLE'},
+            ],
+            'failures': [{'layerDigest': 'sha256:app', 'failureCode': 'MissingLayerDigest'}],
+        }
+        source.client.get_download_url_for_layer.side_effect = \
+            lambda repositoryName, layerDigest: {'downloadUrl': 'https://blobs/' + layerDigest}
+        mock_urlopen.side_effect = lambda url, timeout: io.BytesIO(b'0123456789')
+        destination.client.initiate_layer_upload.return_value = {'uploadId': 'upload-1', 'partSize': 4}
+
+        copy_image(source, destination, 'v1', 'v1')
+
+        source.client.batch_get_image.assert_called_once_with(
+            repositoryName='source-repo', imageIds=[{'imageTag': 'v1'}], acceptedMediaTypes=MANIFEST_MEDIA_TYPES)
+        destination.client.batch_check_layer_availability.assert_called_once_with(
+            repositoryName='target-repo', layerDigests=['sha256:config', 'sha256:base', 'sha256:app'])
+        self.assertEqual(['https://blobs/sha256:app', 'https://blobs/sha256:config'],
+                         sorted(args[0] for args, _ in mock_urlopen.call_args_list))
+        destination.client.upload_layer_part.assert_has_calls([
+            call(repositoryName='target-repo', uploadId='upload-1', partFirstByte=0, partLastByte=3,
+                 layerPartBlob=b'0123'),
+            call(repositoryName='target-repo', uploadId='upload-1', partFirstByte=4, partLastByte=7,
+                 layerPartBlob=b'4567'),
+            call(repositoryName='target-repo', uploadId='upload-1', partFirstByte=8, partLastByte=9,
+                 layerPartBlob=b'89'),
+        ])
+        destination.client.complete_layer_upload.assert_has_calls([
+            call(repositoryName='target-repo', uploadId='upload-1', layerDigests=['sha256:config']),
+            call(repositoryName='target-repo', uploadId='upload-1', layerDigests=['sha256:app']),
+        ], any_order=True)
+        destination.client.put_image.assert_called_once_with(
+            repositoryName='target-repo', imageManifest=MANIFEST,
+            imageManifestMediaType=DOCKER_MANIFEST_MEDIA_TYPE, imageTag='v1')
+
+    def test_copy_image_copies_manifest_list_children_by_digest(self):
+        source, destination = _ecr('source-repo'), _ecr('target-repo')
+        manifest_list = json.dumps({
+            'schemaVersion': 2,
+            'mediaType': DOCKER_MANIFEST_LIST_MEDIA_TYPE,
+            'manifests': [{'digest': 'sha256:amd64'}, {'digest': 'sha256:arm64'}],
+        })
+
+        def batch_get_image(repositoryName, imageIds, acceptedMediaTypes):
+            if imageIds == [{'imageTag': 'v1'}]:
+                return {'images': [{'imageManifest': manifest_list,
+                                    'imageManifestMediaType': DOCKER_MANIFEST_LIST_MEDIA_TYPE}]}
+            return {'images': [{'imageId': imageIds[0], 'imageManifest': MANIFEST,
+                                'imageManifestMediaType': DOCKER_MANIFEST_MEDIA_TYPE}]}
+
+        source.client.batch_get_image.side_effect = batch_get_image
+        destination.client.batch_check_layer_availability.return_value = {'layers': [
+            {'layerDigest': digest, 'layerAvailability': 'AVAILABLE'}
+            for digest in ['sha256:config', 'sha256:base', 'sha256:app']
+        ], 'failures': []}
+
+        copy_image(source, destination, 'v1', 'v2')
+
+        destination.client.initiate_layer_upload.assert_not_called()
+        destination.client.put_image.assert_has_calls([
+            call(repositoryName='target-repo', imageManifest=MANIFEST,
+                 imageManifestMediaType=DOCKER_MANIFEST_MEDIA_TYPE, imageDigest='sha256:amd64'),
+            call(repositoryName='target-repo', imageManifest=MANIFEST,
+                 imageManifestMediaType=DOCKER_MANIFEST_MEDIA_TYPE, imageDigest='sha256:arm64'),
+            call(repositoryName='target-repo', imageManifest=manifest_list,
+                 imageManifestMediaType=DOCKER_MANIFEST_LIST_MEDIA_TYPE, imageTag='v2'),
+        ])
+
+    def test_copy_image_reports_registry_errors(self):
+        source, destination = _ecr('source-repo'), _ecr('target-repo')
+        source.client.batch_get_image.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDeniedException', 'Message': 'denied'}}, 'BatchGetImage')
+
+        with self.assertRaises(UnrecoverableException) as error:
+            copy_image(source, destination, 'v1', 'v1')
+
+        self.assertIn('Unable to copy source-repo:v1 to target-repo:v1', error.exception.value)
+        destination.client.put_image.assert_not_called()
+
+    @patch('cloudlift.deployment.image_promotion.urlopen')
+    def test_copy_image_reports_layer_download_errors(self, mock_urlopen):
+        source, destination = _ecr('source-repo'), _ecr('target-repo')
+        source.client.batch_get_image.return_value = {'images': [{
+            'imageId': {'imageDigest': 'sha256:image'}, 'imageManifest': MANIFEST,
+            'imageManifestMediaType': DOCKER_MANIFEST_MEDIA_TYPE}]}
+        destination.client.batch_check_layer_availability.return_value = {'layers': [], 'failures': [
+            {'layerDigest': 'sha256:app', 'failureCode': 'MissingLayerDigest'}]}
+        source.client.get_download_url_for_layer.return_value = {'downloadUrl': 'https://layers/app'}
+        mock_urlopen.side_effect = URLError('timed out')
+
+        with self.assertRaises(UnrecoverableException) as error:
+            copy_image(source, destination, 'v1', 'v1')
+
+        self.assertIn('Unable to copy source-repo:v1 to target-repo:v1', error.exception.value)
+        destination.client.put_image.assert_not_called()
@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from cloudlift.deployment.multi_service_updater import MultiServiceUpdater, read_manifest
+from cloudlift.exceptions import UnrecoverableException
+
+
+def _manifest_entry(name, environment='staging'):
+    return {'name': name, 'environment': environment, 'version': 'v1', 'deployment_identifier': 'id-1'}
+
+
+class TestReadManifest(TestCase):
+    def _write_manifest(self, manifest):
+        f = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        self.addCleanup(os.remove, f.name)
+        with f:
+            json.dump(manifest, f)
+        return f.name
+
+    def test_read_manifest(self):
+        manifest = [_manifest_entry('app-a'), _manifest_entry('app-b')]
+
+        self.assertEqual(manifest, read_manifest(self._write_manifest(manifest)))
+
+    def test_read_manifest_rejects_incomplete_entries(self):
+        path = self._write_manifest([_manifest_entry('app-a'), {'name': 'app-b', 'environment': 'staging'}])
+
+        with self.assertRaises(UnrecoverableException) as context:
+            read_manifest(path)
+
+        self.assertEqual('Manifest entry 1 is missing version, deployment_identifier', context.exception.value)
+
+
+@patch('cloudlift.deployment.multi_service_updater.os.path.exists', MagicMock(return_value=True))
+@patch('cloudlift.deployment.multi_service_updater.EcsClient', MagicMock())
+@patch('cloudlift.deployment.multi_service_updater.ServiceStatusPoller')
+@patch('cloudlift.deployment.multi_service_updater.run_processes')
+@patch('cloudlift.deployment.multi_service_updater.ServiceUpdater')
+class TestMultiServiceUpdater(TestCase):
+    def _updaters(self, mock_service_updater, services_by_app):
+        updaters = {}
+
+        def create_updater(name, **kwargs):
+            updater = MagicMock(version=kwargs['version'], region='us-west-2' if name != 'app-c' else 'ap-south-1')
+            updater.create_jobs.return_value = [(service, MagicMock()) for service in services_by_app[name]]
+            updaters[name] = updater
+            return updater
+
+        mock_service_updater.side_effect = create_updater
+        return updaters
+
+    def test_run_deploys_all_services_under_one_concurrency_limit(self, mock_service_updater, mock_run_processes,
+                                                                 mock_poller):
+        updaters = self._updaters(mock_service_updater, {'app-a': ['a-web', 'a-worker'], 'app-b': ['b-web'], 'app-c': ['c-web']})
+        mock_run_processes.side_effect = lambda processes, concurrency: [0] * len(processes)
+
+        results = MultiServiceUpdater([_manifest_entry('app-a'), _manifest_entry('app-b'), _manifest_entry('app-c')],
+                                      deployment_concurrency=6).run()
+
+        self.assertEqual({'app-a/staging': [], 'app-b/staging': [], 'app-c/staging': []}, results)
+        mock_run_processes.assert_called_once()
+        processes, concurrency = mock_run_processes.call_args.args
+        self.assertEqual(4, len(processes))
+        self.assertEqual(6, concurrency)
+        self.assertEqual(2, mock_poller.call_count)
+        for updater in updaters.values():
+            updater.ecr.upload_artefacts.assert_called_once_with()
+            updater.deploy_kwargs.assert_called_once_with(ecr_image_uri=updater.ecr.image_uri)
+
+    @patch.object(MultiServiceUpdater, '_log_results')
+    def test_run_skips_apps_whose_image_check_fails(self, mock_log_results, mock_service_updater, mock_run_processes,
+                                                    mock_poller):
+        updaters = self._updaters(mock_service_updater, {'app-a': ['a-web'], 'app-b': ['b-web'], 'app-c': []})
+        updaters_created = mock_service_updater.side_effect
+
+        def create_updater(name, **kwargs):
+            updater = updaters_created(name, **kwargs)
+            if name == 'app-b':
+                updater.ecr.upload_artefacts.side_effect = UnrecoverableException('image not found')
+            return updater
+
+        mock_service_updater.side_effect = create_updater
+        mock_run_processes.side_effect = lambda processes, concurrency: [0] * len(processes)
+
+        with self.assertRaises(UnrecoverableException):
+            MultiServiceUpdater([_manifest_entry('app-a'), _manifest_entry('app-b'), _manifest_entry('app-c')]).run()
+
+        mock_log_results.assert_called_once_with({
+            'app-a/staging': [],
+            'app-b/staging': ['image check failed: image not found'],
+            'app-c/staging': [],
+        })
+        updaters['app-b'].create_jobs.assert_not_called()
+        self.assertEqual(1, len(mock_run_processes.call_args.args[0]))
+
+    @patch.object(MultiServiceUpdater, '_log_results')
+    def test_run_aggregates_failures_per_app(self, mock_log_results, mock_service_updater, mock_run_processes,
+                                             mock_poller):
+        self._updaters(mock_service_updater, {'app-a': ['a-web', 'a-worker'], 'app-b': ['b-web'], 'app-c': []})
+        create_updater = mock_service_updater.side_effect
+
+        def create_updater_or_fail(name, **kwargs):
+            if name == 'app-c':
+                raise UnrecoverableException('error finding stack')
+            return create_updater(name, **kwargs)
+
+        mock_service_updater.side_effect = create_updater_or_fail
+        mock_run_processes.return_value = [0, 1, 0]
+
+        with self.assertRaises(UnrecoverableException):
+            MultiServiceUpdater([_manifest_entry('app-a'), _manifest_entry('app-b'), _manifest_entry('app-c')]).run()
+
+        mock_log_results.assert_called_once_with({
+            'app-a/staging': ['deploy of a-worker failed'],
+            'app-b/staging': [],
+            'app-c/staging': ['error finding stack'],
+        })
+        mock_poller.return_value.stop.assert_called_once()
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+from unittest import TestCase
+from unittest.mock import MagicMock, call
+
+from cloudlift.deployment.progress import EventWatermark, StackEventStream
+
+start_time = datetime(2020, 10, 1, 10, 0, 0)
+
+
+def _stack_event(index):
+    return {'EventId': f'event-{index}', 'Timestamp': start_time + timedelta(seconds=index),
+            'LogicalResourceId': 'Resource', 'ResourceStatus': 'CREATE_IN_PROGRESS'}
+
+
+class TestEventWatermark(TestCase):
+    def test_take_new_returns_events_after_watermark_oldest_first(self):
+        watermark = EventWatermark('id', 'createdAt')
+        watermark.mark([{'id': 'e1', 'createdAt': start_time}])
+
+        new_events = watermark.take_new([
+            {'id': 'e3', 'createdAt': start_time + timedelta(seconds=2)},
+            {'id': 'e2', 'createdAt': start_time + timedelta(seconds=1)},
+            {'id': 'e1', 'createdAt': start_time},
+        ])
+
+        self.assertEqual(['e2', 'e3'], [event['id'] for event in new_events])
+        self.assertEqual([], watermark.take_new([{'id': 'e3', 'createdAt': start_time + timedelta(seconds=2)}]))
+
+    def test_take_new_stops_consuming_at_watermark(self):
+        watermark = EventWatermark('id', 'createdAt')
+        watermark.mark([{'id': 'e1', 'createdAt': start_time}])
+
+        def events():
+            yield {'id': 'e2', 'createdAt': start_time + timedelta(seconds=1)}
+            yield {'id': 'e1', 'createdAt': start_time}
+            raise AssertionError('read past the watermark')
+
+        self.assertEqual(1, len(watermark.take_new(events())))
+
+
+class TestStackEventStream(TestCase):
+    def test_follows_pagination_until_last_seen_event(self):
+        client = MagicMock()
+        client.describe_stack_events.side_effect = [
+            {'StackEvents': [_stack_event(5), _stack_event(4)], 'NextToken': 'token-1'},
+            {'StackEvents': [_stack_event(9), _stack_event(8)], 'NextToken': 'token-1'},
+            {'StackEvents': [_stack_event(7), _stack_event(6)], 'NextToken': 'token-2'},
+            {'StackEvents': [_stack_event(5), _stack_event(4)], 'NextToken': 'token-3'},
+        ]
+
+        stream = StackEventStream(client, 'stack-test')
+        new_events = stream.new_events()
+
+        self.assertEqual(['event-6', 'event-7', 'event-8', 'event-9'], [event['EventId'] for event in new_events])
+        client.describe_stack_events.assert_has_calls([
+            call(StackName='stack-test'),
+            call(StackName='stack-test'),
+            call(StackName='stack-test', NextToken='token-1'),
+            call(StackName='stack-test', NextToken='token-2'),
+        ])
+        self.assertEqual(4, client.describe_stack_events.call_count)
+
+    def test_reports_all_events_of_stack_created_after_stream_opened(self):
+        client = MagicMock()
+        client.describe_stack_events.side_effect = [
+            Exception('Stack does not exist'),
+            {'StackEvents': [_stack_event(1), _stack_event(0)]},
+        ]
+
+        stream = StackEventStream(client, 'stack-test')
+
+        self.assertEqual(['event-0', 'event-1'], [event['EventId'] for event in stream.new_events()])
@@ -0,0 +1,84 @@
+from time import time
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from cloudlift.deployment.deployer import deploy_and_wait
+from cloudlift.deployment.ecs import EcsTaskDefinition
+from cloudlift.deployment.service_status_poller import ServiceStatusPoller
+from cloudlift.exceptions import UnrecoverableException
+
+
+def _describe_many_services(cluster_name, service_names):
+    return {'services': [
+        {'serviceName': name, 'desiredCount': 1, 'runningCount': 1, 'events': [],
+         'deployments': [{'status': 'PRIMARY'}]}
+        for name in service_names
+    ]}
+
+
+class TestServiceStatusPoller(TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.describe_many_services.side_effect = _describe_many_services
+        self.poller = ServiceStatusPoller(self.client)
+        self.addCleanup(self.poller.stop)
+
+    def test_poll_batches_watched_services(self):
+        for index in range(25):
+            self.poller.watch('cluster-test', f'service-{index}')
+
+        self.poller.poll()
+
+        self.assertEqual(3, self.client.describe_many_services.call_count)
+        batch_sizes = [len(c.kwargs['service_names']) for c in self.client.describe_many_services.call_args_list]
+        self.assertEqual([10, 10, 5], batch_sizes)
+
+    def test_poll_skips_unwatched_services(self):
+        self.poller.watch('cluster-test', 'service-1')
+        self.poller.watch('cluster-test', 'service-2')
+        self.poller.unwatch('cluster-test', 'service-2')
+
+        self.poller.poll()
+
+        self.client.describe_many_services.assert_called_once_with(cluster_name='cluster-test',
+                                                                   service_names=['service-1'])
+
+    def test_wait_for_service_returns_only_newer_status(self):
+        self.poller.watch('cluster-test', 'service-1')
+        self.poller.poll()
+
+        service, polled_at = self.poller.wait_for_service('cluster-test', 'service-1', 0, time() + 1)
+        self.assertEqual('service-1', service.name)
+
+        service, next_polled_at = self.poller.wait_for_service('cluster-test', 'service-1', polled_at, time() + 1)
+        self.assertIsNone(service)
+        self.assertEqual(polled_at, next_polled_at)
+
+    def test_wait_for_service_fails_fast_for_missing_service(self):
+        self.client.describe_many_services.side_effect = lambda cluster_name, service_names: {
+            'services': [],
+            'failures': [{'arn': 'arn:aws:ecs:us-west-2:123:service/cluster-test/service-1', 'reason': 'MISSING'}],
+        }
+        self.poller.watch('cluster-test', 'service-1')
+        self.poller.poll()
+
+        with self.assertRaises(UnrecoverableException) as error:
+            self.poller.wait_for_service('cluster-test', 'service-1', 0, time() + 60)
+
+        self.assertEqual('Unable to describe service service-1 in cluster cluster-test: MISSING',
+                         error.exception.value)
+
+    def test_deploy_and_wait_uses_polled_status(self):
+        poller = ServiceStatusPoller(self.client, interval_seconds=0.1)
+        poller.start()
+        self.addCleanup(poller.stop)
+        deployment = MagicMock()
+        deployment.cluster_name = 'cluster-test'
+        deployment.service_name = 'service-1'
+        deployment.get_service.return_value = {'events': []}
+        new_task_definition = EcsTaskDefinition({'containerDefinitions': []})
+
+        self.assertTrue(deploy_and_wait(deployment, new_task_definition, 'green', 3, poller))
+
+        deployment.get_service.assert_called_once()
+        deployment.deploy.assert_called_with(new_task_definition)
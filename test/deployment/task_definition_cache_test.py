@@ -0,0 +1,89 @@
+import os
+from datetime import datetime
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from cloudlift.deployment.task_definition_cache import TaskDefinitionCache, describe_task_definition
+
+ARN_PREFIX = 'arn:aws:ecs:us-west-2:408750594584:task-definition/DummyFamily:'
+
+
+def _payload(revision):
+    return {'taskDefinition': {'taskDefinitionArn': ARN_PREFIX + str(revision), 'revision': revision,
+                               'registeredAt': datetime(2020, 10, 1, 10, 0, 0)},
+            'tags': [{'key': 'deployment_identifier', 'value': 'id-%d' % revision}]}
+
+
+class TestTaskDefinitionCache(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_describe_task_definition_fetches_each_revision_once(self):
+        cache = TaskDefinitionCache(self.directory, 10)
+        client = MagicMock()
+        client.describe_task_definition.return_value = _payload(4)
+
+        first = describe_task_definition(client, ARN_PREFIX + '4', cache)
+        second = describe_task_definition(client, ARN_PREFIX + '4', cache)
+
+        self.assertEqual(_payload(4), first)
+        self.assertEqual(first, second)
+        client.describe_task_definition.assert_called_once_with(taskDefinition=ARN_PREFIX + '4', include=['TAGS'])
+
+    def test_does_not_cache_status(self):
+        cache = TaskDefinitionCache(self.directory, 10)
+        client = MagicMock()
+        payload = _payload(4)
+        payload['taskDefinition']['status'] = 'ACTIVE'
+        client.describe_task_definition.return_value = payload
+
+        first = describe_task_definition(client, ARN_PREFIX + '4', cache)
+        second = describe_task_definition(client, ARN_PREFIX + '4', cache)
+
+        self.assertEqual(_payload(4), first)
+        self.assertEqual(_payload(4), second)
+        self.assertEqual(_payload(4), cache.get(ARN_PREFIX + '4'))
+
+    def test_describe_task_definition_uncached_refreshes_revision(self):
+        cache = TaskDefinitionCache(self.directory, 10)
+        cache.put(ARN_PREFIX + '4', _payload(4))
+        client = MagicMock()
+        payload = _payload(4)
+        payload['taskDefinition']['status'] = 'INACTIVE'
+        payload['tags'].append({'key': 'team', 'value': 'platform'})
+        client.describe_task_definition.return_value = payload
+
+        actual = describe_task_definition(client, ARN_PREFIX + '4', cache, cached=False)
+
+        self.assertEqual('INACTIVE', actual['taskDefinition']['status'])
+        client.describe_task_definition.assert_called_once_with(taskDefinition=ARN_PREFIX + '4', include=['TAGS'])
+        self.assertEqual(payload['tags'], cache.get(ARN_PREFIX + '4')['tags'])
+        self.assertNotIn('status', cache.get(ARN_PREFIX + '4')['taskDefinition'])
+
+    def test_does_not_cache_family_or_short_revision(self):
+        cache = TaskDefinitionCache(self.directory, 10)
+        client = MagicMock()
+        client.describe_task_definition.return_value = _payload(4)
+
+        describe_task_definition(client, 'DummyFamily', cache)
+        describe_task_definition(client, 'DummyFamily', cache)
+
+        self.assertEqual(2, client.describe_task_definition.call_count)
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_evicts_least_recently_used_revisions(self):
+        cache = TaskDefinitionCache(self.directory, 2)
+        cache.put(ARN_PREFIX + '1', _payload(1))
+        cache.put(ARN_PREFIX + '2', _payload(2))
+        os.utime(cache._path(ARN_PREFIX + '1'), (0, 0))
+        os.utime(cache._path(ARN_PREFIX + '2'), (1, 1))
+        cache.get(ARN_PREFIX + '1')
+
+        cache.put(ARN_PREFIX + '3', _payload(3))
+
+        self.assertEqual(_payload(1), cache.get(ARN_PREFIX + '1'))
+        self.assertIsNone(cache.get(ARN_PREFIX + '2'))
+        self.assertEqual(_payload(3), cache.get(ARN_PREFIX + '3'))
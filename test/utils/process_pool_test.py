@@ -0,0 +1,35 @@
+import multiprocessing
+import sys
+from time import sleep, time
+from unittest import TestCase
+
+from cloudlift.utils import run_processes
+
+
+def _sleep_and_exit(seconds, exit_code):
+    sleep(seconds)
+    sys.exit(exit_code)
+
+
+class TestRunProcesses(TestCase):
+    def test_returns_exit_codes_in_process_order(self):
+        processes = [
+            multiprocessing.Process(target=_sleep_and_exit, args=(0.2, 1)),
+            multiprocessing.Process(target=_sleep_and_exit, args=(0, 0)),
+            multiprocessing.Process(target=_sleep_and_exit, args=(0.1, 2)),
+        ]
+
+        self.assertEqual([1, 0, 2], run_processes(processes, 2))
+
+    def test_starts_pending_process_as_soon_as_a_slot_frees(self):
+        processes = [
+            multiprocessing.Process(target=_sleep_and_exit, args=(1, 0)),
+            multiprocessing.Process(target=_sleep_and_exit, args=(0.1, 0)),
+            multiprocessing.Process(target=_sleep_and_exit, args=(0.1, 0)),
+            multiprocessing.Process(target=_sleep_and_exit, args=(0.1, 0)),
+        ]
+
+        started_at = time()
+        run_processes(processes, 2)
+
+        self.assertLess(time() - started_at, 1.5)